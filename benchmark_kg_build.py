@@ -0,0 +1,238 @@
+"""Headless KG build benchmark with baseline comparison
+
+Builds fixed slices of the dataset -- one script, the primary plus two, all
+eight, and synthetic scale-ups from generate_synthetic_dataset.py -- through
+the same KGBuilder the app uses. Each run is a fresh process, so peak memory
+and caches belong to that run alone.
+
+Per slice it records wall time, per-stage times, peak RSS and triples per
+second, writes them as JSON and, given a baseline file, fails (exit status 1)
+when a number, or the median time of any build stage, regresses beyond the
+tolerance.
+
+Example:
+    python benchmark_kg_build.py --output build.json --baseline benchmarks/build_baseline.json
+    python benchmark_kg_build.py --synthetic 5000 --synthetic 20000 --synthetic-records
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from rdflib import Namespace
+
+from generate_synthetic_dataset import NAMESPACE, SCRIPT_FOLDERS, generate
+from kg_builder import KGBuilder
+from kg_metrics import StageMetrics, peak_resident_memory, resident_memory
+
+PRIMARY_SCRIPT = "indus"
+DATASET_SLICES = {
+    "single": ["indus"],
+    "primary+2": ["indus", "proto_elamite", "proto_cuneiform"],
+    "all": SCRIPT_FOLDERS,
+}
+# Lower is better for these, higher for triples_per_second
+LOWER_IS_BETTER = ("wall_seconds", "peak_rss_bytes", "peak_traced_bytes")
+HIGHER_IS_BETTER = ("triples_per_second",)
+# Stages faster than this in the baseline are too noisy to compare
+STAGE_MIN_SECONDS = 0.01
+
+
+def run_build(task):
+    """Build one slice and measure it (runs in its own process)"""
+    np.random.seed(task["seed"])
+    stages = StageMetrics()
+    if task["tracemalloc"]:
+        tracemalloc.start()
+    rss_before = resident_memory()
+    builder = KGBuilder(Namespace(NAMESPACE), SCRIPT_FOLDERS, task["dataset"], PRIMARY_SCRIPT, stages)
+    start = time.perf_counter()
+    graph = builder.build(task["scripts"], task["workers"])
+    wall = time.perf_counter() - start
+    result = {
+        "wall_seconds": wall,
+        "triples": len(graph),
+        "rss_before_bytes": rss_before,
+        "peak_rss_bytes": peak_resident_memory(),
+        "stage_seconds": {stage: record["sum"] for stage, record in stages.stages.items()},
+        "counters": dict(stages.counters),
+    }
+    if task["tracemalloc"]:
+        result["peak_traced_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def summarize(runs):
+    """Median per metric over the repeated runs of a slice"""
+    wall = statistics.median(run["wall_seconds"] for run in runs)
+    triples = runs[0]["triples"]
+    summary = {
+        "runs": len(runs),
+        "triples": triples,
+        "wall_seconds": wall,
+        "wall_seconds_min": min(run["wall_seconds"] for run in runs),
+        "triples_per_second": triples / wall if wall else 0.0,
+        "stage_seconds": {
+            stage: statistics.median(run["stage_seconds"].get(stage, 0.0) for run in runs)
+            for stage in sorted({stage for run in runs for stage in run["stage_seconds"]})
+        },
+        "counters": runs[0]["counters"],
+    }
+    for key in ("peak_rss_bytes", "rss_before_bytes", "peak_traced_bytes"):
+        values = [run[key] for run in runs if run.get(key) is not None]
+        if values:
+            summary[key] = statistics.median(values)
+    if len({run["triples"] for run in runs}) > 1:
+        summary["triples_varied"] = sorted({run["triples"] for run in runs})
+    return summary
+
+
+def compare(results, baseline, tolerance, memory_tolerance, stage_min_seconds=STAGE_MIN_SECONDS):
+    """Regressions of results against a baseline, as printable lines"""
+    failures = []
+    # Seeded builds with the same seed and inputs produce the same KG, whatever
+    # the worker count, so only then does a different triple count mean the
+    # output changed
+    same_config = all(baseline.get("config", {}).get(key) == value
+                      for key, value in results["config"].items() if key not in ("repeat", "workers"))
+    for name, current in results["slices"].items():
+        previous = baseline.get("slices", {}).get(name)
+        if previous is None:
+            continue
+        if same_config and current["triples"] != previous["triples"]:
+            failures.append(f"{name}: triples {previous['triples']} -> {current['triples']}")
+        for key in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            if key not in current or key not in previous or not previous[key]:
+                continue
+            limit = memory_tolerance if key.endswith("_bytes") else tolerance
+            change = current[key] / previous[key] - 1
+            if key in HIGHER_IS_BETTER:
+                change = -change
+            if change > limit:
+                failures.append(f"{name}: {key} {previous[key]:.4g} -> {current[key]:.4g} "
+                                f"({change:+.1%} worse, limit {limit:.0%})")
+        for stage, seconds in previous.get("stage_seconds", {}).items():
+            if seconds < stage_min_seconds or stage not in current.get("stage_seconds", {}):
+                continue
+            change = current["stage_seconds"][stage] / seconds - 1
+            if change > tolerance:
+                failures.append(f"{name}: stage {stage} {seconds:.4g}s -> "
+                                f"{current['stage_seconds'][stage]:.4g}s "
+                                f"({change:+.1%} worse, limit {tolerance:.0%})")
+    return failures
+
+
+def print_table(results, file=sys.stdout):
+    print(f"{'slice':<22}{'triples':>10}{'wall s':>10}{'triples/s':>12}{'peak RSS MB':>13}", file=file)
+    for name, summary in results["slices"].items():
+        rss = summary.get("peak_rss_bytes")
+        print(f"{name:<22}{summary['triples']:>10}{summary['wall_seconds']:>10.3f}"
+              f"{summary['triples_per_second']:>12.0f}{rss / 2**20 if rss else float('nan'):>13.1f}", file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark headless KG builds over fixed dataset slices")
+    parser.add_argument("--dataset", default="ind", help="dataset folder for the fixed slices (default: ind)")
+    parser.add_argument("--slices", default=",".join(DATASET_SLICES),
+                        help=f"fixed slices to run (default: {','.join(DATASET_SLICES)})")
+    parser.add_argument("--synthetic", type=int, action="append", default=[], metavar="SYMBOLS",
+                        help="also build all eight scripts at this many synthetic symbols each (repeatable)")
+    parser.add_argument("--synthetic-records", action="store_true",
+                        help="generate synthetic symbol records instead of images")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per slice; medians are reported (default: 3)")
+    parser.add_argument("--workers", type=int, default=1, help="build workers, as in the app (default: 1)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for builds and synthetic data")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="also record the traced Python heap peak (slows the build)")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="baseline results JSON to compare against")
+    parser.add_argument("--write-baseline", action="store_true", help="save these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown before failing, as a fraction (default: 0.2)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.1,
+                        help="allowed memory growth before failing, as a fraction (default: 0.1)")
+    parser.add_argument("--stage-min-seconds", type=float, default=STAGE_MIN_SECONDS,
+                        help="compare only stages at least this slow in the baseline "
+                             f"(default: {STAGE_MIN_SECONDS})")
+    args = parser.parse_args(argv)
+
+    slices = {}
+    for name in [s.strip() for s in args.slices.split(",") if s.strip()]:
+        if name not in DATASET_SLICES:
+            parser.error(f"unknown slice: {name}")
+        slices[name] = (args.dataset, DATASET_SLICES[name])
+
+    synthetic_dir = tempfile.mkdtemp(prefix="indus_kg_bench_") if args.synthetic else None
+    try:
+        for symbols in args.synthetic:
+            path = os.path.join(synthetic_dir, str(symbols))
+            generate(path, SCRIPT_FOLDERS, symbols, args.seed, records=args.synthetic_records,
+                     primary_script=PRIMARY_SCRIPT)
+            slices[f"synthetic-8x{symbols}"] = (path, SCRIPT_FOLDERS)
+
+        results = {
+            "benchmark": "kg_build",
+            "timestamp": datetime.now().isoformat(),
+            "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count()},
+            "config": {"repeat": args.repeat, "workers": args.workers, "seed": args.seed,
+                       "synthetic_records": args.synthetic_records},
+            "slices": {}
+        }
+        for name, (dataset, scripts) in slices.items():
+            runs = []
+            for _ in range(args.repeat):
+                # A fresh process per run keeps peak RSS and warm caches from leaking between runs
+                with ProcessPoolExecutor(max_workers=1,
+                                         mp_context=multiprocessing.get_context("spawn")) as pool:
+                    runs.append(pool.submit(run_build, {
+                        "dataset": dataset, "scripts": scripts, "workers": args.workers,
+                        "seed": args.seed, "tracemalloc": args.tracemalloc
+                    }).result())
+            results["slices"][name] = summarize(runs)
+            print(f"{name}: {results['slices'][name]['wall_seconds']:.3f}s", file=sys.stderr)
+    finally:
+        if synthetic_dir:
+            shutil.rmtree(synthetic_dir, ignore_errors=True)
+
+    print_table(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failures = []
+    if args.baseline and os.path.exists(args.baseline) and not args.write_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for key, value in results["config"].items():
+            if key != "repeat" and baseline.get("config", {}).get(key) != value:
+                print(f"WARNING baseline {key} was {baseline.get('config', {}).get(key)!r}, now {value!r}")
+        failures = compare(results, baseline, args.tolerance, args.memory_tolerance,
+                           args.stage_min_seconds)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if not failures:
+            print(f"No regressions against {args.baseline}")
+    elif args.baseline and args.write_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+    elif args.baseline:
+        print(f"No baseline at {args.baseline}; run with --write-baseline to create it")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""Reproducible SPARQL benchmark over several KG sizes
+
+Runs the "Show Examples" queries plus realistic variants -- symbol inventory,
+cross-script similarity, contour filters, aggregates, DESCRIBE and CONSTRUCT --
+against seeded KG builds of the benchmark_kg_build.py slices. Each query goes
+through the app's path (prepare_query, then evaluate_query) and its results
+are fully materialised.
+
+A cold sample is a query's first run in a freshly built KG in a fresh
+process; warm samples repeat it afterwards. Cold and warm latency
+percentiles and result counts are reported per size and written as JSON, so
+store, cache and optimizer changes can be compared run against run.
+
+Example:
+    python benchmark_sparql.py --output sparql.json
+    python benchmark_sparql.py --slices single --synthetic 20000 --synthetic-records --no-optimizers
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from rdflib import Namespace
+
+from benchmark_kg_build import DATASET_SLICES, PRIMARY_SCRIPT
+from generate_synthetic_dataset import NAMESPACE, SCRIPT_FOLDERS, generate
+from kg_builder import KGBuilder
+from kg_indexes import evaluate_query
+from kg_query import SPARQL_EXAMPLES, load_sparql, percentile, prepare_query
+
+PREFIXES = """PREFIX script: <http://example.org/scripts#>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+"""
+VARIANT_QUERIES = {
+    "inventory-all-scripts": """SELECT ?symbol ?script ?freq WHERE {
+  ?symbol a script:Symbol ;
+          script:fromScript ?script ;
+          script:symbolFrequency ?freq .
+}""",
+    "inventory-labels": """SELECT ?symbol ?label WHERE {
+  ?symbol script:fromScript "indus" ;
+          rdfs:label ?label .
+}
+ORDER BY ?label""",
+    "similarity-strong": """SELECT ?symbol ?other ?score WHERE {
+  ?symbol script:similarTo ?other ;
+          script:similarityScore ?score .
+  FILTER (?score > 0.8)
+}""",
+    "similarity-by-script": """SELECT ?script (COUNT(?other) AS ?links) WHERE {
+  ?symbol script:fromScript ?script ;
+          script:similarTo ?other .
+}
+GROUP BY ?script""",
+    "contour-range": """SELECT ?symbol ?contours WHERE {
+  ?symbol script:contourCount ?contours .
+  FILTER (?contours >= 3 && ?contours <= 5)
+}""",
+    "contour-top-k": """SELECT ?symbol ?contours WHERE {
+  ?symbol script:contourCount ?contours .
+}
+ORDER BY DESC(?contours)
+LIMIT 20""",
+    "aggregate-per-script": """SELECT ?script (COUNT(?symbol) AS ?symbols) (AVG(?freq) AS ?meanFreq) WHERE {
+  ?symbol a script:Symbol ;
+          script:fromScript ?script ;
+          script:symbolFrequency ?freq .
+}
+GROUP BY ?script""",
+    "aggregate-frequency-histogram": """SELECT ?freq (COUNT(?symbol) AS ?symbols) WHERE {
+  ?symbol script:symbolFrequency ?freq .
+}
+GROUP BY ?freq
+ORDER BY ?freq""",
+    "ask-complex-glyph": """ASK { ?symbol script:contourCount ?contours FILTER (?contours > 8) }""",
+    "describe-complex-glyphs": """DESCRIBE ?symbol WHERE {
+  ?symbol script:fromScript "indus" ;
+          script:contourCount 9 .
+}
+LIMIT 5""",
+    "construct-similarity": """CONSTRUCT { ?symbol script:similarTo ?other } WHERE {
+  ?symbol script:fromScript "indus" ;
+          script:similarTo ?other .
+}""",
+    "construct-script-graph": """CONSTRUCT { ?s ?p ?o } WHERE {
+  GRAPH <http://example.org/scripts/graph/indus> { ?s ?p ?o }
+}""",
+}
+PERCENTILES = (50, 90, 99)
+
+
+def benchmark_queries():
+    """The example queries, named from their headings, followed by the variants"""
+    queries = {}
+    for block in re.split(r"^(?=# \d+\. )", SPARQL_EXAMPLES, flags=re.M):
+        heading, _, query = block.partition("\n")
+        if query.strip():
+            title = re.sub(r"^# \d+\. ", "", heading).lower()
+            queries["example-" + re.sub(r"[^a-z0-9]+", "-", title).strip("-")] = query.strip()
+    for name, query in VARIANT_QUERIES.items():
+        queries[name] = PREFIXES + query
+    return queries
+
+
+def run_query(graph, query):
+    """Parse, evaluate and materialise one query; returns its result count"""
+    prepared = prepare_query(query, graph.namespaces())
+    results = evaluate_query(graph, prepared, query)
+    if results.type == "ASK":
+        return int(results.askAnswer)
+    return len(results)
+
+
+def run_session(task):
+    """Build a KG, then time each query cold and warm (runs in its own process)"""
+    # Engine start-up is not part of any query's cold sample
+    load_sparql()
+    np.random.seed(task["seed"])
+    builder = KGBuilder(Namespace(NAMESPACE), SCRIPT_FOLDERS, task["dataset"], PRIMARY_SCRIPT)
+    graph = builder.build(task["scripts"])
+    graph.evaluators_enabled = task["optimizers"]
+    if task["result_views"]:
+        for query in task["queries"].values():
+            graph.result_views.add(query)
+
+    # All cold runs first, so no query warms the store for a later one's cold sample
+    session = {"triples": len(graph), "queries": {}}
+    for name, query in task["queries"].items():
+        start = time.perf_counter()
+        count = run_query(graph, query)
+        session["queries"][name] = {"cold": time.perf_counter() - start, "warm": [], "results": count}
+    for _ in range(task["warm_runs"]):
+        for name, query in task["queries"].items():
+            start = time.perf_counter()
+            run_query(graph, query)
+            session["queries"][name]["warm"].append(time.perf_counter() - start)
+    return session
+
+
+def latency_summary(samples):
+    """Percentiles and extremes of a list of latencies, in milliseconds"""
+    ordered = sorted(seconds * 1000 for seconds in samples)
+    summary = {f"p{q}": percentile(ordered, q) for q in PERCENTILES}
+    summary.update({"min": ordered[0] if ordered else 0.0, "max": ordered[-1] if ordered else 0.0,
+                    "samples": len(ordered)})
+    return summary
+
+
+def summarize(sessions):
+    """Cold and warm percentiles per query over the sessions of one KG size"""
+    summary = {"triples": sessions[0]["triples"], "queries": {}}
+    for name in sessions[0]["queries"]:
+        runs = [session["queries"][name] for session in sessions]
+        counts = sorted({run["results"] for run in runs})
+        summary["queries"][name] = {
+            "results": counts[0] if len(counts) == 1 else counts,
+            "cold_ms": latency_summary([run["cold"] for run in runs]),
+            "warm_ms": latency_summary([seconds for run in runs for seconds in run["warm"]]),
+        }
+    return summary
+
+
+def print_table(results, file=sys.stdout):
+    for size, summary in results["sizes"].items():
+        print(f"\n{size} ({summary['triples']} triples)", file=file)
+        print(f"{'query':<52}{'results':>9}{'cold p50':>10}{'cold p90':>10}"
+              f"{'warm p50':>10}{'warm p90':>10}{'warm p99':>10}", file=file)
+        for name, query in summary["queries"].items():
+            cold, warm = query["cold_ms"], query["warm_ms"]
+            print(f"{name:<52}{str(query['results']):>9}{cold['p50']:>10.2f}{cold['p90']:>10.2f}"
+                  f"{warm['p50']:>10.2f}{warm['p90']:>10.2f}{warm['p99']:>10.2f}", file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark SPARQL queries over KGs of several sizes")
+    parser.add_argument("--dataset", default="ind", help="dataset folder for the fixed slices (default: ind)")
+    parser.add_argument("--slices", default=",".join(DATASET_SLICES),
+                        help=f"KG sizes from fixed slices (default: {','.join(DATASET_SLICES)})")
+    parser.add_argument("--synthetic", type=int, action="append", default=[], metavar="SYMBOLS",
+                        help="also query all eight scripts at this many synthetic symbols each (repeatable)")
+    parser.add_argument("--synthetic-records", action="store_true",
+                        help="generate synthetic symbol records instead of images")
+    parser.add_argument("--queries", help="comma-separated query names to run (default: all)")
+    parser.add_argument("--list", action="store_true", help="list the query names and exit")
+    parser.add_argument("--sessions", type=int, default=3,
+                        help="fresh builds per size; each gives one cold sample per query (default: 3)")
+    parser.add_argument("--warm-runs", type=int, default=10, help="warm runs per query per session (default: 10)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for builds and synthetic data")
+    parser.add_argument("--no-optimizers", action="store_true",
+                        help="disable the analyzer's custom query evaluators (rdflib's own plans only)")
+    parser.add_argument("--result-views", action="store_true",
+                        help="cache every benchmark query as a result view")
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    queries = benchmark_queries()
+    if args.list:
+        print("\n".join(queries))
+        return 0
+    if args.queries:
+        names = [n.strip() for n in args.queries.split(",") if n.strip()]
+        unknown = [n for n in names if n not in queries]
+        if unknown:
+            parser.error(f"unknown queries: {', '.join(unknown)}")
+        queries = {n: queries[n] for n in names}
+
+    sizes = {}
+    for name in [s.strip() for s in args.slices.split(",") if s.strip()]:
+        if name not in DATASET_SLICES:
+            parser.error(f"unknown slice: {name}")
+        sizes[name] = (args.dataset, DATASET_SLICES[name])
+
+    synthetic_dir = tempfile.mkdtemp(prefix="indus_sparql_bench_") if args.synthetic else None
+    try:
+        for symbols in args.synthetic:
+            path = os.path.join(synthetic_dir, str(symbols))
+            generate(path, SCRIPT_FOLDERS, symbols, args.seed, records=args.synthetic_records,
+                     primary_script=PRIMARY_SCRIPT)
+            sizes[f"synthetic-8x{symbols}"] = (path, SCRIPT_FOLDERS)
+
+        results = {
+            "benchmark": "sparql",
+            "timestamp": datetime.now().isoformat(),
+            "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count()},
+            "config": {"sessions": args.sessions, "warm_runs": args.warm_runs, "seed": args.seed,
+                       "optimizers": not args.no_optimizers, "result_views": args.result_views,
+                       "synthetic_records": args.synthetic_records},
+            "queries": queries,
+            "sizes": {}
+        }
+        for size, (dataset, scripts) in sizes.items():
+            sessions = []
+            for _ in range(args.sessions):
+                with ProcessPoolExecutor(max_workers=1,
+                                         mp_context=multiprocessing.get_context("spawn")) as pool:
+                    sessions.append(pool.submit(run_session, {
+                        "dataset": dataset, "scripts": scripts, "queries": queries, "seed": args.seed,
+                        "warm_runs": args.warm_runs, "optimizers": not args.no_optimizers,
+                        "result_views": args.result_views
+                    }).result())
+            results["sizes"][size] = summarize(sessions)
+            print(f"{size}: done", file=sys.stderr)
+    finally:
+        if synthetic_dir:
+            shutil.rmtree(synthetic_dir, ignore_errors=True)
+
+    print_table(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""Synthetic script dataset generator for load and scaling tests
+
+The bundled ``ind/`` folders hold about 13k glyphs. This writes script folders
+shaped like them -- PNG and JPG glyph images of configurable size and count --
+so KG build time, memory and query latency can be measured at 100k or 1M
+symbols. With ``--records`` it skips the images and writes each script's
+symbol records directly, as ``<script>.records.jsonl`` files the analyzer
+loads in place of a missing folder.
+
+Runs are seeded: the same arguments always produce the same dataset.
+
+Example:
+    python generate_synthetic_dataset.py synthetic --symbols 20000 --seed 7
+    python generate_synthetic_dataset.py synthetic_1m --symbols 125000 --records
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+from rdflib import Namespace
+
+from kg_builder import (script_header_triples, simulate_symbol, symbol_record_triples,
+                        symbol_records_path)
+from kg_metrics import StageMetrics
+
+SCRIPT_FOLDERS = ['indus', 'ba-shu', 'naxi_dongba', 'old_naxi',
+                  'proto_cuneiform', 'proto_elamite', 'standard_yi', 'yi']
+NAMESPACE = "http://example.org/scripts#"
+MANIFEST = "synthetic_manifest.json"
+
+
+def parse_range(text):
+    """'MIN:MAX' or a single value as an inclusive (min, max) pair"""
+    low, _, high = text.partition(":")
+    low, high = int(low), int(high or low)
+    if low < 1 or high < low:
+        raise argparse.ArgumentTypeError(f"invalid range: {text}")
+    return low, high
+
+
+def parse_formats(text):
+    """'png=3,jpg=1' as normalised format weights"""
+    weights = {}
+    for item in text.split(","):
+        fmt, _, weight = item.partition("=")
+        fmt = fmt.strip().lower().lstrip(".")
+        if fmt not in ("png", "jpg"):
+            raise argparse.ArgumentTypeError(f"unsupported format: {fmt}")
+        weights[fmt] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise argparse.ArgumentTypeError(f"invalid format weights: {text}")
+    return {fmt: weight / total for fmt, weight in weights.items()}
+
+
+def draw_glyph(rng, width, height, color):
+    """A random stroke glyph, black on white like the scanned signs"""
+    img = np.full((height, width, 3) if color else (height, width), 255, np.uint8)
+    ink = (0, 0, 0) if color else 0
+    thickness = max(1, min(width, height) // 30)
+    for _ in range(rng.integers(2, 7)):
+        x1, x2 = rng.integers(0, width, 2)
+        y1, y2 = rng.integers(0, height, 2)
+        kind = rng.integers(3)
+        if kind == 0:
+            cv2.line(img, (int(x1), int(y1)), (int(x2), int(y2)), ink, thickness)
+        elif kind == 1:
+            axes = (max(1, int(abs(x2 - x1)) // 2), max(1, int(abs(y2 - y1)) // 2))
+            cv2.ellipse(img, (int(x1), int(y1)), axes, 0, 0, int(rng.integers(90, 361)), ink, thickness)
+        else:
+            points = np.stack([rng.integers(0, width, 4), rng.integers(0, height, 4)], axis=1)
+            cv2.polylines(img, [points.astype(np.int32)], False, ink, thickness)
+    return img
+
+
+def write_script_images(folder, script, count, rng, widths, heights, formats):
+    """Write a script folder of glyph images; returns the count per format"""
+    os.makedirs(folder, exist_ok=True)
+    names = list(formats)
+    choices = rng.choice(len(names), size=count, p=[formats[f] for f in names])
+    written = dict.fromkeys(names, 0)
+    for n in range(count):
+        fmt = names[choices[n]]
+        width = int(rng.integers(widths[0], widths[1] + 1))
+        height = int(rng.integers(heights[0], heights[1] + 1))
+        # PNG glyphs are colour like naxi_dongba, JPG ones greyscale like indus
+        img = draw_glyph(rng, width, height, color=fmt == "png")
+        if not cv2.imwrite(os.path.join(folder, f"{script}_{n:07d}.{fmt}"), img):
+            raise OSError(f"could not write {script} image {n}")
+        written[fmt] += 1
+    return written
+
+
+def write_script_records(output, script, count, widths, heights, primary_script, script_folders):
+    """Write a script's symbol records as one JSON-lines file; returns the triple count"""
+    stages = StageMetrics()
+    ns = Namespace(NAMESPACE)
+    triples = len(script_header_triples(ns, script))
+    with open(symbol_records_path(output, script), "w", encoding="utf-8") as f:
+        for n in range(count):
+            features = {"width": np.random.randint(widths[0], widths[1] + 1),
+                        "height": np.random.randint(heights[0], heights[1] + 1),
+                        "ink_density": np.random.uniform(0.02, 0.4)}
+            record = simulate_symbol(f"{script}_{n:07d}", script, features, primary_script,
+                                     script_folders, stages)
+            f.write(json.dumps(record) + "\n")
+            triples += len(symbol_record_triples(ns, script, record))
+    return triples
+
+
+def generate(output, scripts, symbols, seed, widths=(24, 300), heights=(24, 300),
+             formats=None, records=False, primary_script=None):
+    """Generate a synthetic dataset and return its manifest"""
+    formats = formats or {"png": 0.75, "jpg": 0.25}
+    primary_script = primary_script or scripts[0]
+    os.makedirs(output, exist_ok=True)
+    manifest = {
+        "seed": seed, "symbols_per_script": symbols, "records": records,
+        "width": list(widths), "height": list(heights), "formats": formats,
+        "primary_script": primary_script, "scripts": {}
+    }
+    for index, script in enumerate(scripts):
+        start = time.time()
+        # One stream per script, so a folder doesn't depend on which others were generated
+        if records:
+            np.random.seed([seed, index])
+            entry = {"triples": write_script_records(output, script, symbols, widths, heights,
+                                                     primary_script, SCRIPT_FOLDERS)}
+        else:
+            rng = np.random.default_rng([seed, index])
+            entry = {"images": write_script_images(os.path.join(output, script), script, symbols,
+                                                   rng, widths, heights, formats)}
+        entry["seconds"] = round(time.time() - start, 3)
+        manifest["scripts"][script] = entry
+        print(f"{script}: {symbols} symbols in {entry['seconds']:.1f}s", file=sys.stderr)
+    with open(os.path.join(output, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic script folders for scaling tests")
+    parser.add_argument("output", help="dataset directory to write (use it as the analyzer's dataset path)")
+    parser.add_argument("--scripts", default=",".join(SCRIPT_FOLDERS),
+                        help="comma-separated script folder names (default: the eight bundled scripts)")
+    parser.add_argument("--symbols", type=int, default=1000, help="symbols per script (default: 1000)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    parser.add_argument("--width", type=parse_range, default=(24, 300),
+                        help="image width range MIN:MAX in pixels (default: 24:300)")
+    parser.add_argument("--height", type=parse_range, default=(24, 300),
+                        help="image height range MIN:MAX in pixels (default: 24:300)")
+    parser.add_argument("--formats", type=parse_formats, default={"png": 0.75, "jpg": 0.25},
+                        help="image format weights (default: png=3,jpg=1)")
+    parser.add_argument("--records", action="store_true",
+                        help="write symbol triples directly instead of images")
+    parser.add_argument("--primary", help="primary script for simulated similarity links in records "
+                                          "(default: the first script)")
+    args = parser.parse_args(argv)
+
+    scripts = [s.strip() for s in args.scripts.split(",") if s.strip()]
+    if not scripts or args.symbols < 0:
+        parser.error("need at least one script and a non-negative symbol count")
+    generate(args.output, scripts, args.symbols, args.seed, args.width, args.height,
+             args.formats, args.records, args.primary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+"""Headless KG builds from script image folders or synthetic symbol records"""
+
+from rdflib import Literal, Namespace
+from rdflib.namespace import RDF, RDFS, OWL, XSD, PROV, DCTERMS
+import os
+import json
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+import shutil
+import tempfile
+
+from kg_metrics import StageMetrics, cv2, np, resident_memory
+from kg_indexes import ONTOLOGY_GRAPH, PartitionCache, create_kg_dataset, read_triples, write_triples
+
+# Per-user location for spilled partitions, profiles and other run artefacts
+APP_DATA_DIR = os.path.join(os.path.expanduser("~"), ".indus_script_kg")
+
+# Images per build chunk. Each chunk draws its own random seed, and the
+# size is fixed so a seeded build is the same whatever the worker count
+SHARD_IMAGES = 200
+
+# In-memory size assumed for a triple when the build did not trace allocations
+PARTITION_BYTES_PER_TRIPLE = 1000
+
+def list_symbol_images(script_path):
+    """Symbol image file names in a script folder"""
+    return [f for f in os.listdir(script_path) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
+
+def symbol_records_path(dataset_path, script):
+    """Pre-generated symbol records standing in for a script folder (see generate_synthetic_dataset.py)
+
+    The file holds one JSON record per line, so loading a dataset never
+    runs code from it.
+    """
+    return os.path.join(dataset_path, script + ".records.jsonl")
+
+def script_header_triples(ns, script):
+    """Triples describing a script itself"""
+    script_uri = ns[script]
+    triples = [
+        (script_uri, RDF.type, ns.Script),
+        (script_uri, RDFS.label, Literal(script)),
+        (script_uri, ns.fromScript, Literal(script))
+    ]
+    
+    # Add to script family
+    if script == "indus":
+        triples.append((script_uri, ns.scriptFamily, ns.IndusValleyFamily))
+    elif script == "proto_elamite":
+        triples.append((script_uri, ns.scriptFamily, ns.ProtoElamiteFamily))
+    return triples
+
+def symbol_triples(ns, script, script_path, img_file, primary_script, script_folders, stages):
+    """Triples describing one symbol image, with its simulated features"""
+    with stages.time("kg_decode"):
+        img = cv2.imread(os.path.join(script_path, img_file), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        stages.increment("kg_images_unreadable")
+        features = None
+    else:
+        with stages.time("kg_measure"):
+            features = glyph_features(img)
+    record = simulate_symbol(os.path.splitext(img_file)[0], script, features,
+                             primary_script, script_folders, stages)
+    return symbol_record_triples(ns, script, record)
+
+def glyph_features(img):
+    """Width, height and ink density of a greyscale glyph image
+
+    Ink density is the share of pixels on the dark side of the Otsu threshold.
+    """
+    threshold, _ = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return {"width": img.shape[1], "height": img.shape[0],
+            "ink_density": np.count_nonzero(img <= threshold) / img.size}
+
+def simulate_symbol(symbol_id, script, features, primary_script, script_folders, stages):
+    """Simulated features of one symbol as a record; visual ones only when its image was readable
+
+    ``features`` is the image's glyph_features, or None if it could not be read.
+    """
+    record = {"id": symbol_id, "frequency": int(np.random.randint(1, 100))}
+    
+    # Add simulated visual features
+    if features is not None:
+        with stages.time("kg_features"):
+            record["contours"] = int(np.random.randint(1, 10))
+            record["width"], record["height"] = int(features["width"]), int(features["height"])
+            record["ink_density"] = round(float(features["ink_density"]), 4)
+        
+        # Add some similarity relationships
+        if script == primary_script and np.random.random() > 0.7:
+            with stages.time("kg_similarity"):
+                record["similar"] = [
+                    (f"{comp_script}_symbol_{np.random.randint(1,50)}",
+                     round(np.random.uniform(0.5, 0.95), 2))
+                    for comp_script in script_folders if comp_script != script]
+    return record
+
+def symbol_record_triples(ns, script, record):
+    """Triples for one symbol record"""
+    symbol_id = record["id"]
+    symbol_uri = ns[f"{script}_{symbol_id}"]
+    
+    # Add to KG
+    triples = [
+        (symbol_uri, RDF.type, ns.Symbol),
+        (symbol_uri, RDFS.label, Literal(symbol_id)),
+        (symbol_uri, ns.fromScript, Literal(script)),
+        (ns[script], ns.hasSymbol, symbol_uri),
+        (symbol_uri, ns.symbolFrequency, Literal(record["frequency"], datatype=XSD.integer))
+    ]
+    if "contours" in record:
+        triples.append((symbol_uri, ns.contourCount, Literal(record["contours"], datatype=XSD.integer)))
+    if "width" in record:
+        triples.append((symbol_uri, ns.imageWidth, Literal(record["width"], datatype=XSD.integer)))
+        triples.append((symbol_uri, ns.imageHeight, Literal(record["height"], datatype=XSD.integer)))
+        triples.append((symbol_uri, ns.inkDensity, Literal(record["ink_density"], datatype=XSD.float)))
+    for comp_symbol, score in record.get("similar", ()):
+        triples.append((symbol_uri, ns.similarTo, ns[comp_symbol]))
+        triples.append((symbol_uri, ns.similarityScore, Literal(score, datatype=XSD.float)))
+    return triples
+
+def read_symbol_records(ns, script, path):
+    """Triples of a script's records file, the script's own included"""
+    triples = script_header_triples(ns, script)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            triples.extend(symbol_record_triples(ns, script, json.loads(line)))
+    return triples
+
+def build_shard(task):
+    """Build one chunk of a script folder into a shard file (process pool worker)
+
+    Shards go through write_triples rather than N-Triples because some image
+    names make URIs that the N-Triples serializer rejects.
+    """
+    np.random.seed(task["seed"])
+    stages = StageMetrics()
+    ns = Namespace(task["namespace"])
+    script = task["script"]
+    triples = script_header_triples(ns, script) if task["header"] else []
+    for img_file in task["files"]:
+        triples.extend(symbol_triples(ns, script, task["script_path"], img_file,
+                                      task["primary_script"], task["script_folders"], stages))
+    with stages.time("kg_shard_write"):
+        write_triples(task["path"], triples)
+    stages.increment("kg_triples_generated", len(triples))
+    return {"script": script, "path": task["path"], "triples": len(triples),
+            "stages": stages.stages, "counters": dict(stages.counters)}
+
+def define_ontology(ns, graph):
+    """Enhanced ontology with PROV-O support"""
+    graph.bind("script", ns)
+    graph.bind("prov", PROV)
+    graph.bind("dcterms", DCTERMS)
+    
+    # Core classes
+    classes = [
+        (ns.Script, "Ancient writing system"),
+        (ns.Symbol, "Individual character/glyph"),
+        (ns.ScriptFamily, "Group of related scripts")
+    ]
+    
+    for cls, comment in classes:
+        graph.add((cls, RDF.type, OWL.Class))
+        graph.add((cls, RDFS.comment, Literal(comment)))
+    
+    # Properties
+    properties = [
+        (ns.hasSymbol, "Script contains symbol", OWL.ObjectProperty),
+        (ns.similarTo, "Similarity relationship", OWL.ObjectProperty),
+        (ns.similarityScore, "Numerical similarity", OWL.DatatypeProperty),
+        (ns.scriptFamily, "Family classification", OWL.ObjectProperty),
+        (ns.symbolFrequency, "Usage frequency", OWL.DatatypeProperty),
+        (ns.contourCount, "Number of contours in glyph", OWL.DatatypeProperty),
+        (ns.imageWidth, "Glyph image width in pixels", OWL.DatatypeProperty),
+        (ns.imageHeight, "Glyph image height in pixels", OWL.DatatypeProperty),
+        (ns.inkDensity, "Share of glyph image pixels that are ink", OWL.DatatypeProperty),
+        (ns.fromScript, "Indicates source script", OWL.DatatypeProperty)
+    ]
+    
+    for prop, comment, prop_type in properties:
+        graph.add((prop, RDF.type, prop_type))
+        graph.add((prop, RDFS.comment, Literal(comment)))
+    
+    # Define script families
+    graph.add((ns.IndusValleyFamily, RDF.type, ns.ScriptFamily))
+    graph.add((ns.ProtoElamiteFamily, RDF.type, ns.ScriptFamily))
+
+class KGBuilder:
+    """Builds a KG dataset from a folder of script images, without any UI
+
+    The app runs one per "Generate Knowledge Graph"; the benchmark scripts
+    run it headless. Stage timings go to ``stages`` and per-script memory to
+    ``memory_report``; ``progress`` is called with the completed fraction.
+    """
+    def __init__(self, ns, script_folders, dataset_path, primary_script, stages=None, progress=None):
+        self.ns = ns
+        self.script_folders = script_folders
+        self.dataset_path = dataset_path
+        self.primary_script = primary_script
+        self.stage_metrics = stages if stages is not None else StageMetrics()
+        self.progress = progress or (lambda fraction: None)
+        self.memory_report = {}
+
+    def build(self, scripts, workers=1, budget=0, advisor=None, persist=False):
+        """Build the given scripts into a new dataset with its indexes refreshed
+
+        With a memory budget, or ``persist`` for query workers, the script
+        graphs are also written to a partition cache.
+        """
+        graph = create_kg_dataset(self.ns, self.script_folders)
+        define_ontology(self.ns, graph.graph(ONTOLOGY_GRAPH))
+        # Chunk seeds get their own stream, which reseeding for a chunk leaves alone
+        self.chunk_seeds = np.random.RandomState(np.random.randint(2**31))
+        if workers > 1:
+            self.build_sharded(graph, scripts, workers)
+        else:
+            for i, script in enumerate(scripts):
+                memory_before = self.memory_in_use()
+                triples_before = graph.indexes["stats"].triples
+                self.load_script_data(script, graph.script_graph(script))
+                self.record_script_memory(script, self.memory_in_use() - memory_before,
+                                          graph.indexes["stats"].triples - triples_before)
+                self.progress((i + 1) / len(scripts))
+        
+        stages = self.stage_metrics
+        with stages.time("kg_views"):
+            graph.indexes["views"].refresh()
+        with stages.time("kg_label_index"):
+            graph.indexes["labels"].refresh()
+        with stages.time("kg_numeric_index"):
+            if advisor is not None:
+                advisor.reapply(graph)
+            graph.indexes["numeric"].refresh()
+        
+        if budget or persist:
+            with stages.time("kg_persist"):
+                self.persist_partitions(graph, budget)
+        return graph
+
+    def memory_in_use(self):
+        """Bytes currently allocated, from tracemalloc if tracing else RSS"""
+        if tracemalloc.is_tracing():
+            return tracemalloc.get_traced_memory()[0]
+        return resident_memory() or 0
+
+    def record_script_memory(self, script, memory_bytes, triples):
+        """Record the memory a script's triples added to the KG"""
+        source = "tracemalloc" if tracemalloc.is_tracing() else "rss"
+        self.memory_report[script] = {"bytes": memory_bytes, "triples": triples, "source": source}
+        self.stage_metrics.set_gauge("kg_script_memory_bytes", memory_bytes, script=script, source=source)
+        self.stage_metrics.set_gauge("kg_script_triples", triples, script=script)
+        if triples:
+            self.stage_metrics.set_gauge("kg_bytes_per_triple", memory_bytes / triples,
+                                         script=script, source=source)
+
+    def persist_partitions(self, graph, budget):
+        """Write the script graphs to disk and keep only what fits the budget"""
+        partitions_dir = os.path.join(APP_DATA_DIR, "partitions")
+        os.makedirs(partitions_dir, exist_ok=True)
+        cache = PartitionCache(graph, tempfile.mkdtemp(prefix="kg-", dir=partitions_dir),
+                               budget, self.stage_metrics)
+        # Saved in reverse build order so the primary script is evicted last
+        for script in reversed(list(graph.script_graphs)):
+            triples = graph.partitions.triple_count(graph.script_graphs[script])
+            usage = self.memory_report.get(script)
+            if usage and usage["source"] == "tracemalloc" and usage["bytes"] > 0:
+                size = usage["bytes"]
+            else:
+                size = triples * PARTITION_BYTES_PER_TRIPLE
+            cache.save(script, size)
+        cache.trim()
+        graph.partition_cache = cache
+
+    def load_script_data(self, script, graph):
+        """Load script data into the given (script's own) graph"""
+        script_path = os.path.join(self.dataset_path, script)
+        if not os.path.exists(script_path):
+            self.load_script_records(script, graph)
+            return
+            
+        for triple in script_header_triples(self.ns, script):
+            graph.add(triple)
+        
+        # Process each symbol image
+        stages = self.stage_metrics
+        with stages.time("kg_scan"):
+            img_files = list_symbol_images(script_path)
+        stages.increment("kg_images_scanned", len(img_files))
+        
+        for files, seed in self.image_chunks(img_files):
+            np.random.seed(seed)
+            for img_file in files:
+                triples = symbol_triples(self.ns, script, script_path, img_file, self.primary_script,
+                                         self.script_folders, stages)
+                with stages.time("kg_insert"):
+                    for triple in triples:
+                        graph.add(triple)
+                stages.increment("kg_triples_generated", len(triples))
+
+    def image_chunks(self, img_files):
+        """[(files, seed)] per SHARD_IMAGES chunk of a folder, in build order"""
+        return [(img_files[first:first + SHARD_IMAGES], int(self.chunk_seeds.randint(2**31)))
+                for first in range(0, max(len(img_files), 1), SHARD_IMAGES)]
+
+    def load_script_records(self, script, graph):
+        """Load a script's pre-generated symbol records, if the dataset has them instead of a folder"""
+        records_path = symbol_records_path(self.dataset_path, script)
+        if not os.path.exists(records_path):
+            return
+        stages = self.stage_metrics
+        with stages.time("kg_merge"):
+            triples = read_symbol_records(self.ns, script, records_path)
+            for triple in triples:
+                graph.add(triple)
+        stages.increment("kg_triples_generated", len(triples))
+
+    def build_sharded(self, graph, scripts, workers):
+        """Build script folders in worker processes, then merge the shards
+
+        Folders are split into chunks so a large one like yi spreads over
+        several workers. The merge into the KG and its indexes stays serial.
+        """
+        stages = self.stage_metrics
+        shard_dir = tempfile.mkdtemp(prefix="indus_kg_shards_")
+        try:
+            tasks = []
+            for script in scripts:
+                script_path = os.path.join(self.dataset_path, script)
+                if not os.path.exists(script_path):
+                    # Symbol records need no worker; they are read at the merge
+                    records_path = symbol_records_path(self.dataset_path, script)
+                    if os.path.exists(records_path):
+                        tasks.append((script, records_path, None))
+                    continue
+                with stages.time("kg_scan"):
+                    img_files = list_symbol_images(script_path)
+                stages.increment("kg_images_scanned", len(img_files))
+                tasks.append((script, script_path, img_files))
+            
+            # The same chunks and seeds as a serial build
+            shards = []
+            for script, script_path, img_files in tasks:
+                if img_files is None:
+                    shards.append({"script": script, "path": script_path})
+                    continue
+                for n, (files, seed) in enumerate(self.image_chunks(img_files)):
+                    shards.append({
+                        "script": script, "script_path": script_path, "namespace": str(self.ns),
+                        "files": files, "header": n == 0, "seed": seed,
+                        "primary_script": self.primary_script, "script_folders": self.script_folders,
+                        "path": os.path.join(shard_dir, f"{script}-{n:04d}.jsonl")
+                    })
+            
+            # Spawned workers share no locks or Tk state with this process
+            results = {}
+            with stages.time("kg_shard_build"), ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                futures = [pool.submit(build_shard, shard) for shard in shards if "files" in shard]
+                for done, future in enumerate(as_completed(futures), 1):
+                    result = future.result()
+                    results[result["path"]] = result
+                    stages.merge(result["stages"], result["counters"])
+                    self.progress(done / len(futures) * 0.5)
+            
+            # Merge per script, in shard order so the build is reproducible
+            for i, (script, _, _) in enumerate(tasks):
+                memory_before = self.memory_in_use()
+                triples_before = graph.indexes["stats"].triples
+                script_graph = graph.script_graph(script)
+                for shard in shards:
+                    if shard["script"] != script:
+                        continue
+                    with stages.time("kg_merge"):
+                        if "files" in shard:
+                            triples = read_triples(shard["path"])
+                        else:
+                            triples = read_symbol_records(self.ns, script, shard["path"])
+                        for triple in triples:
+                            script_graph.add(triple)
+                self.record_script_memory(script, self.memory_in_use() - memory_before,
+                                          graph.indexes["stats"].triples - triples_before)
+                self.progress(0.5 + (i + 1) / len(tasks) * 0.5)
+        finally:
+            shutil.rmtree(shard_dir, ignore_errors=True)
@@ -0,0 +1,323 @@
+"""Local SPARQL 1.1 Protocol endpoint serving the published knowledge graph"""
+
+from rdflib import URIRef, Literal
+import csv
+import io
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from xml.sax.saxutils import escape as xml_escape, quoteattr
+from itertools import chain
+
+from kg_indexes import (QueryTimeout, acquire_resident, check_query_deadline, query_deadline,
+                        release_resident)
+import kg_query
+from kg_query import prepare_query, query_scripts
+
+SPARQL_RESULT_TYPES = {
+    "application/sparql-results+json": "json",
+    "application/json": "json",
+    "application/sparql-results+xml": "xml",
+    "application/xml": "xml",
+    "text/csv": "csv",
+    "text/tab-separated-values": "tsv"
+}
+
+SPARQL_GRAPH_TYPES = {
+    "text/turtle": "turtle",
+    "application/n-triples": "nt",
+    "application/rdf+xml": "xml",
+    "application/ld+json": "json-ld"
+}
+
+def negotiate_media_type(accept, offers):
+    """Pick the offered media type with the highest q-value in an Accept header"""
+    best, best_q = None, 0.0
+    for position, item in enumerate((accept or "*/*").split(",")):
+        media_range, *params = [part.strip() for part in item.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        for offer in offers:
+            if media_range in (offer, "*/*") or \
+                    (media_range.endswith("/*") and offer.startswith(media_range[:-1])):
+                # Earlier ranges win ties, so a client listing JSON first gets JSON
+                if q > best_q:
+                    best, best_q = offer, q
+                break
+    return best
+
+def _json_term(term):
+    if isinstance(term, URIRef):
+        return {"type": "uri", "value": str(term)}
+    if isinstance(term, Literal):
+        value = {"type": "literal", "value": str(term)}
+        if term.language:
+            value["xml:lang"] = term.language
+        elif term.datatype:
+            value["datatype"] = str(term.datatype)
+        return value
+    return {"type": "bnode", "value": str(term)}
+
+def _xml_term(term):
+    if isinstance(term, URIRef):
+        return f"<uri>{xml_escape(str(term))}</uri>"
+    if isinstance(term, Literal):
+        if term.language:
+            return f"<literal xml:lang={quoteattr(term.language)}>{xml_escape(str(term))}</literal>"
+        if term.datatype:
+            return f"<literal datatype={quoteattr(str(term.datatype))}>{xml_escape(str(term))}</literal>"
+        return f"<literal>{xml_escape(str(term))}</literal>"
+    return f"<bnode>{xml_escape(str(term))}</bnode>"
+
+def stream_sparql_results(variables, rows, fmt):
+    """Yield a SELECT result set as text chunks in the given results format"""
+    if fmt == "json":
+        yield '{"head": {"vars": %s}, "results": {"bindings": [' % json.dumps([str(v) for v in variables])
+        separator = "\n"
+        for row in rows:
+            binding = {str(v): _json_term(row[v]) for v in variables if row.get(v) is not None}
+            yield separator + json.dumps(binding)
+            separator = ",\n"
+        yield "\n]}}\n"
+    elif fmt == "xml":
+        yield '<?xml version="1.0"?>\n<sparql xmlns="http://www.w3.org/2005/sparql-results#">\n<head>'
+        yield "".join(f"<variable name={quoteattr(str(v))}/>" for v in variables)
+        yield "</head>\n<results>\n"
+        for row in rows:
+            yield "<result>" + "".join(
+                f"<binding name={quoteattr(str(v))}>{_xml_term(row[v])}</binding>"
+                for v in variables if row.get(v) is not None
+            ) + "</result>\n"
+        yield "</results>\n</sparql>\n"
+    elif fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([str(v) for v in variables])
+        for row in rows:
+            writer.writerow(["" if row.get(v) is None else str(row[v]) for v in variables])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        yield "\t".join(f"?{v}" for v in variables) + "\n"
+        for row in rows:
+            yield "\t".join("" if row.get(v) is None else row[v].n3() for v in variables) + "\n"
+
+def stream_ask_result(answer, fmt):
+    """Render an ASK result in the given results format"""
+    if fmt == "json":
+        return json.dumps({"head": {}, "boolean": bool(answer)}) + "\n"
+    if fmt == "xml":
+        return ('<?xml version="1.0"?>\n<sparql xmlns="http://www.w3.org/2005/sparql-results#">'
+                f"<head/><boolean>{str(bool(answer)).lower()}</boolean></sparql>\n")
+    return f"{str(bool(answer)).lower()}\n"
+
+class _PooledHTTPServer(HTTPServer):
+    """HTTP server that hands each connection to a bounded thread pool"""
+    def __init__(self, address, handler, max_workers):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix="sparql-http")
+        super().__init__(address, handler)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False)
+
+class _SPARQLRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Idle keep-alive connections must not pin a pool worker forever
+    timeout = 30
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != self.server.endpoint.path:
+            return self.send_text(404, "Not found")
+        params = parse_qs(url.query)
+        self.answer(params.get("query", [None])[0])
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != self.server.endpoint.path:
+            return self.send_text(404, "Not found")
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8")
+        content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip()
+        if content_type == "application/sparql-query":
+            return self.answer(body)
+        if content_type == "application/x-www-form-urlencoded":
+            params = parse_qs(body)
+            if "update" in params:
+                return self.send_text(400, "SPARQL Update is not supported by this endpoint")
+            return self.answer(params.get("query", [None])[0])
+        self.send_text(415, f"Unsupported content type: {content_type}")
+
+    def answer(self, query):
+        if not query:
+            return self.send_text(400, "Missing 'query' parameter")
+        endpoint = self.server.endpoint
+        deadline = time.monotonic() + endpoint.timeout
+        # The KG stays pinned and read-locked, with the script graphs the
+        # query reads resident, until its results are fully streamed
+        graph = endpoint.published.pin()
+        try:
+            prepared = prepare_query(query, graph.namespaces())
+        except Exception as e:
+            endpoint.published.unpin(graph)
+            return self.send_text(400, f"Query failed: {e}")
+        acquire_resident(graph, query_scripts(graph, prepared.algebra))
+        reader = threading.get_ident()
+        
+        def release():
+            release_resident(graph, reader)
+            endpoint.published.unpin(graph)
+        
+        try:
+            # Evaluation up to the first solution runs on the query pool so a
+            # runaway query can be answered with a timeout instead of hanging
+            future = endpoint.query_executor.submit(endpoint.start_query, graph, prepared, deadline)
+            result = future.result(timeout=endpoint.timeout)
+        except FutureTimeout:
+            # The abandoned evaluation stops at its next graph scan; the
+            # lock is released as soon as it has
+            future.add_done_callback(lambda f: release())
+            return self.send_text(503, f"Query exceeded the {endpoint.timeout:.0f}s timeout")
+        except QueryTimeout:
+            release()
+            return self.send_text(503, f"Query exceeded the {endpoint.timeout:.0f}s timeout")
+        except Exception as e:
+            release()
+            return self.send_text(400, f"Query failed: {e}")
+        try:
+            self.stream_result(result, deadline)
+        finally:
+            release()
+
+    def stream_result(self, result, deadline):
+        accept = self.headers.get("Accept")
+        if result["type_"] in ("CONSTRUCT", "DESCRIBE"):
+            media_type = negotiate_media_type(accept, list(SPARQL_GRAPH_TYPES))
+            if media_type is None:
+                return self.send_text(406, "No acceptable RDF serialization")
+            fmt = SPARQL_GRAPH_TYPES[media_type]
+            if fmt == "nt":
+                chunks = (f"{s.n3()} {p.n3()} {o.n3()} .\n" for s, p, o in result["graph"])
+            else:
+                chunks = [result["graph"].serialize(format=fmt)]
+        else:
+            media_type = negotiate_media_type(accept, list(SPARQL_RESULT_TYPES))
+            if media_type is None:
+                return self.send_text(406, "No acceptable results format")
+            fmt = SPARQL_RESULT_TYPES[media_type]
+            if result["type_"] == "ASK":
+                chunks = [stream_ask_result(result["askAnswer"], fmt)]
+            else:
+                chunks = stream_sparql_results(result["vars_"], result["bindings"], fmt)
+        self.send_response(200)
+        self.send_header("Content-Type", f"{media_type}; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        buffer = []
+        size = 0
+        # Solutions are still being evaluated while they stream
+        try:
+            with query_deadline(deadline):
+                for chunk in chunks:
+                    check_query_deadline()
+                    buffer.append(chunk)
+                    size += len(chunk)
+                    if size >= 65536:
+                        self.write_chunk("".join(buffer))
+                        buffer, size = [], 0
+        except QueryTimeout:
+            # Headers are already sent; drop the connection without the
+            # terminating chunk so clients see a truncated response
+            self.close_connection = True
+            return
+        if buffer:
+            self.write_chunk("".join(buffer))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+
+    def send_text(self, status, message):
+        data = (message + "\n").encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+class SPARQLEndpoint:
+    """Local SPARQL 1.1 Protocol endpoint serving the current knowledge graph"""
+    def __init__(self, published, host="127.0.0.1", port=3030,
+                 path="/sparql", max_workers=8, timeout=30.0):
+        self.published = published
+        self.host = host
+        self.port = port
+        self.path = path
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.server = None
+        self.query_executor = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}{self.path}"
+
+    @property
+    def running(self):
+        return self.server is not None
+
+    def start(self):
+        self.server = _PooledHTTPServer((self.host, self.port), _SPARQLRequestHandler,
+                                        self.max_workers)
+        self.server.endpoint = self
+        # Pick up the real port when started with port=0
+        self.port = self.server.server_address[1]
+        self.query_executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                 thread_name_prefix="sparql-query")
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.query_executor.shutdown(wait=False)
+        self.server = None
+        self.query_executor = None
+
+    def start_query(self, graph, prepared, deadline):
+        """Evaluate a prepared query, pulling the first solution eagerly"""
+        with query_deadline(deadline):
+            result = kg_query.evalQuery(graph, prepared)
+            if result["type_"] == "SELECT":
+                bindings = iter(result["bindings"])
+                first = next(bindings, None)
+                result = dict(result)
+                result["bindings"] = bindings if first is None else chain([first], bindings)
+        return result
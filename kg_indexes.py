@@ -0,0 +1,1263 @@
+"""The KG dataset, its incrementally maintained indexes and spilled script partitions"""
+
+from rdflib import Graph, Dataset, URIRef, Literal, Namespace, BNode
+from rdflib.graph import DATASET_DEFAULT_GRAPH_ID
+from rdflib.paths import Path
+from rdflib.namespace import RDF, RDFS
+import json
+import time
+import os
+from decimal import Decimal
+import threading
+import shutil
+from collections import Counter, defaultdict, OrderedDict
+from contextlib import contextmanager, nullcontext
+from bisect import bisect_left, bisect_right
+import heapq
+import re
+
+from kg_metrics import StageMetrics, np
+
+class KGStatistics:
+    """Dataset statistics kept current as triples are added and removed"""
+    def __init__(self, ns, scripts=()):
+        self.ns = ns
+        # Longest names first so 'standard_yi_x' is not attributed to 'yi'
+        self.scripts = sorted(scripts, key=len, reverse=True)
+        self.triples = 0
+        self.classes = Counter()
+        self.properties = Counter()
+        self.property_subjects = defaultdict(Counter)
+        self.property_objects = defaultdict(Counter)
+        self.subjects = Counter()
+        self.objects = Counter()
+        self.symbol_scripts = {}
+        self.script_triples = Counter()
+        self.script_symbols = Counter()
+        self.similar_links = {}
+        self.linksets = Counter()
+        # Bumped on every change, invalidating the plans cached below
+        self.version = 0
+        self._plans = {}
+        self._plans_version = 0
+
+    def triple_added(self, triple):
+        s, p, o = triple
+        self.version += 1
+        self.triples += 1
+        self.properties[p] += 1
+        self.property_subjects[p][s] += 1
+        self.property_objects[p][o] += 1
+        self.subjects[s] += 1
+        self.objects[o] += 1
+        if p == self.ns.fromScript:
+            self.symbol_scripts[s] = str(o)
+        script = self.script_of(s)
+        if script is not None:
+            self.script_triples[script] += 1
+        if p == RDF.type:
+            self.classes[o] += 1
+            if o == self.ns.Symbol and script is not None:
+                self.script_symbols[script] += 1
+        elif p == self.ns.similarTo:
+            pair = (script, self.script_of(o))
+            if None not in pair:
+                self.similar_links[(s, o)] = pair
+                self.linksets[pair] += 1
+
+    def triple_removed(self, triple):
+        s, p, o = triple
+        script = self.script_of(s)
+        self.version += 1
+        self.triples -= 1
+        _decrement(self.properties, p)
+        _decrement(self.property_subjects[p], s)
+        _decrement(self.property_objects[p], o)
+        if not self.properties[p]:
+            del self.property_subjects[p], self.property_objects[p]
+        _decrement(self.subjects, s)
+        _decrement(self.objects, o)
+        if script is not None:
+            _decrement(self.script_triples, script)
+        if p == self.ns.fromScript:
+            self.symbol_scripts.pop(s, None)
+        elif p == RDF.type:
+            _decrement(self.classes, o)
+            if o == self.ns.Symbol and script is not None:
+                _decrement(self.script_symbols, script)
+        elif p == self.ns.similarTo:
+            pair = self.similar_links.pop((s, o), None)
+            if pair is not None:
+                _decrement(self.linksets, pair)
+
+    def cached_plan(self, key, plan):
+        """plan() for a query part, computed once until the statistics change"""
+        if self._plans_version != self.version:
+            self._plans, self._plans_version = {}, self.version
+        plans = self._plans
+        ordered = plans.get(key)
+        if ordered is None:
+            if len(plans) >= 256:
+                plans.clear()
+            ordered = plans[key] = plan()
+        return ordered
+
+    def script_of(self, node):
+        """Source script of a symbol, falling back to its URI prefix"""
+        script = self.symbol_scripts.get(node)
+        if script is not None:
+            return script
+        if not str(node).startswith(str(self.ns)):
+            return None
+        local_name = str(node)[len(str(self.ns)):]
+        for script in self.scripts:
+            if local_name == script or local_name.startswith(script + "_"):
+                return script
+        return None
+
+def _decrement(counter, key):
+    """Decrement a counter, dropping the key at zero so len() stays distinct"""
+    counter[key] -= 1
+    if counter[key] <= 0:
+        del counter[key]
+
+def term_to_json(term):
+    """JSON form of an RDF term, as a list of its kind and parts"""
+    if isinstance(term, Literal):
+        return ["literal", str(term), term.datatype and str(term.datatype), term.language]
+    if isinstance(term, BNode):
+        return ["bnode", str(term)]
+    return ["uri", str(term)]
+
+def term_from_json(value):
+    kind = value[0]
+    if kind == "literal":
+        return Literal(value[1], datatype=value[2], lang=value[3])
+    if kind == "bnode":
+        return BNode(value[1])
+    return URIRef(value[1])
+
+def write_triples(path, triples):
+    """Write triples as JSON lines of encoded terms
+
+    Unlike N-Triples this keeps URIs the serializer rejects, such as those
+    made from image names with spaces.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        for triple in triples:
+            f.write(json.dumps([term_to_json(term) for term in triple]) + "\n")
+
+def read_triples(path):
+    """Triples of a write_triples file, in the order they were written"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            yield tuple(term_from_json(value) for value in json.loads(line))
+
+class QueryTimeout(Exception):
+    """A query ran past the deadline set for its thread"""
+
+_query_deadline = threading.local()
+
+@contextmanager
+def query_deadline(deadline):
+    """Make graph scans in this thread raise QueryTimeout once time.monotonic() passes deadline
+
+    Every pattern match goes through the graph's triples(), so evaluation
+    stops itself at its next scan rather than running to completion.
+    """
+    previous = getattr(_query_deadline, "at", None)
+    _query_deadline.at = deadline
+    try:
+        yield
+    finally:
+        _query_deadline.at = previous
+
+def remaining_query_time():
+    """Seconds left before this thread's query deadline, or None without one"""
+    deadline = getattr(_query_deadline, "at", None)
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+def check_query_deadline():
+    deadline = getattr(_query_deadline, "at", None)
+    if deadline is not None and time.monotonic() > deadline:
+        raise QueryTimeout()
+
+# Named graphs: one per script folder plus the ontology
+KG_GRAPHS = Namespace("http://example.org/scripts/graph/")
+ONTOLOGY_GRAPH = KG_GRAPHS.ontology
+
+class PartitionIndex:
+    """Per named graph predicate columns, so a scan can skip other graphs
+
+    The memory store filters by graph only after matching a pattern across
+    all of them; these columns let a predicate scan touch one graph's rows.
+    """
+    def __init__(self):
+        self.graphs = defaultdict(lambda: defaultdict(set))
+
+    def add(self, triple, graph_id):
+        s, p, o = triple
+        self.graphs[graph_id][p].add((s, o))
+
+    def remove(self, triple, graph_id):
+        s, p, o = triple
+        columns = self.graphs.get(graph_id)
+        if columns is None or p not in columns:
+            return
+        columns[p].discard((s, o))
+        if not columns[p]:
+            del columns[p]
+        if not columns:
+            del self.graphs[graph_id]
+
+    def triple_count(self, graph_id):
+        return sum(len(column) for column in self.graphs.get(graph_id, {}).values())
+
+class _NamedGraph(Graph):
+    """Named graph of an IndexedDataset, routing changes through the dataset"""
+    def __init__(self, dataset, identifier):
+        super().__init__(store=dataset.store, identifier=identifier,
+                         namespace_manager=dataset.namespace_manager)
+        self.dataset = dataset
+
+    def add(self, triple):
+        self.dataset.add((*triple, self))
+        return self
+
+    def addN(self, quads):
+        for s, p, o, c in quads:
+            self.dataset.add((s, p, o, self))
+        return self
+
+    def remove(self, triple):
+        self.dataset.remove((*triple, self))
+        return self
+
+    def triples(self, triple):
+        check_query_deadline()
+        s, p, o = triple
+        columns = self.dataset.partitions.graphs.get(self.identifier, {})
+        if s is None and o is None and isinstance(p, URIRef):
+            for s, o in list(columns.get(p, ())):
+                yield s, p, o
+        elif s is None and p is None and o is None:
+            for p, column in list(columns.items()):
+                for s, o in list(column):
+                    yield s, p, o
+        else:
+            yield from super().triples(triple)
+
+class IndexedDataset(Dataset):
+    """Dataset of named graphs whose registered indexes cover their union
+
+    Indexes see each distinct triple once, however many graphs hold it.
+    Script graphs are filled by the loader with every triple about that
+    script's symbols, which is what lets a fromScript constraint prune the
+    other script graphs from a query.
+    """
+    def __init__(self, partition_key=None):
+        super().__init__(default_union=True)
+        self.indexes = {}
+        self.partitions = PartitionIndex()
+        self.partition_key = partition_key
+        self.script_graphs = {}
+        self.default_graph = self.get_context(DATASET_DEFAULT_GRAPH_ID)
+        # Set once the script graphs are persisted for on-demand loading
+        self.partition_cache = None
+        # Set to evaluate partition-confined query parts in worker processes
+        self.query_pool = None
+        # Whether the analyzer's SPARQL evaluators answer queries on this dataset
+        self.evaluators_enabled = True
+        # Bumped on every change, so cached query results can tell they are stale
+        self.version = 0
+        # Readers and in-place writers of this KG; publishing another takes no lock
+        self.lock = ReadWriteLock()
+        self._paging = False
+        self.result_views = QueryResultViews()
+
+    def get_context(self, identifier, quoted=False, base=None):
+        return _NamedGraph(self, identifier)
+
+    def script_graph(self, script):
+        """Named graph holding one script's triples"""
+        self.script_graphs[script] = KG_GRAPHS[script]
+        return self.graph(KG_GRAPHS[script])
+
+    def pruned_view(self, script):
+        """The script's graph plus every graph that is not a script graph"""
+        identifier = self.script_graphs[script]
+        others = set(self.script_graphs.values())
+        graphs = [self.get_context(identifier)] + [
+            self.get_context(graph_id) for graph_id in list(self.partitions.graphs)
+            if graph_id not in others]
+        return _GraphView(graphs)
+
+    def add_index(self, name, index):
+        """Register an index, feeding it the triples already in the dataset"""
+        for triple in self.triples((None, None, None)):
+            index.triple_added(triple)
+        self.indexes[name] = index
+        return index
+
+    def _target_graph(self, graph):
+        if graph is None:
+            return self.default_graph
+        if isinstance(graph, _NamedGraph) and graph.dataset is self:
+            return graph
+        return self._graph(graph)
+
+    def add(self, triple_or_quad):
+        """Add a triple to the default graph or a quad to its named graph"""
+        s, p, o = triple_or_quad[:3]
+        graph = self._target_graph(triple_or_quad[3] if len(triple_or_quad) == 4 else None)
+        triple = (s, p, o)
+        # One store lookup finds every graph already holding the triple
+        holders = {context.identifier for _, contexts in self.store.triples(triple, context=None)
+                   for context in contexts}
+        if graph.identifier in holders:
+            return self
+        self.store.add(triple, context=graph, quoted=False)
+        self.partitions.add(triple, graph.identifier)
+        if self._paging:
+            return self
+        self.version += 1
+        if not holders:
+            for index in self.indexes.values():
+                index.triple_added(triple)
+        return self
+
+    def addN(self, quads):
+        for quad in quads:
+            self.add(quad)
+        return self
+
+    def remove(self, triple_or_quad):
+        """Remove matching triples from one named graph, or from all of them"""
+        s, p, o = triple_or_quad[:3]
+        graph = None
+        if len(triple_or_quad) == 4 and triple_or_quad[3] is not None:
+            graph = self._target_graph(triple_or_quad[3])
+        removed = [(triple, context.identifier) for triple, contexts in self.store.triples((s, p, o), context=graph)
+                   for context in contexts
+                   if graph is None or context.identifier == graph.identifier]
+        self.store.remove((s, p, o), context=graph)
+        for triple, graph_id in removed:
+            self.partitions.remove(triple, graph_id)
+        if self._paging:
+            return self
+        if removed:
+            self.version += 1
+        for triple in {triple for triple, graph_id in removed}:
+            if triple not in self:
+                for index in self.indexes.values():
+                    index.triple_removed(triple)
+        return self
+
+    def remove_graph(self, g):
+        self.remove((None, None, None, g))
+        return super().remove_graph(g)
+
+    def __len__(self):
+        # The whole KG, including script graphs paged out to disk
+        stats = self.indexes.get("stats")
+        return super().__len__() if stats is None else stats.triples
+
+    @contextmanager
+    def paging(self):
+        """Page triples in or out without changing the KG they belong to
+
+        Indexes and the version are left alone, so they keep describing the
+        whole KG whatever is resident.
+        """
+        self._paging = True
+        try:
+            yield
+        finally:
+            self._paging = False
+
+    def triples(self, triple_or_quad, context=None):
+        check_query_deadline()
+        # Union lookups go straight to the store; rdflib's own path warns
+        # about a deprecated attribute on every call
+        if context is None and len(triple_or_quad) == 3 and not isinstance(triple_or_quad[1], Path):
+            for triple, _ in self.store.triples(triple_or_quad, context=None):
+                yield triple
+        else:
+            yield from super().triples(triple_or_quad, context)
+
+    def query(self, *args, **kwargs):
+        # Query strings parsed by rdflib itself must still see our evaluators
+        from kg_query import load_sparql
+        load_sparql()
+        return super().query(*args, **kwargs)
+
+class _GraphView:
+    """Read-only union of graphs for pattern matching, each triple once"""
+    def __init__(self, graphs):
+        self.graphs = graphs
+
+    def triples(self, triple):
+        for i, graph in enumerate(self.graphs):
+            earlier = self.graphs[:i]
+            for match in graph.triples(triple):
+                if not any(match in other for other in earlier):
+                    yield match
+
+class PartitionCache:
+    """Script graphs persisted to disk and loaded on demand, LRU under a memory budget
+
+    Once every script graph has been written out, only the graphs that
+    queries and exports touch stay in the dataset. Loading and eviction
+    change the dataset and need the write lock.
+
+    They change what is resident, not what the KG holds: paging a script's
+    triples leaves the indexes and the dataset version alone, so statistics,
+    labels, views and len() cover the whole KG and results cached against
+    the version stay valid. The budget bounds the script graphs in the
+    store only; the indexes stay in memory whatever is resident.
+    """
+    def __init__(self, dataset, directory, budget_bytes=0, stages=None):
+        self.dataset = dataset
+        self.directory = directory
+        self.budget_bytes = budget_bytes
+        self.stages = stages or StageMetrics()
+        self.sizes = {}
+        self.triples = {}
+        # Scripts whose triples the dataset's indexes already hold
+        self.indexed = set()
+        # Least recently used first
+        self.resident = OrderedDict()
+        self.pins = Counter()
+        self._mutex = threading.Lock()
+
+    def path(self, script):
+        return os.path.join(self.directory, f"{script}.jsonl")
+
+    def save(self, script, size_bytes):
+        """Persist a resident script graph, with its estimated in-memory size"""
+        triples = list(self.dataset.script_graph(script).triples((None, None, None)))
+        write_triples(self.path(script), triples)
+        self.sizes[script] = size_bytes
+        self.triples[script] = len(triples)
+        self.indexed.add(script)
+        with self._mutex:
+            self.resident[script] = True
+            self.resident.move_to_end(script)
+
+    def wanted(self, scripts=None):
+        """Persisted scripts among the given ones, all of them for None"""
+        return list(self.sizes) if scripts is None else [s for s in scripts if s in self.sizes]
+
+    def resident_bytes(self):
+        return sum(self.sizes[script] for script in self.resident)
+
+    def over_budget(self):
+        return bool(self.budget_bytes) and self.resident_bytes() > self.budget_bytes
+
+    def is_resident(self, scripts=None):
+        return all(script in self.resident for script in self.wanted(scripts))
+
+    def load(self, scripts=None):
+        """Load the scripts' graphs (all by default), then trim others to the budget"""
+        wanted = self.wanted(scripts)
+        with self._mutex:
+            self.pins.update(wanted)
+        try:
+            for script in wanted:
+                if script not in self.resident:
+                    graph = self.dataset.script_graph(script)
+                    # A worker's mirror indexes a partition on its first load
+                    paging = self.dataset.paging() if script in self.indexed else nullcontext()
+                    with self.stages.time("partition_load"), paging:
+                        for triple in read_triples(self.path(script)):
+                            graph.add(triple)
+                    self.indexed.add(script)
+                    self.stages.increment("partition_loads")
+                with self._mutex:
+                    self.resident[script] = True
+                    self.resident.move_to_end(script)
+            self.trim()
+        finally:
+            with self._mutex:
+                self.pins.subtract(wanted)
+
+    def trim(self):
+        """Evict least recently used, unpinned graphs until within the budget"""
+        for script in list(self.resident):
+            if not self.over_budget():
+                break
+            with self._mutex:
+                if self.pins[script]:
+                    continue
+                del self.resident[script]
+            with self.stages.time("partition_evict"), self.dataset.paging():
+                self.dataset.remove_graph(KG_GRAPHS[script])
+            self.stages.increment("partition_evictions")
+
+    def evicted_triples(self, predicate=None):
+        """Triples of the scripts that are not resident, read from disk without loading them"""
+        for script in self.wanted():
+            if script in self.resident:
+                continue
+            for triple in read_triples(self.path(script)):
+                if predicate is None or triple[1] == predicate:
+                    yield triple
+
+    def acquire_read(self, scripts=None):
+        """Read-lock the dataset with the scripts' graphs resident
+
+        The scripts stay pinned until the read lock is held, so a concurrent
+        load cannot evict them in between.
+        """
+        wanted = self.wanted(scripts)
+        with self._mutex:
+            self.pins.update(wanted)
+            for script in wanted:
+                if script in self.resident:
+                    self.resident.move_to_end(script)
+        try:
+            if not self.is_resident(wanted):
+                with self.dataset.lock.write():
+                    self.load(wanted)
+            self.dataset.lock.acquire_read()
+        finally:
+            with self._mutex:
+                self.pins.subtract(wanted)
+
+    def release_read(self, reader=None):
+        """Release the read lock, evicting what a wide read left over budget"""
+        self.dataset.lock.release_read(reader)
+        if self.over_budget():
+            with self.dataset.lock.write():
+                self.trim()
+
+    def discard(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+def acquire_resident(dataset, scripts=None):
+    """Read-lock a dataset, loading the scripts' graphs first if it spills to disk"""
+    cache = getattr(dataset, "partition_cache", None)
+    if cache is None:
+        dataset.lock.acquire_read()
+    else:
+        cache.acquire_read(scripts)
+
+def release_resident(dataset, reader=None):
+    """Release acquire_resident; reader is the acquiring thread's ident when released from another thread"""
+    cache = getattr(dataset, "partition_cache", None)
+    if cache is None:
+        dataset.lock.release_read(reader)
+    else:
+        cache.release_read(reader)
+
+@contextmanager
+def resident_scripts(dataset, scripts=None):
+    """Read lock with the given scripts' graphs (all by default) loaded"""
+    acquire_resident(dataset, scripts)
+    try:
+        yield
+    finally:
+        release_resident(dataset)
+
+VIEW = Namespace("http://example.org/scripts/views#")
+
+class MaterializedViews:
+    """Analytical views over the KG kept current as triples change.
+
+    Frequency rankings per script, similarity rankings per script pair and
+    contour histograms per script. Rankings are recomputed lazily for the
+    scripts a change touched; histograms are updated in place.
+    """
+    def __init__(self, stats, top_n=10, top_k=10):
+        self.stats = stats
+        self.ns = stats.ns
+        self.top_n = top_n
+        self.top_k = top_k
+        self.version = 0
+        self.frequencies = defaultdict(dict)
+        self.contours = {}
+        self.contour_histograms = defaultdict(Counter)
+        self.similar_targets = defaultdict(set)
+        self.similarity_scores = defaultdict(Counter)
+        self._top_frequency = {}
+        self._top_similarity = None
+        self._graph = None
+        self._graph_version = -1
+
+    def triple_added(self, triple):
+        s, p, o = triple
+        if p == self.ns.symbolFrequency:
+            self.frequencies[self.stats.script_of(s)][s] = o.toPython()
+            self._top_frequency.pop(self.stats.script_of(s), None)
+        elif p == self.ns.contourCount:
+            script = self.stats.script_of(s)
+            self.contours[s] = o.toPython()
+            self.contour_histograms[script][o.toPython()] += 1
+        elif p == self.ns.similarTo:
+            self.similar_targets[s].add(o)
+            self._top_similarity = None
+        elif p == self.ns.similarityScore:
+            self.similarity_scores[s][o.toPython()] += 1
+            self._top_similarity = None
+        else:
+            return
+        self.version += 1
+
+    def triple_removed(self, triple):
+        s, p, o = triple
+        if p == self.ns.symbolFrequency:
+            script = self.stats.script_of(s)
+            self.frequencies[script].pop(s, None)
+            self._top_frequency.pop(script, None)
+        elif p == self.ns.contourCount:
+            script = self.stats.script_of(s)
+            if self.contours.pop(s, None) is not None:
+                _decrement(self.contour_histograms[script], o.toPython())
+        elif p == self.ns.similarTo:
+            self.similar_targets[s].discard(o)
+            self._top_similarity = None
+        elif p == self.ns.similarityScore:
+            _decrement(self.similarity_scores[s], o.toPython())
+            self._top_similarity = None
+        else:
+            return
+        self.version += 1
+
+    def refresh(self):
+        """Compute every stale ranking now so later reads are lookups"""
+        for script in list(self.frequencies):
+            self.top_frequency(script)
+        self.top_similarity()
+
+    def top_frequency(self, script):
+        """[(symbol, frequency)] for the script's most frequent symbols"""
+        ranking = self._top_frequency.get(script)
+        if ranking is None:
+            ranking = heapq.nlargest(self.top_n, self.frequencies.get(script, {}).items(),
+                                     key=lambda item: item[1])
+            self._top_frequency[script] = ranking
+        return ranking
+
+    def top_similarity(self):
+        """{(script, target script): [(symbol, target, score)]} best pairs first"""
+        if self._top_similarity is None:
+            # Every similarTo of a symbol pairs with each of its scores, as in
+            # the cross-script SPARQL example
+            candidates = defaultdict(list)
+            for s, targets in self.similar_targets.items():
+                if not targets or not self.similarity_scores[s]:
+                    continue
+                best_scores = heapq.nlargest(self.top_k, self.similarity_scores[s])
+                script = self.stats.script_of(s)
+                for o in targets:
+                    pair = (script, self.stats.script_of(o))
+                    if None in pair:
+                        continue
+                    candidates[pair].extend((s, o, score) for score in best_scores)
+            self._top_similarity = {
+                pair: heapq.nlargest(self.top_k, rows, key=lambda row: row[2])
+                for pair, rows in candidates.items()
+            }
+        return self._top_similarity
+
+    def as_graph(self):
+        """The views as RDF rows in the VIEW namespace, rebuilt when stale"""
+        if self._graph_version == self.version:
+            return self._graph
+        graph = Graph()
+        graph.bind("view", VIEW)
+        for script in self.frequencies:
+            if script is None:
+                continue
+            for rank, (symbol, frequency) in enumerate(self.top_frequency(script), 1):
+                row = VIEW[f"topFrequency/{script}/{rank}"]
+                graph.add((row, VIEW.view, VIEW.topFrequency))
+                graph.add((row, VIEW.script, Literal(script)))
+                graph.add((row, VIEW.rank, Literal(rank)))
+                graph.add((row, VIEW.symbol, symbol))
+                graph.add((row, VIEW.value, Literal(frequency)))
+        for (script, target_script), rows in self.top_similarity().items():
+            for rank, (symbol, target, score) in enumerate(rows, 1):
+                row = VIEW[f"topSimilarity/{script}/{target_script}/{rank}"]
+                graph.add((row, VIEW.view, VIEW.topSimilarity))
+                graph.add((row, VIEW.script, Literal(script)))
+                graph.add((row, VIEW.targetScript, Literal(target_script)))
+                graph.add((row, VIEW.rank, Literal(rank)))
+                graph.add((row, VIEW.symbol, symbol))
+                graph.add((row, VIEW.target, target))
+                graph.add((row, VIEW.value, Literal(score)))
+        for script, histogram in self.contour_histograms.items():
+            if script is None:
+                continue
+            for contours, count in histogram.items():
+                row = VIEW[f"contourHistogram/{script}/{contours}"]
+                graph.add((row, VIEW.view, VIEW.contourHistogram))
+                graph.add((row, VIEW.script, Literal(script)))
+                graph.add((row, VIEW.contours, Literal(contours)))
+                graph.add((row, VIEW.value, Literal(count)))
+        self._graph, self._graph_version = graph, self.version
+        return graph
+
+_LABEL_TOKENS = re.compile(r"[^\W_]+")
+
+class LabelIndex:
+    """Sorted label and token arrays for prefix search over rdfs:label
+
+    Changes only mark the arrays stale; they are re-sorted on the next
+    lookup or refresh, so a bulk load pays for one sort.
+    """
+    def __init__(self):
+        self.labels = {}
+        self._keys = []
+        self._tokens = []
+        self._stale = False
+
+    def triple_added(self, triple):
+        s, p, o = triple
+        if p == RDFS.label:
+            self.labels[s] = str(o)
+            self._stale = True
+
+    def triple_removed(self, triple):
+        s, p, o = triple
+        if p == RDFS.label and self.labels.get(s) == str(o):
+            del self.labels[s]
+            self._stale = True
+
+    def refresh(self):
+        """Re-sort the lookup arrays if labels changed since the last sort"""
+        if not self._stale:
+            return
+        self._keys = sorted((label.casefold(), s) for s, label in self.labels.items())
+        self._tokens = sorted({(token, s) for key, s in self._keys
+                               for token in _LABEL_TOKENS.findall(key)})
+        self._stale = False
+
+    @staticmethod
+    def _range(array, prefix):
+        """Index bounds of the entries whose sort key starts with prefix"""
+        return bisect_left(array, (prefix,)), bisect_left(array, (prefix + "\U0010ffff",))
+
+    def search(self, text, limit=20):
+        """[(label, subject)] matching text as a label prefix, then by token prefixes
+
+        Every word of text has to prefix some word of the label for a token
+        match, so "geometric 4" finds "Ba-Shu_scripts_(geometric_symbols)_4".
+        """
+        self.refresh()
+        prefix = text.strip().casefold()
+        if not prefix:
+            return []
+        start, end = self._range(self._keys, prefix)
+        matches = [s for _, s in self._keys[start:min(end, start + limit)]]
+        words = _LABEL_TOKENS.findall(prefix)
+        if len(matches) < limit and words:
+            # Only the rarest word's subjects are listed; the other words
+            # are checked against each candidate's own tokens
+            bounds = {word: self._range(self._tokens, word) for word in words}
+            rarest = min(words, key=lambda word: bounds[word][1] - bounds[word][0])
+            start, end = bounds[rarest]
+            found = set(matches)
+            candidates = {s for _, s in self._tokens[start:end]} - found
+            others = [word for word in words if word != rarest]
+            for s in sorted(candidates, key=lambda s: self.labels[s].casefold()):
+                tokens = _LABEL_TOKENS.findall(self.labels[s].casefold())
+                if all(any(token.startswith(word) for token in tokens) for word in others):
+                    matches.append(s)
+                    if len(matches) == limit:
+                        break
+        return [(self.labels[s], s) for s in matches]
+
+def numeric_value(term):
+    """Python number for a numeric literal, None for anything else
+
+    Values keep their type, as rdflib compares them in FILTERs: the double
+    0.8 is greater than the decimal 0.8.
+    """
+    if not isinstance(term, Literal):
+        return None
+    value = term.toPython()
+    if isinstance(value, bool) or not isinstance(value, (int, float, Decimal)):
+        return None
+    return value
+
+class NumericIndex:
+    """Value-sorted columns of (subject, literal) pairs for numeric properties
+
+    A column only answers queries while every object of its predicate is a
+    numeric literal; otherwise the scan could silently drop rows.
+    """
+    def __init__(self, predicates):
+        self.rows = {p: set() for p in predicates}
+        self.non_numeric = Counter()
+        self._columns = {}
+
+    def triple_added(self, triple):
+        s, p, o = triple
+        rows = self.rows.get(p)
+        if rows is None:
+            return
+        value = numeric_value(o)
+        if value is None:
+            self.non_numeric[p] += 1
+        else:
+            rows.add((value, s, o))
+        self._columns.pop(p, None)
+
+    def triple_removed(self, triple):
+        s, p, o = triple
+        rows = self.rows.get(p)
+        if rows is None:
+            return
+        value = numeric_value(o)
+        if value is None:
+            _decrement(self.non_numeric, p)
+        else:
+            rows.discard((value, s, o))
+        self._columns.pop(p, None)
+
+    def add_predicate(self, predicate, triples):
+        """Start indexing a predicate, backfilled from its existing triples"""
+        if predicate in self.rows:
+            return
+        self.rows[predicate] = set()
+        for triple in triples:
+            self.triple_added(triple)
+
+    def remove_predicate(self, predicate):
+        self.rows.pop(predicate, None)
+        self.non_numeric.pop(predicate, None)
+        self._columns.pop(predicate, None)
+
+    def covers(self, predicate):
+        return predicate in self.rows and not self.non_numeric[predicate]
+
+    def column(self, predicate):
+        """(values, pairs) sorted by value, rebuilt after changes"""
+        column = self._columns.get(predicate)
+        if column is None:
+            rows = sorted(self.rows[predicate], key=lambda row: row[0])
+            column = ([row[0] for row in rows], [row[1:] for row in rows])
+            self._columns[predicate] = column
+        return column
+
+    def refresh(self):
+        for predicate in self.rows:
+            self.column(predicate)
+
+    def scan(self, predicate, low=None, high=None, low_inclusive=True, high_inclusive=True,
+             descending=False):
+        """(subject, literal) pairs with low <= value <= high, in value order"""
+        values, pairs = self.column(predicate)
+        start = 0 if low is None else \
+                (bisect_left if low_inclusive else bisect_right)(values, low)
+        stop = len(values) if high is None else \
+               (bisect_right if high_inclusive else bisect_left)(values, high)
+        positions = range(start, stop)
+        for i in reversed(positions) if descending else positions:
+            yield pairs[i]
+
+class SymbolTable:
+    """Columnar symbol table, one row per Symbol, kept current with the KG
+
+    Values are tracked per triple in plain dicts; the NumPy columns are built
+    on first use after a change and reused until the next one, so analytics
+    aggregate arrays instead of walking the graph and unboxing literals.
+    """
+    # Single-valued numeric properties and their column names
+    COLUMNS = {"symbolFrequency": "frequency", "contourCount": "contours",
+               "imageWidth": "width", "imageHeight": "height", "inkDensity": "ink_density"}
+    INTEGER_COLUMNS = ("frequency", "contours", "width", "height")
+
+    def __init__(self, ns, stats):
+        self.ns = ns
+        # Attributes similarTo targets, which are not always symbols, to scripts
+        self.stats = stats
+        self.predicates = {ns[name]: column for name, column in self.COLUMNS.items()}
+        self.symbols = {}
+        self.scripts = {}
+        self.labels = {}
+        self.values = {column: {} for column in self.COLUMNS.values()}
+        self.link_scripts = {}
+        self.link_counts = defaultdict(Counter)
+        self.scores = defaultdict(list)
+        self._columns = None
+
+    def triple_added(self, triple):
+        s, p, o = triple
+        if p == RDF.type:
+            if o == self.ns.Symbol:
+                self.symbols[s] = True
+            else:
+                return
+        elif p == self.ns.fromScript:
+            self.scripts[s] = str(o)
+        elif p == RDFS.label:
+            self.labels[s] = str(o)
+        elif p in self.predicates:
+            value = numeric_value(o)
+            if value is None:
+                return
+            self.values[self.predicates[p]][s] = float(value)
+        elif p == self.ns.similarTo:
+            target_script = self.stats.script_of(o)
+            self.link_scripts[(s, o)] = target_script
+            self.link_counts[s][target_script] += 1
+        elif p == self.ns.similarityScore:
+            value = numeric_value(o)
+            if value is None:
+                return
+            self.scores[s].append(float(value))
+        else:
+            return
+        self._columns = None
+
+    def triple_removed(self, triple):
+        s, p, o = triple
+        if p == RDF.type:
+            if o != self.ns.Symbol:
+                return
+            self.symbols.pop(s, None)
+        elif p == self.ns.fromScript:
+            self.scripts.pop(s, None)
+        elif p == RDFS.label:
+            self.labels.pop(s, None)
+        elif p in self.predicates:
+            column = self.values[self.predicates[p]]
+            value = numeric_value(o)
+            if value is None or column.get(s) != float(value):
+                return
+            del column[s]
+        elif p == self.ns.similarTo:
+            if (s, o) not in self.link_scripts:
+                return
+            _decrement(self.link_counts[s], self.link_scripts.pop((s, o)))
+            if not self.link_counts[s]:
+                del self.link_counts[s]
+        elif p == self.ns.similarityScore:
+            value = numeric_value(o)
+            scores = self.scores.get(s)
+            if value is None or not scores or float(value) not in scores:
+                return
+            scores.remove(float(value))
+            if not scores:
+                del self.scores[s]
+        else:
+            return
+        self._columns = None
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def columns(self):
+        """Dict of NumPy columns; 'script' holds codes into 'script_names' (-1 if unknown)
+
+        Numeric columns are float64 with NaN for missing values. 'link_counts'
+        has a column per 'link_script_names' entry: each symbol's similarTo
+        links into that script.
+        """
+        if self._columns is not None:
+            return self._columns
+        subjects = list(self.symbols)
+        count = len(subjects)
+        script_names = sorted({self.scripts[s] for s in subjects if s in self.scripts})
+        codes = {name: i for i, name in enumerate(script_names)}
+        columns = {
+            "symbol": np.array([str(s) for s in subjects], dtype=object),
+            "label": np.array([self.labels.get(s, "") for s in subjects], dtype=object),
+            "script": np.fromiter((codes.get(self.scripts.get(s), -1) for s in subjects),
+                                  dtype=np.int16, count=count),
+            "script_names": script_names,
+        }
+        for column, values in self.values.items():
+            columns[column] = np.fromiter((values.get(s, np.nan) for s in subjects),
+                                          dtype=np.float64, count=count)
+        link_script_names = sorted({script for counts in self.link_counts.values()
+                                    for script in counts if script is not None})
+        link_codes = {name: i for i, name in enumerate(link_script_names)}
+        link_counts = np.zeros((count, len(link_script_names)), dtype=np.int32)
+        for row, s in enumerate(subjects):
+            for script, links in self.link_counts.get(s, {}).items():
+                if script is not None:
+                    link_counts[row, link_codes[script]] = links
+        columns["link_counts"] = link_counts
+        columns["link_script_names"] = link_script_names
+        columns["similarity_links"] = np.fromiter(
+            (sum(self.link_counts[s].values()) if s in self.link_counts else 0 for s in subjects),
+            dtype=np.int32, count=count)
+        columns["similarity_mean"] = np.fromiter(
+            (sum(self.scores[s]) / len(self.scores[s]) if s in self.scores else np.nan for s in subjects),
+            dtype=np.float64, count=count)
+        self._columns = columns
+        return columns
+
+    def aggregate(self, column):
+        """Per-script count, mean, min and max of a numeric column, missing values skipped"""
+        columns = self.columns()
+        values, codes = columns[column], columns["script"]
+        keep = ~np.isnan(values) & (codes >= 0)
+        values, codes = values[keep], codes[keep]
+        n = len(columns["script_names"])
+        counts = np.bincount(codes, minlength=n)
+        sums = np.bincount(codes, weights=values, minlength=n)
+        lows = np.full(n, np.inf)
+        highs = np.full(n, -np.inf)
+        np.minimum.at(lows, codes, values)
+        np.maximum.at(highs, codes, values)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / counts
+        return {name: {"count": int(counts[i]), "mean": float(means[i]),
+                       "min": float(lows[i]), "max": float(highs[i])}
+                for i, name in enumerate(columns["script_names"]) if counts[i]}
+
+    def histogram(self, column, bins=20):
+        """(bin edges, {script: counts}) for a numeric column, with edges shared by all scripts
+
+        ``column`` is a column name or an array aligned with the columns.
+        """
+        columns = self.columns()
+        values = columns[column] if isinstance(column, str) else column
+        codes = columns["script"]
+        keep = ~np.isnan(values) & (codes >= 0)
+        n = len(columns["script_names"])
+        if not keep.any():
+            return np.array([]), {}
+        counts, _, edges = np.histogram2d(codes[keep], values[keep],
+                                          bins=[np.arange(n + 1) - 0.5, bins])
+        return edges, {name: counts[i].astype(np.int64) for i, name in enumerate(columns["script_names"])}
+
+    def similarity_matrix(self):
+        """(scripts, target scripts, mean score matrix) over similarTo links
+
+        As in the cross-script SPARQL example, every link of a symbol pairs
+        with each of its scores, so a link weighs in with the symbol's mean
+        score. Script pairs without links are NaN.
+        """
+        columns = self.columns()
+        counts = columns["link_counts"]
+        keep = (columns["script"] >= 0) & ~np.isnan(columns["similarity_mean"])
+        codes, counts = columns["script"][keep], counts[keep]
+        means = columns["similarity_mean"][keep]
+        shape = (len(columns["script_names"]), len(columns["link_script_names"]))
+        links = np.zeros(shape)
+        totals = np.zeros(shape)
+        np.add.at(links, codes, counts)
+        np.add.at(totals, codes, counts * means[:, None])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            matrix = np.where(links > 0, totals / links, np.nan)
+        return columns["script_names"], columns["link_script_names"], matrix
+
+    def to_arrow(self):
+        """The table as a pyarrow Table (pyarrow is optional and imported here)"""
+        pa = import_pyarrow()
+        columns = self.columns()
+        fields = {
+            "symbol": pa.array(columns["symbol"], type=pa.string()),
+            "label": pa.array(columns["label"], type=pa.string()),
+            "script": pa.DictionaryArray.from_arrays(
+                pa.array(columns["script"], mask=columns["script"] < 0),
+                pa.array(columns["script_names"], type=pa.string())),
+        }
+        for column in self.COLUMNS.values():
+            values = columns[column]
+            missing = np.isnan(values)
+            if column in self.INTEGER_COLUMNS:
+                values = np.where(missing, 0, values).astype(np.int32)
+            fields[column] = pa.array(values, mask=missing)
+        fields["similarity_links"] = pa.array(columns["similarity_links"])
+        fields["similarity_mean"] = pa.array(columns["similarity_mean"],
+                                             mask=np.isnan(columns["similarity_mean"]))
+        return pa.table(fields)
+
+    def export(self, path):
+        """Write the table as Parquet (.parquet), Arrow IPC (.arrow/.feather) or NumPy (.npz)
+
+        Arrow IPC is written uncompressed so read_symbol_table can memory-map
+        it without copying. Only .npz works without pyarrow.
+        """
+        if path.endswith(".npz"):
+            columns = self.columns()
+            names = {name: np.array(columns[name], dtype=str)
+                     for name in ("script_names", "link_script_names")}
+            np.savez(path, **names,
+                     **{name: (values.astype(str) if values.dtype == object else values)
+                        for name, values in columns.items() if name not in names})
+        elif path.endswith(".parquet"):
+            table = self.to_arrow()
+            import pyarrow.parquet as pq
+            pq.write_table(table, path)
+        else:
+            pa = import_pyarrow()
+            table = self.to_arrow()
+            with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+def import_pyarrow():
+    """pyarrow, which only Parquet and Arrow IPC symbol tables need
+
+    Raises ImportError with install advice when it is missing.
+    """
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError("Parquet and Arrow IPC symbol tables need pyarrow "
+                          "(pip install pyarrow); .npz works without it") from e
+    return pyarrow
+
+def read_symbol_table(path):
+    """Read an exported symbol table; Arrow IPC files are memory-mapped (zero-copy)"""
+    if path.endswith(".npz"):
+        return dict(np.load(path, allow_pickle=False))
+    pa = import_pyarrow()
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        return pq.read_table(path, memory_map=True)
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+class QueryResultViews:
+    """Materialized results of chosen queries, valid until the dataset changes"""
+    def __init__(self):
+        self.queries = set()
+        self._results = {}
+
+    @staticmethod
+    def key(query):
+        return " ".join(query.split())
+
+    def add(self, query):
+        self.queries.add(self.key(query))
+
+    def remove(self, query):
+        key = self.key(query)
+        self.queries.discard(key)
+        self._results.pop(key, None)
+
+    def lookup(self, query, version):
+        stored = self._results.get(self.key(query))
+        if stored is None or stored[0] != version:
+            return None
+        return stored[1]
+
+    def store(self, query, version, result):
+        key = self.key(query)
+        if key in self.queries:
+            self._results[key] = (version, result)
+
+def evaluate_query(dataset, prepared, query):
+    """Evaluate a prepared query, answering from a result view when one is current"""
+    results = dataset.result_views.lookup(query, dataset.version)
+    if results is None:
+        results = dataset.query(prepared)
+        if results.type == "SELECT":
+            results.bindings  # force the lazy solution generator
+        dataset.result_views.store(query, dataset.version, results)
+    return results
+
+def create_kg_dataset(ns, scripts):
+    """Empty KG dataset with its live indexes attached"""
+    graph = IndexedDataset(partition_key=ns.fromScript)
+    stats = graph.add_index("stats", KGStatistics(ns, scripts))
+    graph.add_index("views", MaterializedViews(stats))
+    graph.add_index("labels", LabelIndex())
+    graph.add_index("numeric", NumericIndex([ns.symbolFrequency, ns.contourCount, ns.similarityScore]))
+    graph.add_index("symbols", SymbolTable(ns, stats))
+    return graph
+
+class ReadWriteLock:
+    """Many concurrent readers or one writer; waiting writers block new readers
+
+    Reads are reentrant per thread: a thread already reading is not blocked
+    by a waiting writer, which would otherwise wait for that thread forever.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = Counter()
+        self._writer = False
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        reader = threading.get_ident()
+        with self._cond:
+            if not self._readers[reader]:
+                while self._writer or self._waiting_writers:
+                    self._cond.wait()
+            self._readers[reader] += 1
+
+    def release_read(self, reader=None):
+        """Release a read; reader is the acquiring thread's ident when released from another thread"""
+        with self._cond:
+            _decrement(self._readers, threading.get_ident() if reader is None else reader)
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+class PublishedGraph:
+    """The published KG, replaced by a newer build without waiting for readers
+
+    Each KG has its own lock, so publishing is a reference swap. A reader on
+    another thread pins the KG it starts on and keeps using it after a newer
+    one is published; the replaced KG is retired, deleting its spilled
+    partitions, when its last pin is released.
+    """
+    def __init__(self, graph):
+        self.current = graph
+        self._mutex = threading.Lock()
+        self._pins = Counter()
+        self._replaced = {}
+
+    def pin(self):
+        """The current KG, kept from retirement until unpinned"""
+        with self._mutex:
+            graph = self.current
+            self._pins[id(graph)] += 1
+        return graph
+
+    def unpin(self, graph):
+        with self._mutex:
+            _decrement(self._pins, id(graph))
+            retired = id(graph) not in self._pins and self._replaced.pop(id(graph), None) is not None
+        if retired:
+            self.retire(graph)
+
+    def publish(self, graph):
+        """Make graph current; the previous KG is retired once no reader pins it"""
+        with self._mutex:
+            previous, self.current = self.current, graph
+            if self._pins[id(previous)]:
+                self._replaced[id(previous)] = previous
+                previous = None
+        if previous is not None:
+            self.retire(previous)
+
+    @staticmethod
+    def retire(graph):
+        if graph.partition_cache is not None:
+            graph.partition_cache.discard()
@@ -0,0 +1,191 @@
+"""Stage timings, memory probes and the lazily imported numeric modules"""
+
+import time
+import os
+import sys
+import tracemalloc
+import importlib
+from datetime import datetime
+import json
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from bisect import bisect_left
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access
+
+    numpy and OpenCV are only needed once a KG is built, so leaving them out
+    of startup gets the window up sooner. Load times go to LAZY_IMPORT_SECONDS.
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            start = time.perf_counter()
+            self._module = importlib.import_module(self._name)
+            LAZY_IMPORT_SECONDS.setdefault(self._name, time.perf_counter() - start)
+        return getattr(self._module, attr)
+
+LAZY_IMPORT_SECONDS = {}
+np = LazyModule("numpy")
+cv2 = LazyModule("cv2")
+
+def resident_memory():
+    """Current resident set size in bytes, or None where it cannot be read"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def peak_resident_memory():
+    """Peak resident set size in bytes, or None where it cannot be read"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class StageMetrics:
+    """Per-stage timing histograms, memory and event counters for the hot path"""
+    # Histogram bucket upper bounds in seconds
+    BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.counters = Counter()
+        self.gauges = {}
+        # Sample tracemalloc peaks and RSS per stage; costly, so opt-in
+        self.track_memory = False
+
+    @contextmanager
+    def time(self, stage):
+        tracing = self.track_memory and tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+            if self.track_memory:
+                self.observe_memory(stage, tracemalloc.get_traced_memory()[1] if tracing else None,
+                                    resident_memory())
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            record = self._record(stage, seconds)
+            record["count"] += 1
+            record["sum"] += seconds
+            record["min"] = min(record["min"], seconds)
+            record["max"] = max(record["max"], seconds)
+            record["buckets"][bisect_left(self.BUCKETS, seconds)] += 1
+
+    def observe_memory(self, stage, peak_traced, rss):
+        with self._lock:
+            record = self._record(stage)
+            if peak_traced is not None:
+                record["peak_traced_bytes"] = max(record.get("peak_traced_bytes", 0), peak_traced)
+            if rss is not None:
+                record["max_rss_bytes"] = max(record.get("max_rss_bytes", 0), rss)
+
+    def _record(self, stage, seconds=0.0):
+        record = self.stages.get(stage)
+        if record is None:
+            record = self.stages[stage] = {
+                "count": 0, "sum": 0.0, "min": seconds, "max": seconds,
+                "buckets": [0] * (len(self.BUCKETS) + 1)
+            }
+        return record
+
+    def increment(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] += amount
+
+    def merge(self, stages, counters):
+        """Fold in the stages and counters recorded by another StageMetrics"""
+        with self._lock:
+            for stage, other in stages.items():
+                record = self._record(stage, other["min"])
+                record["count"] += other["count"]
+                record["sum"] += other["sum"]
+                record["min"] = min(record["min"], other["min"])
+                record["max"] = max(record["max"], other["max"])
+                record["buckets"] = [a + b for a, b in zip(record["buckets"], other["buckets"])]
+                for key in ("peak_traced_bytes", "max_rss_bytes"):
+                    if key in other:
+                        record[key] = max(record.get(key, 0), other[key])
+            self.counters.update(counters)
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def reset(self, prefix=""):
+        """Forget stages, counters and gauges whose names start with prefix"""
+        with self._lock:
+            for name in [n for n in self.stages if n.startswith(prefix)]:
+                del self.stages[name]
+            for name in [n for n in self.counters if n.startswith(prefix)]:
+                del self.counters[name]
+            for key in [k for k in self.gauges if k[0].startswith(prefix)]:
+                del self.gauges[key]
+
+    def to_json_lines(self):
+        timestamp = datetime.now().isoformat()
+        lines = []
+        with self._lock:
+            for stage, record in sorted(self.stages.items()):
+                line = {
+                    "timestamp": timestamp, "stage": stage, "count": record["count"],
+                    "sum_seconds": record["sum"], "min_seconds": record["min"],
+                    "max_seconds": record["max"],
+                    "mean_seconds": record["sum"] / record["count"] if record["count"] else 0.0,
+                    "buckets": dict(zip([str(b) for b in self.BUCKETS] + ["+Inf"], record["buckets"]))
+                }
+                for key in ("peak_traced_bytes", "max_rss_bytes"):
+                    if key in record:
+                        line[key] = record[key]
+                lines.append(json.dumps(line))
+            for counter, value in sorted(self.counters.items()):
+                lines.append(json.dumps({"timestamp": timestamp, "counter": counter, "value": value}))
+            for (name, labels), value in sorted(self.gauges.items()):
+                lines.append(json.dumps({"timestamp": timestamp, "gauge": name,
+                                         "labels": dict(labels), "value": value}))
+        return "\n".join(lines) + "\n"
+
+    def to_prometheus(self):
+        lines = [
+            "# HELP indus_kg_stage_seconds Time spent per pipeline stage",
+            "# TYPE indus_kg_stage_seconds histogram"
+        ]
+        with self._lock:
+            for stage, record in sorted(self.stages.items()):
+                cumulative = 0
+                for bound, count in zip([str(b) for b in self.BUCKETS] + ["+Inf"], record["buckets"]):
+                    cumulative += count
+                    lines.append(f'indus_kg_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'indus_kg_stage_seconds_sum{{stage="{stage}"}} {record["sum"]}')
+                lines.append(f'indus_kg_stage_seconds_count{{stage="{stage}"}} {record["count"]}')
+            for key in ("peak_traced_bytes", "max_rss_bytes"):
+                lines.append(f"# TYPE indus_kg_stage_{key} gauge")
+                for stage, record in sorted(self.stages.items()):
+                    if key in record:
+                        lines.append(f'indus_kg_stage_{key}{{stage="{stage}"}} {record[key]}')
+            lines.append("# HELP indus_kg_events_total Pipeline event counters")
+            lines.append("# TYPE indus_kg_events_total counter")
+            for counter, value in sorted(self.counters.items()):
+                lines.append(f'indus_kg_events_total{{event="{counter}"}} {value}')
+            for name in sorted({name for name, _ in self.gauges}):
+                lines.append(f"# TYPE indus_{name} gauge")
+                for (gauge, labels), value in sorted(self.gauges.items()):
+                    if gauge == name:
+                        label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                        lines.append(f"indus_{name}{{{label_text}}} {value}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,1095 @@
+"""SPARQL evaluation: the analyzer's evaluators, query workers, profiling and workload tracking"""
+
+from rdflib import URIRef, Literal, Namespace, BNode
+from rdflib.paths import Path
+from rdflib.term import Variable
+import os
+import json
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+import multiprocessing
+import weakref
+import zlib
+from collections import defaultdict, OrderedDict, deque
+from collections.abc import Mapping
+from itertools import islice
+import heapq
+import re
+
+from kg_metrics import LAZY_IMPORT_SECONDS
+from kg_indexes import (IndexedDataset, PartitionCache, QueryResultViews, QueryTimeout, VIEW,
+                        create_kg_dataset, evaluate_query, numeric_value, remaining_query_time)
+
+# Script-partition triples a query must touch before it is fanned out to the
+# query workers. A worker parses a query once, about 20 ms, and a task then
+# costs 2-3 ms; in process a query reads about 50 partition triples per ms
+# (synthetic dataset, warm pool), so fanning out repays from a few thousand
+PARALLEL_MIN_TRIPLES = 5000
+
+# Literals, IRIs, comments and whitespace in a SPARQL query, in that order
+_QUERY_TOKENS = re.compile(
+    r'("(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\')'
+    r'|(<[^<>\s]*>)'
+    r'|((?:\s*#[^\n]*)+\s*)'
+    r'|(?<![\w?$:.])([+-]?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)(?!\w)'
+    r'|(\s+)'
+)
+
+def normalize_query(query):
+    """Reduce a query to its shape: comments dropped, literals replaced by '?'"""
+    def replace(match):
+        string, iri, comment, number, space = match.groups()
+        if string is not None or number is not None:
+            return "?"
+        if iri is not None:
+            return iri
+        return " "
+    return _QUERY_TOKENS.sub(replace, query).strip()
+
+def percentile(sorted_values, q):
+    """Linearly interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+class QueryLatencyHistory:
+    """Rolling per-shape SPARQL latency samples persisted between sessions
+
+    New samples are written out by save_if_due at most every save_interval
+    seconds, and by save when the session ends.
+    """
+    def __init__(self, path, max_samples=500, max_shapes=200, save_interval=60.0):
+        self.path = path
+        self.max_samples = max_samples
+        self.max_shapes = max_shapes
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        # shape -> deque of (timestamp, seconds, result rows, KG triples, query checksum)
+        self.samples = OrderedDict()
+        self._unsaved = False
+        self._last_save = time.monotonic()
+        # shape -> latest query text, runnable where the shape is not
+        self.examples = {}
+
+    def record(self, query, seconds, rows, triples):
+        shape = normalize_query(query)
+        checksum = zlib.crc32(QueryResultViews.key(query).encode("utf-8"))
+        with self._lock:
+            history = self.samples.pop(shape, None)
+            if history is None:
+                history = deque(maxlen=self.max_samples)
+            history.append((time.time(), seconds, rows, triples, checksum))
+            self.samples[shape] = history
+            self.examples[shape] = query
+            while len(self.samples) > self.max_shapes:
+                evicted, _ = self.samples.popitem(last=False)
+                self.examples.pop(evicted, None)
+            self._unsaved = True
+        return shape
+
+    def summary(self, shape):
+        """Sample count, p50/p95/p99 latency and throughput for a query shape"""
+        with self._lock:
+            history = list(self.samples.get(shape, ()))
+        latencies = sorted(sample[1] for sample in history)
+        span = history[-1][0] - history[0][0] if len(history) > 1 else 0.0
+        return {
+            "count": len(history),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "throughput": (len(history) - 1) / span if span > 0 else 0.0
+        }
+
+    def snapshot(self):
+        """Copies of the samples and example queries per shape"""
+        with self._lock:
+            return {shape: list(history) for shape, history in self.samples.items()}, dict(self.examples)
+
+    def clear(self):
+        with self._lock:
+            self.samples.clear()
+            self.examples.clear()
+        self.save()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        # Older files map shapes straight to their samples
+        samples, examples = (stored["samples"], stored["examples"]) if "samples" in stored \
+            else (stored, {})
+        with self._lock:
+            for shape, history in samples.items():
+                self.samples[shape] = deque((tuple(sample) for sample in history),
+                                            maxlen=self.max_samples)
+            self.examples.update(examples)
+
+    def save_if_due(self):
+        """Save unsaved samples once save_interval has passed since the last save"""
+        if self._unsaved and time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+            return True
+        return False
+
+    def save(self):
+        with self._lock:
+            stored = {"samples": {shape: list(history) for shape, history in self.samples.items()},
+                      "examples": dict(self.examples)}
+            self._unsaved = False
+            self._last_save = time.monotonic()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(stored, f)
+        os.replace(temp_path, self.path)
+
+class WorkloadAdvisor:
+    """Index and view recommendations for the slowest frequent query shapes
+
+    Shapes are ranked by the total time the latency log spent on them. A
+    numeric column is proposed for unindexed predicates a shape filters by
+    range or orders by. Failing that, a shape whose exact query keeps
+    repeating on an unchanged KG gets a materialized result view. Built
+    recommendations are re-measured and kept only when they pay off.
+    """
+    def __init__(self, history, min_runs=3, top_n=5):
+        self.history = history
+        self.min_runs = min_runs
+        self.top_n = top_n
+        # Kept recommendations, re-applied to every newly built KG
+        self.applied = []
+
+    def slow_shapes(self):
+        """(total seconds, shape, samples, example) for the costliest frequent shapes"""
+        samples, examples = self.history.snapshot()
+        ranked = [(sum(sample[1] for sample in history), shape, history, examples[shape])
+                  for shape, history in samples.items()
+                  if len(history) >= self.min_runs and shape in examples]
+        ranked.sort(key=lambda entry: entry[0], reverse=True)
+        return ranked[:self.top_n]
+
+    @staticmethod
+    def repeat_rate(samples):
+        """Share of runs repeating the previous query verbatim on an unchanged KG
+
+        These are the runs a result view could have answered; the first run
+        never is one.
+        """
+        repeats = sum(1 for previous, sample in zip(samples, samples[1:])
+                      if len(sample) > 4 and len(previous) > 4
+                      and sample[4] == previous[4] and sample[3] == previous[3])
+        return repeats / len(samples) if samples else 0.0
+
+    @staticmethod
+    def workload_speedup(recommendation, before, after):
+        """Speedup over the shape's runs, given one run's time without and with it"""
+        if recommendation["kind"] == "numeric_index":
+            return before / after if after > 0 else float("inf")
+        # Only repeated runs are answered by the view
+        rate = recommendation["repeat_rate"]
+        return 1 / ((1 - rate) + rate * after / before) if before > 0 else 1.0
+
+    @staticmethod
+    def numeric_candidates(dataset, algebra):
+        """Unindexed predicates whose numeric objects a query filters by range or orders by"""
+        index = dataset.indexes["numeric"]
+        predicates = defaultdict(set)
+        compared = set()
+
+        def visit(part):
+            if isinstance(part, (list, tuple)):
+                for child in part:
+                    visit(child)
+                return
+            if not isinstance(part, CompValue):
+                return
+            if part.name == "BGP":
+                for s, p, o in part.triples:
+                    if isinstance(o, Variable) and isinstance(p, URIRef):
+                        predicates[o].add(p)
+            elif part.name == "OrderBy":
+                compared.update(c.expr for c in part.expr if isinstance(c.expr, Variable))
+            for child in part.values():
+                visit(child)
+            if part.name == "Filter":
+                compared.update(v for v in predicates if any(
+                    _range_bounds(part.expr, v)[key] is not None for key in ("low", "high")))
+
+        visit(algebra)
+        candidates = []
+        for variable in compared:
+            for p in sorted(predicates[variable]):
+                if p in index.rows or p in candidates:
+                    continue
+                sample = [o for _, _, o in islice(dataset.triples((None, p, None)), 100)]
+                if sample and all(numeric_value(o) is not None for o in sample):
+                    candidates.append(p)
+        return candidates
+
+    def recommend(self, dataset):
+        """Recommendations, each with the speedup expected for its shape"""
+        stats = dataset.indexes["stats"]
+        recommendations = []
+        for total, shape, samples, query in self.slow_shapes():
+            base = {"shape": shape, "query": query, "runs": len(samples),
+                    "p50": percentile(sorted(sample[1] for sample in samples), 50),
+                    "rows": sum(sample[2] for sample in samples) / len(samples)}
+            try:
+                algebra = prepare_query(query, dataset.namespaces()).algebra
+            except Exception:
+                continue
+            predicates = self.numeric_candidates(dataset, algebra)
+            for p in predicates:
+                # A range scan reads about the rows returned instead of every object
+                scanned = stats.properties[p]
+                recommendations.append(dict(
+                    base, kind="numeric_index", predicate=p,
+                    expected=scanned / max(base["rows"], 1.0),
+                    reason=f"{scanned} objects scanned for ~{base['rows']:.0f} rows"))
+            rate = self.repeat_rate(samples)
+            viewed = QueryResultViews.key(query) in dataset.result_views.queries
+            if not predicates and not viewed and rate >= 0.5:
+                # Repeats are answered from the view, the rest re-evaluate
+                recommendations.append(dict(
+                    base, kind="result_view", repeat_rate=rate, expected=1 / (1 - rate),
+                    reason=f"{rate:.0%} of runs repeat the previous query on an unchanged KG"))
+        return recommendations
+
+    def build(self, dataset, recommendation):
+        if recommendation["kind"] == "numeric_index":
+            p = recommendation["predicate"]
+            triples = list(dataset.triples((None, p, None)))
+            # The index covers the whole KG, evicted scripts included
+            if dataset.partition_cache is not None:
+                triples.extend(dataset.partition_cache.evicted_triples(p))
+            dataset.indexes["numeric"].add_predicate(p, triples)
+        else:
+            dataset.result_views.add(recommendation["query"])
+
+    def drop(self, dataset, recommendation):
+        if recommendation["kind"] == "numeric_index":
+            dataset.indexes["numeric"].remove_predicate(recommendation["predicate"])
+        else:
+            dataset.result_views.remove(recommendation["query"])
+
+    @staticmethod
+    def measure(dataset, query, runs=3):
+        """Best-of-n evaluation time of a query, result views included"""
+        prepared = prepare_query(query, dataset.namespaces())
+        best = None
+        for _ in range(runs):
+            start = time.perf_counter()
+            evaluate_query(dataset, prepared, query)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def reapply(self, dataset):
+        for recommendation in self.applied:
+            self.build(dataset, recommendation)
+
+    @staticmethod
+    def describe(recommendation):
+        if recommendation["kind"] == "numeric_index":
+            return f"numeric index on {recommendation['predicate']}"
+        return "materialized result view"
+
+class OperatorStats:
+    """Calls, output rows and inclusive time for one algebra operator"""
+    __slots__ = ("calls", "rows_out", "seconds")
+
+    def __init__(self):
+        self.calls = 0
+        self.rows_out = 0
+        self.seconds = 0.0
+
+class QueryProfiler:
+    """Per-operator row counts and timings for one profiled query evaluation"""
+    def __init__(self):
+        self.operators = {}
+
+    def stats(self, part):
+        return self.operators.setdefault(id(part), OperatorStats())
+
+    def timed_rows(self, rows, stats):
+        """Pass rows through, charging time spent producing them to stats"""
+        iterator = iter(rows)
+        while True:
+            start = time.perf_counter()
+            try:
+                row = next(iterator)
+            except StopIteration:
+                stats.seconds += time.perf_counter() - start
+                return
+            stats.seconds += time.perf_counter() - start
+            stats.rows_out += 1
+            yield row
+
+# Profiler of the query being evaluated on this thread, if any
+_profiling = threading.local()
+
+def _profiling_eval(ctx, part):
+    """rdflib custom evaluation hook that instruments every algebra operator"""
+    profiler = getattr(_profiling, "profiler", None)
+    if profiler is None or getattr(_profiling, "bypass", None) is part:
+        raise NotImplementedError()
+    stats = profiler.stats(part)
+    stats.calls += 1
+    # Re-dispatch this part to the regular evaluator, skipping this hook once
+    previous, _profiling.bypass = getattr(_profiling, "bypass", None), part
+    start = time.perf_counter()
+    try:
+        result = evalPart(ctx, part)
+    finally:
+        stats.seconds += time.perf_counter() - start
+        _profiling.bypass = previous
+    if isinstance(result, Mapping):
+        return result
+    return profiler.timed_rows(result, stats)
+
+def _own_dataset(ctx):
+    """The IndexedDataset a part is evaluated on; declines parts on any other graph
+
+    The evaluators are registered with rdflib for the whole process, so
+    queries on other graphs, inside a GRAPH clause or on a dataset with
+    evaluators_enabled off are left to rdflib's own evaluation.
+    """
+    graph = ctx.graph
+    if not isinstance(graph, IndexedDataset) or not graph.evaluators_enabled:
+        raise NotImplementedError()
+    return graph
+
+def _views_eval(ctx, part):
+    """Answer basic graph patterns over view: predicates from the materialized views"""
+    if part.name != "BGP" or not part.triples:
+        raise NotImplementedError()
+    views = _own_dataset(ctx).indexes.get("views")
+    if views is None or not all(isinstance(p, URIRef) and p.startswith(VIEW) for _, p, _ in part.triples):
+        raise NotImplementedError()
+    return evalBGP(ctx.pushGraph(views.as_graph()), part.triples)
+
+def _is_variable(term):
+    # Blank nodes in a query pattern match like variables
+    return isinstance(term, (Variable, BNode))
+
+def estimate_pattern(stats, pattern, bound=()):
+    """Estimated matches of a triple pattern once the bound variables have values"""
+    s, p, o = pattern
+    if _is_variable(p) and p not in bound:
+        total, subjects, objects = stats.triples, stats.subjects, stats.objects
+    else:
+        if _is_variable(p):
+            # A bound predicate could be any of them; assume an average one
+            return stats.triples / max(len(stats.properties), 1)
+        total = stats.properties[p]
+        subjects = stats.property_subjects.get(p, {})
+        objects = stats.property_objects.get(p, {})
+    if not total:
+        return 0
+    estimate = total
+    for term, counts, nodes in ((s, subjects, stats.subjects), (o, objects, stats.objects)):
+        if not _is_variable(term):
+            estimate = min(estimate, counts.get(term, 0))
+        elif term in bound:
+            # Spread over every node in that position, since a value bound
+            # elsewhere need not have this property at all
+            estimate = min(estimate, total / max(len(nodes), 1))
+    return estimate
+
+def order_bgp(stats, triples, bound=()):
+    """Greedy join order: cheapest pattern first, then the cheapest connected one
+
+    Patterns sharing a variable with those already placed are preferred,
+    so the plan only falls back to a cross product when it has to.
+    """
+    bound = set(bound)
+    remaining = list(triples)
+    ordered = []
+    while remaining:
+        connected = [t for t in remaining if any(_is_variable(term) and term in bound for term in t)]
+        best = min(connected or remaining, key=lambda t: estimate_pattern(stats, t, bound))
+        remaining.remove(best)
+        ordered.append(best)
+        bound.update(term for term in best if _is_variable(term))
+    return ordered
+
+def _bound_variables(ctx, triples):
+    return {term for triple in triples for term in triple
+            if _is_variable(term) and ctx[term] is not None}
+
+def _partition_routes(dataset, triples):
+    """Pruned graph views for subjects pinned to one script by fromScript"""
+    routes = {}
+    if getattr(dataset, "partition_key", None) is None:
+        return routes
+    for s, p, o in triples:
+        if p == dataset.partition_key and _is_variable(s) and isinstance(o, Literal) \
+                and str(o) in dataset.script_graphs and s not in routes:
+            routes[s] = dataset.pruned_view(str(o))
+    return routes
+
+# Operators whose solutions all satisfy the given operand's patterns
+_REQUIRED_OPERANDS = {
+    "Join": ("p1", "p2"), "LeftJoin": ("p1",), "Minus": ("p1",), "Filter": ("p",),
+    "Extend": ("p",), "Distinct": ("p",), "Reduced": ("p",), "OrderBy": ("p",),
+    "Slice": ("p",), "Group": ("p",), "AggregateJoin": ("p",)
+}
+
+def query_scripts(dataset, algebra, bindings=None):
+    """Scripts whose graphs a query can read, or None when it may read any
+
+    A pattern is confined to one script graph inside a GRAPH clause naming
+    it, or when its subject is a constant symbol or a variable pinned by a
+    fromScript constant, since every triple about a symbol is filed under
+    its script's graph. A pin holds for every pattern under the operator
+    that requires it, down to the next sub-select. Variables in bindings
+    count as constants.
+    """
+    bindings = bindings or {}
+    graph_scripts = {graph_id: script for script, graph_id in dataset.script_graphs.items()}
+    stats = dataset.indexes["stats"]
+    scripts = set()
+
+    def substituted(part):
+        return [tuple(bindings.get(term, term) for term in triple) for triple in part.triples]
+
+    def required_pins(part):
+        if part.name in ("BGP", "TriplesBlock"):
+            return {s: str(o) for s, p, o in substituted(part)
+                    if p == dataset.partition_key and _is_variable(s) and isinstance(o, Literal)}
+        # EXISTS patterns keep their unlowered syntax form
+        if part.name == "GroupGraphPatternSub":
+            operands = [child for child in part.part or () if child.name == "TriplesBlock"]
+        else:
+            operands = [part[key] for key in _REQUIRED_OPERANDS.get(part.name, ())]
+        pins = {}
+        for operand in operands:
+            if isinstance(operand, CompValue):
+                pins.update(required_pins(operand))
+        return pins
+
+    def visit(part, graph, pins):
+        if isinstance(part, (list, tuple)):
+            return all(visit(child, graph, pins) for child in part)
+        if not isinstance(part, CompValue):
+            return True
+        if part.name in ("DescribeQuery", "ServiceGraphPattern"):
+            return False
+        if part.name in ("Graph", "GraphGraphPattern"):
+            graph = bindings.get(part.term, part.term)
+            if _is_variable(graph):
+                return False
+        # A sub-select's variables are its own
+        if part.name == "Project" and part is not algebra.get("p"):
+            pins = {}
+        pins = {**required_pins(part), **pins}
+        if part.name in ("BGP", "TriplesBlock"):
+            if graph in graph_scripts:
+                scripts.add(graph_scripts[graph])
+            elif graph is None:
+                for s, p, o in substituted(part):
+                    # View rows are derived from every partition
+                    if isinstance(p, Path) or (_is_variable(s) and s not in pins) \
+                            or (isinstance(p, URIRef) and p.startswith(str(VIEW))):
+                        return False
+                    script = pins[s] if _is_variable(s) else stats.script_of(s)
+                    if script is not None:
+                        scripts.add(script)
+        return all(visit(child, graph, pins) for child in part.values())
+
+    return scripts if visit(algebra, None, {}) else None
+
+def _eval_routed_bgp(ctx, plan):
+    """evalBGP over (pattern, view) pairs, scanning a pattern's view while its subject is open"""
+    if not plan:
+        yield ctx.solution()
+        return
+    (s, p, o), view = plan[0]
+    _s, _p, _o = ctx[s], ctx[p], ctx[o]
+    # A bound subject is a direct lookup, which the union answers fastest
+    graph = view if view is not None and _s is None else ctx.graph
+    for ss, sp, so in graph.triples((_s, _p, _o)):
+        c = ctx.push() if None in (_s, _p, _o) else ctx
+        try:
+            if _s is None:
+                c[s] = ss
+            if _p is None:
+                c[p] = sp
+            if _o is None:
+                c[o] = so
+        except AlreadyBound:
+            continue
+        yield from _eval_routed_bgp(c, plan[1:])
+
+def _join_order_eval(ctx, part):
+    """Evaluate basic graph patterns in the order the KG statistics favour
+
+    Patterns about a subject pinned to one script by a fromScript constant
+    are matched against that script's graph only.
+    """
+    if part.name != "BGP" or len(part.triples) < 2:
+        raise NotImplementedError()
+    stats = _own_dataset(ctx).indexes.get("stats")
+    if stats is None:
+        raise NotImplementedError()
+    # Plans are cached on the statistics, since OPTIONAL and nested groups
+    # evaluate the same BGP once per outer row
+    bound = frozenset(_bound_variables(ctx, part.triples))
+    ordered = stats.cached_plan(("join_order", tuple(part.triples), bound),
+                                lambda: order_bgp(stats, part.triples, bound))
+    routes = _partition_routes(ctx.graph, part.triples)
+    if routes:
+        return _eval_routed_bgp(ctx, [(t, routes.get(t[0])) for t in ordered])
+    return evalBGP(ctx, ordered)
+
+_FLIPPED_OPS = {"<": ">", "<=": ">=", ">": "<", ">=": "<=", "=": "="}
+
+def _range_bounds(expr, variable):
+    """Scan bounds implied by the top-level conjuncts of a FILTER on variable"""
+    bounds = {"low": None, "high": None, "low_inclusive": True, "high_inclusive": True}
+    conjuncts = [expr]
+    if getattr(expr, "name", None) == "ConditionalAndExpression":
+        conjuncts = [expr.expr] + list(expr.other or [])
+    for conjunct in conjuncts:
+        if getattr(conjunct, "name", None) != "RelationalExpression":
+            continue
+        op = conjunct.op
+        if conjunct.expr == variable:
+            bound = numeric_value(conjunct.other)
+        elif conjunct.other == variable and op in _FLIPPED_OPS:
+            bound, op = numeric_value(conjunct.expr), _FLIPPED_OPS[op]
+        else:
+            continue
+        if bound is None:
+            continue
+        if op in (">", ">=", "=") and (bounds["low"] is None or bound >= bounds["low"]):
+            inclusive = op != ">"
+            if bound == bounds["low"]:
+                inclusive = inclusive and bounds["low_inclusive"]
+            bounds["low"], bounds["low_inclusive"] = bound, inclusive
+        if op in ("<", "<=", "=") and (bounds["high"] is None or bound <= bounds["high"]):
+            inclusive = op != "<"
+            if bound == bounds["high"]:
+                inclusive = inclusive and bounds["high_inclusive"]
+            bounds["high"], bounds["high_inclusive"] = bound, inclusive
+    return bounds
+
+def _numeric_pattern(index, triples, variable=None):
+    """First BGP pattern binding a variable through an indexed predicate
+
+    Patterns with a constant subject are left to the triple store, which
+    answers them directly.
+    """
+    for pattern in triples:
+        s, p, o = pattern
+        if not isinstance(s, Variable) or not isinstance(o, Variable):
+            continue
+        if (variable is None or o == variable) and index.covers(p):
+            return pattern
+    return None
+
+def _numeric_scan_part(bgp, pattern, bounds, descending=False):
+    return CompValue("NumericIndexScan", triples=bgp.triples, pattern=pattern,
+                     bounds=bounds, descending=descending)
+
+def _eval_numeric_scan(ctx, index, part):
+    """Bind the indexed pattern from the column, then join the rest of the BGP"""
+    s, p, o = part.pattern
+    rest = [triple for triple in part.triples if triple is not part.pattern]
+    stats = ctx.graph.indexes.get("stats")
+    if stats is not None:
+        rest = order_bgp(stats, rest, _bound_variables(ctx, part.triples) | {s, o})
+    for subject, literal in index.scan(p, descending=part.descending, **part.bounds):
+        c = ctx.push()
+        for term, node in ((s, subject), (o, literal)):
+            bound = ctx[term]
+            if bound is None:
+                c[term] = node
+            elif bound != node:
+                break
+        else:
+            yield from evalBGP(c, rest)
+
+def _numeric_eval(ctx, part):
+    """Answer range FILTERs and single-key ORDER BYs from the numeric index
+
+    Filters keep their full expression; the index only narrows the rows it
+    is applied to. Ordered scans are lazy, so a LIMIT above stops early.
+    """
+    index = _own_dataset(ctx).indexes.get("numeric")
+    if index is None:
+        raise NotImplementedError()
+    if part.name == "NumericIndexScan":
+        return _eval_numeric_scan(ctx, index, part)
+    
+    if part.name == "Filter" and part.p.name == "BGP":
+        for pattern in part.p.triples:
+            if _numeric_pattern(index, [pattern]) is None:
+                continue
+            bounds = _range_bounds(part.expr, pattern[2])
+            if bounds["low"] is not None or bounds["high"] is not None:
+                filtered = part.clone()
+                filtered["p"] = _numeric_scan_part(part.p, pattern, bounds)
+                return evalFilter(ctx, filtered)
+    
+    if part.name == "OrderBy":
+        ordered = _numeric_ordering(ctx, index, part)
+        if ordered is not None:
+            return ordered
+    raise NotImplementedError()
+
+def _numeric_ordering(ctx, index, part):
+    """Lazy rows for an OrderBy the numeric index can stream, else None"""
+    if len(part.expr) != 1 or not isinstance(part.expr[0].expr, Variable):
+        return None
+    condition = part.expr[0]
+    child = part.p
+    bgp = child.p if child.name == "Filter" else child
+    if bgp.name != "BGP":
+        return None
+    pattern = _numeric_pattern(index, bgp.triples, condition.expr)
+    if pattern is None:
+        return None
+    bounds = _range_bounds(child.expr, condition.expr) if child is not bgp else {}
+    scan = _numeric_scan_part(bgp, pattern, bounds, descending=condition.order == "DESC")
+    if child is bgp:
+        return _eval_numeric_scan(ctx, index, scan)
+    filtered = child.clone()
+    filtered["p"] = scan
+    return evalFilter(ctx, filtered)
+
+class _OrderKey:
+    """Sort key ordering solutions the way rdflib's evalOrderBy does"""
+    __slots__ = ("values", "descending")
+    
+    def __init__(self, row, conditions):
+        self.values = [_val(value(row, c.expr, variables=True)) for c in conditions]
+        self.descending = [c.order == "DESC" for c in conditions]
+    
+    def __lt__(self, other):
+        for x, y, descending in zip(self.values, other.values, self.descending):
+            if x < y:
+                return not descending
+            if y < x:
+                return descending
+        return False
+    
+    def __eq__(self, other):
+        # heapq compares (key, position) tuples, which needs ties to be equal
+        return not (self < other or other < self)
+
+def _top_k_eval(ctx, part):
+    """Evaluate ORDER BY ... LIMIT k through a bounded heap
+
+    Solutions stream through heapq.nsmallest, which keeps only the best
+    offset + k rows and, like sorted(), breaks ties in arrival order.
+    """
+    dataset = _own_dataset(ctx)
+    if part.name != "Slice" or part.length is None:
+        raise NotImplementedError()
+    project = part.p if part.p.name == "Project" else None
+    order = project.p if project is not None else part.p
+    if order.name != "OrderBy":
+        raise NotImplementedError()
+    # Leave orderings the numeric index already streams to it
+    index = dataset.indexes.get("numeric")
+    if index is not None and _numeric_ordering(ctx, index, order) is not None:
+        raise NotImplementedError()
+    
+    rows = heapq.nsmallest(part.start + part.length, evalPart(ctx, order.p),
+                           key=lambda row: _OrderKey(row, order.expr))[part.start:]
+    if project is not None:
+        return (row.project(project.PV) for row in rows)
+    return iter(rows)
+
+class ParallelQueryPool:
+    """Worker processes evaluating query parts confined to script partitions
+
+    Workers mirror the script graphs they are asked about from the copies
+    PartitionCache persisted, so only solutions cross the process boundary.
+    """
+    def __init__(self, workers):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        with self._lock:
+            if self._executor is None:
+                # Spawned workers share no locks or Tk state with this process
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor.submit(fn, *args)
+
+    def warm(self, dataset):
+        """Start the workers and mirror the dataset's script graphs ahead of the first query"""
+        task = partition_task(dataset, dataset.partition_cache.wanted())
+        for _ in range(self.workers):
+            self.submit(warm_partition_task, task)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+# Text and prefixes of the queries prepare_query parsed, by prologue, so a
+# worker can parse a query again instead of being sent its algebra
+_query_sources = weakref.WeakKeyDictionary()
+
+_sparql_lock = threading.Lock()
+_sparql_loaded = False
+
+def load_sparql():
+    """Import rdflib's SPARQL engine and register the analyzer's evaluators
+
+    Building the SPARQL grammar is a large share of startup time, so this
+    runs before the first parse or query rather than at import. Safe to call
+    repeatedly and from any thread.
+    """
+    global prepareQuery, CUSTOM_EVALS, evalQuery, evalPart, evalBGP, evalFilter
+    global CompValue, value, AlreadyBound, QueryContext, FrozenBindings, _val
+    global _sparql_loaded
+    if _sparql_loaded:
+        return
+    with _sparql_lock:
+        if _sparql_loaded:
+            return
+        start = time.perf_counter()
+        from rdflib.plugins.sparql import prepareQuery, CUSTOM_EVALS
+        from rdflib.plugins.sparql.evaluate import evalQuery, evalPart, evalBGP, evalFilter
+        from rdflib.plugins.sparql.parserutils import CompValue, value
+        from rdflib.plugins.sparql.sparql import AlreadyBound, QueryContext, FrozenBindings
+        from rdflib.plugins.sparql.evalutils import _val
+        
+        # Tried in this order; each declines a part with NotImplementedError,
+        # and all but profiling decline every part outside an IndexedDataset
+        CUSTOM_EVALS["semantic_script_analyzer_profile"] = _profiling_eval
+        CUSTOM_EVALS["semantic_script_analyzer_views"] = _views_eval
+        CUSTOM_EVALS["semantic_script_analyzer_join_order"] = _join_order_eval
+        CUSTOM_EVALS["semantic_script_analyzer_numeric"] = _numeric_eval
+        CUSTOM_EVALS["semantic_script_analyzer_top_k"] = _top_k_eval
+        CUSTOM_EVALS["semantic_script_analyzer_parallel"] = _parallel_eval
+        LAZY_IMPORT_SECONDS["rdflib.plugins.sparql"] = time.perf_counter() - start
+        _sparql_loaded = True
+
+def prepare_query(query, namespaces=()):
+    """Parse and translate a SPARQL query, remembering its text for the query workers
+
+    Loads the engine on first use.
+    """
+    load_sparql()
+    namespaces = dict(namespaces)
+    prepared = prepareQuery(query, initNs=namespaces)
+    _query_sources[prepared.prologue] = (query, namespaces, prepared.algebra)
+    return prepared
+
+def _algebra_path(node, part):
+    """Keys leading from node down to part in an algebra tree, or None"""
+    if node is part:
+        return []
+    if isinstance(node, CompValue):
+        children = node.items()
+    elif isinstance(node, (list, tuple)):
+        children = enumerate(node)
+    else:
+        return None
+    for key, child in children:
+        path = _algebra_path(child, part)
+        if path is not None:
+            return [key] + path
+    return None
+
+# Partition mirror kept by a query worker process between tasks
+_worker_state = {}
+
+def _worker_dataset(task):
+    state = _worker_state
+    if state.get("directory") != task["directory"]:
+        dataset = create_kg_dataset(Namespace(task["namespace"]), task["script_folders"])
+        state.clear()
+        state.update(directory=task["directory"], dataset=dataset, shared=frozenset(),
+                     cache=PartitionCache(dataset, task["directory"], task["budget"]))
+    dataset, cache = state["dataset"], state["cache"]
+    # Partition files never change once written; the small other graphs may
+    shared = frozenset(task["shared"])
+    if shared != state["shared"]:
+        for s, p, o, graph_id in state["shared"] - shared:
+            dataset.remove((s, p, o, dataset.graph(graph_id)))
+        for s, p, o, graph_id in shared - state["shared"]:
+            dataset.add((s, p, o, dataset.graph(graph_id)))
+        state["shared"] = shared
+    cache.sizes.update(task["sizes"])
+    cache.load(task["scripts"])
+    return dataset
+
+def partition_task(dataset, scripts, query=None, bindings=None):
+    """Describe the partitions a query worker should mirror, and what to evaluate on them
+
+    query is (text, prefixes, path): the worker parses the text again and
+    evaluates the algebra part the path leads to.
+    """
+    cache = dataset.partition_cache
+    script_graph_ids = set(dataset.script_graphs.values())
+    shared = [(s, p, o, graph_id) for graph_id, columns in list(dataset.partitions.graphs.items())
+              if graph_id not in script_graph_ids
+              for p, column in columns.items() for s, o in column]
+    return {
+        "directory": cache.directory, "budget": cache.budget_bytes, "sizes": cache.sizes,
+        "namespace": str(dataset.indexes["stats"].ns),
+        "script_folders": dataset.indexes["stats"].scripts,
+        "shared": shared, "scripts": sorted(scripts), "query": query, "bindings": bindings
+    }
+
+def warm_partition_task(task):
+    """Load the SPARQL engine and the partition mirror (process pool worker)"""
+    load_sparql()
+    _worker_dataset(task)
+
+def _worker_query(text, namespaces):
+    # Branches of one query arrive together, so the last parse is kept
+    key = (text, tuple(sorted(namespaces.items())))
+    if _worker_state.get("query_key") != key:
+        _worker_state.update(query_key=key, query=prepareQuery(text, initNs=namespaces))
+    return _worker_state["query"]
+
+def evaluate_partition_task(task):
+    """Evaluate one algebra part against the worker's partition mirror (process pool worker)"""
+    # The mirror is queried with the same evaluators as the app's KG
+    load_sparql()
+    dataset = _worker_dataset(task)
+    text, namespaces, path = task["query"]
+    prepared = _worker_query(text, namespaces)
+    part = prepared.algebra
+    for key in path:
+        part = part[key]
+    ctx = QueryContext(dataset, initBindings=task["bindings"])
+    ctx.prologue = prepared.prologue
+    return [dict(solution) for solution in evalPart(ctx, part)]
+
+def _union_branches(part):
+    if part.name != "Union":
+        return [part]
+    return _union_branches(part.p1) + _union_branches(part.p2)
+
+def _is_values(part):
+    return part.name == "ToMultiSet" and part.p.name == "values"
+
+def _merged_solutions(ctx, futures):
+    for future in futures:
+        # Waiting on a worker counts against the query deadline like a scan
+        try:
+            rows = future.result(timeout=remaining_query_time())
+        except FutureTimeout:
+            for pending in futures:
+                pending.cancel()
+            raise QueryTimeout()
+        for row in rows:
+            yield FrozenBindings(ctx, row)
+
+def _parallel_eval(ctx, part):
+    """Fan UNION branches and VALUES rows out to the query worker processes
+
+    Each branch, or the pattern joined with one VALUES row, goes to a
+    worker once query_scripts confines it to some script partitions and
+    those hold at least PARALLEL_MIN_TRIPLES. Workers are sent the query
+    text and parse it again, so only queries read by prepare_query fan out.
+    Solutions come back branch by branch as in serial evaluation, but within
+    a branch they follow the worker's store, so they match serial results as
+    a multiset, not row by row.
+    """
+    # Inside a GRAPH clause the branches would read one graph, not the union
+    dataset = _own_dataset(ctx)
+    source = _query_sources.get(ctx.prologue) if ctx.prologue is not None else None
+    if source is None:
+        raise NotImplementedError()
+    text, namespaces, algebra = source
+    pool = getattr(dataset, "query_pool", None)
+    cache = getattr(dataset, "partition_cache", None)
+    if pool is None or cache is None or getattr(_profiling, "profiler", None) is not None:
+        raise NotImplementedError()
+    bindings = dict(ctx.solution())
+    if part.name == "Union":
+        tasks = [(branch, bindings) for branch in _union_branches(part)]
+    elif part.name == "Join" and (_is_values(part.p1) or _is_values(part.p2)):
+        values, pattern = (part.p1, part.p2) if _is_values(part.p1) else (part.p2, part.p1)
+        tasks = [(pattern, {**bindings, **row}) for row in values.p.res
+                 if all(bindings.get(var, term) == term for var, term in row.items())]
+    else:
+        raise NotImplementedError()
+    scripts = [query_scripts(dataset, branch, row) for branch, row in tasks]
+    if len(tasks) < 2 or None in scripts:
+        raise NotImplementedError()
+    if sum(cache.triples.get(script, 0) for script in set().union(*scripts)) < PARALLEL_MIN_TRIPLES:
+        raise NotImplementedError()
+    # Parts under a FILTER EXISTS are not on a path of operators
+    paths = [_algebra_path(algebra, branch) for branch, row in tasks]
+    if None in paths:
+        raise NotImplementedError()
+    
+    futures = [pool.submit(evaluate_partition_task, partition_task(
+                   dataset, branch_scripts, (text, namespaces, path), row))
+               for (branch, row), branch_scripts, path in zip(tasks, scripts, paths)]
+    return _merged_solutions(ctx, futures)
+
+def _algebra_children(part):
+    return [part[key] for key in ("p", "p1", "p2") if isinstance(part.get(key), CompValue)]
+
+def describe_term(term, namespace_manager=None):
+    """Compact SPARQL-like rendering of a term or algebra expression"""
+    if isinstance(term, Variable):
+        return f"?{term}"
+    if isinstance(term, (URIRef, Literal)):
+        return term.n3(namespace_manager)
+    if isinstance(term, CompValue):
+        if term.name == "RelationalExpression":
+            return (f"{describe_term(term.expr, namespace_manager)} {term.op} "
+                    f"{describe_term(term.other, namespace_manager)}")
+        if term.name in ("ConditionalAndExpression", "ConditionalOrExpression"):
+            joiner = " && " if term.name == "ConditionalAndExpression" else " || "
+            return joiner.join(describe_term(e, namespace_manager) for e in [term.expr] + list(term.other or []))
+        if term.name == "OrderCondition":
+            return f"{term.order or 'ASC'}({describe_term(term.expr, namespace_manager)})"
+        if term.name.startswith("Builtin_"):
+            args = [describe_term(v, namespace_manager) for k, v in term.items()
+                    if not k.startswith("_") and v is not None]
+            return f"{term.name[8:]}({', '.join(args)})"
+        return term.name
+    if isinstance(term, (list, tuple)):
+        return " ".join(describe_term(t, namespace_manager) for t in term)
+    return str(term)
+
+def describe_operator(part, namespace_manager=None):
+    """One-line summary of an algebra operator and its arguments"""
+    if part.name == "Slice":
+        end = "" if part.length is None else part.start + part.length
+        return f"Slice [{part.start}, {end})"
+    if part.name == "Project":
+        return "Project " + describe_term(part.PV, namespace_manager)
+    if part.name == "Filter":
+        return f"Filter ({describe_term(part.expr, namespace_manager)})"
+    if part.name == "OrderBy":
+        return "OrderBy " + describe_term(part.expr, namespace_manager)
+    if part.name == "Extend":
+        return f"Extend ?{part.var} = {describe_term(part.expr, namespace_manager)}"
+    if part.name == "Graph":
+        return "Graph " + describe_term(part.term, namespace_manager)
+    return part.name
+
+def format_query_plan(algebra, namespace_manager=None, profiler=None):
+    """Render an algebra tree, with per-operator statistics when profiled"""
+    lines = []
+    if profiler is not None:
+        lines.append(f"{'Operator':<60}{'calls':>8}{'rows in':>10}{'rows out':>10}"
+                     f"{'total ms':>11}{'self ms':>10}")
+    
+    def visit(part, depth):
+        indent = "  " * depth
+        label = indent + describe_operator(part, namespace_manager)
+        children = _algebra_children(part)
+        stats = profiler.operators.get(id(part)) if profiler is not None else None
+        if stats is None:
+            lines.append(label)
+        else:
+            child_stats = [profiler.operators.get(id(c)) for c in children]
+            child_stats = [c for c in child_stats if c is not None]
+            rows_in = sum(c.rows_out for c in child_stats)
+            children_seconds = sum(c.seconds for c in child_stats)
+            total = max(stats.seconds, children_seconds)
+            lines.append(f"{label[:59]:<60}{stats.calls:>8}{rows_in:>10}{stats.rows_out:>10}"
+                         f"{total * 1000:>11.2f}{(total - children_seconds) * 1000:>10.2f}")
+        if part.name == "BGP":
+            for triple in part.triples:
+                lines.append(indent + "    " + describe_term(triple, namespace_manager))
+        for child in children:
+            visit(child, depth + 1)
+    
+    visit(algebra, 0)
+    return "\n".join(lines) + "\n"
+
+def profile_query(graph, query):
+    """Evaluate a query to completion with every operator instrumented"""
+    prepared = prepare_query(query, graph.namespaces())
+    profiler = QueryProfiler()
+    _profiling.profiler = profiler
+    try:
+        result = evalQuery(graph, prepared)
+        if result.get("type_") == "SELECT":
+            rows = sum(1 for _ in result["bindings"])
+        elif "graph" in result:
+            rows = len(result["graph"])
+        else:
+            rows = 1
+    finally:
+        _profiling.profiler = None
+    return prepared, profiler, rows
+
+def symbol_query(symbol):
+    """SELECT of every predicate and object of a symbol
+
+    The IRI is built by IRI() from a string, so symbols named after files
+    with spaces, which an <IRI> token cannot hold, can be queried too.
+    """
+    return ("SELECT ?p ?o WHERE {\n"
+            f"  BIND (IRI({Literal(str(symbol)).n3()}) AS ?symbol)\n"
+            "  ?symbol ?p ?o .\n}")
+
+# Shown by "Show Examples" and run by benchmark_sparql.py
+SPARQL_EXAMPLES = """# 1. Basic Symbol Inventory
+PREFIX script: <http://example.org/scripts#>
+SELECT ?symbol ?freq WHERE {
+  ?symbol a script:Symbol ;
+          script:fromScript "indus" ;
+          script:symbolFrequency ?freq .
+}
+ORDER BY DESC(?freq)
+LIMIT 10
+
+# 2. Cross-Script Similarity
+PREFIX script: <http://example.org/scripts#>
+SELECT ?indusSymbol ?otherSymbol ?script ?score WHERE {
+  ?indusSymbol script:fromScript "indus" ;
+               script:similarTo ?otherSymbol ;
+               script:similarityScore ?score .
+  ?otherSymbol script:fromScript ?script .
+  FILTER (?script != "indus")
+}
+ORDER BY DESC(?score)
+LIMIT 5
+
+# 3. Complex Glyph Identification
+PREFIX script: <http://example.org/scripts#>
+SELECT ?symbol ?contours WHERE {
+  ?symbol script:fromScript "indus" ;
+          script:contourCount ?contours .
+  FILTER (?contours > 7)
+}
+ORDER BY DESC(?contours)
+
+# 4. Precomputed Top Symbols (materialized view)
+PREFIX view: <http://example.org/scripts/views#>
+SELECT ?rank ?symbol ?freq WHERE {
+  ?row view:view view:topFrequency ;
+       view:script "indus" ;
+       view:rank ?rank ;
+       view:symbol ?symbol ;
+       view:value ?freq .
+}
+ORDER BY ?rank
+
+# 5. Single Script Graph
+PREFIX script: <http://example.org/scripts#>
+SELECT ?symbol ?freq WHERE {
+  GRAPH <http://example.org/scripts/graph/indus> {
+    ?symbol script:symbolFrequency ?freq .
+  }
+}
+ORDER BY DESC(?freq)
+LIMIT 10"""
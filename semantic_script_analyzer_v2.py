@@ -1,17 +1,133 @@
+import time
+# Start of import, for the startup report
+STARTUP_BEGAN = time.perf_counter()
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from rdflib import Graph, URIRef, Literal, Namespace
-from rdflib.namespace import RDF, RDFS, OWL, XSD, PROV, DCTERMS
-from rdflib.plugins.sparql import prepareQuery
+from rdflib.namespace import RDF, XSD, PROV, DCTERMS
 import os
-import numpy as np
-import cv2
+import sys
+import tracemalloc
+import subprocess
 from datetime import datetime
 import webbrowser
 import csv
-import time
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
+import json
+from itertools import islice
+from functools import wraps
+import cProfile
+import pstats
+import re
+
+from kg_metrics import (LAZY_IMPORT_SECONDS, StageMetrics, np, peak_resident_memory,
+                        resident_memory)
+from kg_indexes import (ONTOLOGY_GRAPH, PublishedGraph, create_kg_dataset, evaluate_query,
+                        resident_scripts)
+from kg_query import (ParallelQueryPool, QueryLatencyHistory, SPARQL_EXAMPLES, WorkloadAdvisor,
+                      format_query_plan, prepare_query, profile_query, query_scripts, symbol_query)
+from kg_endpoint import SPARQLEndpoint
+from kg_builder import APP_DATA_DIR, KGBuilder, define_ontology
+
+# Dashboard distributions: title, symbol table column (or derived key), x label
+DASHBOARD_DISTRIBUTIONS = (
+    ("Symbol frequency", "frequency", "occurrences"),
+    ("Contour count", "contours", "contours"),
+    ("Glyph size", "size", "\u221a(width \u00d7 height) px"),
+    ("Ink density", "ink_density", "share of dark pixels"),
+)
+
+def dashboard_data(table, bins=20):
+    """Per-script distributions and the script-pair similarity matrix
+
+    Computed from the symbol table's columns, one vectorized pass per
+    figure, so the graph itself is not scanned.
+    """
+    columns = table.columns()
+    derived = {"size": np.sqrt(columns["width"] * columns["height"])}
+    # Contour counts are small integers: one bin per value
+    contours = columns["contours"][~np.isnan(columns["contours"])]
+    contour_bins = np.arange(0.5, contours.max(initial=1) + 1)
+    distributions = {title: table.histogram(derived.get(column, column),
+                                            contour_bins if column == "contours" else bins)
+                     for title, column, _ in DASHBOARD_DISTRIBUTIONS}
+    return {"symbols": len(columns["symbol"]), "distributions": distributions,
+            "similarity": table.similarity_matrix()}
+
+def profile_to_speedscope(stats, name):
+    """Convert pstats data to a speedscope sampled profile.
+
+    cProfile only records caller/callee pairs, so each function's self time
+    is attributed to the chain of its most expensive callers.
+    """
+    frames, frame_index = [], {}
+    
+    def frame(func):
+        if func not in frame_index:
+            filename, line, funcname = func
+            frame_index[func] = len(frames)
+            frames.append({"name": funcname, "file": filename, "line": line})
+        return frame_index[func]
+    
+    samples, weights = [], []
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        if tt <= 0:
+            continue
+        stack, seen = [func], {func}
+        while callers:
+            parent = max(callers, key=lambda c: callers[c][3])
+            if parent in seen:
+                break
+            stack.append(parent)
+            seen.add(parent)
+            callers = stats.stats.get(parent, (0, 0, 0, 0, {}))[4]
+        samples.append([frame(f) for f in reversed(stack)])
+        weights.append(tt)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "semantic_script_analyzer",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled", "name": name, "unit": "seconds",
+            "startValue": 0, "endValue": sum(weights),
+            "samples": samples, "weights": weights
+        }]
+    }
+
+def profiled(operation):
+    """Run an analyzer method under cProfile when profiling is switched on"""
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not self.profiling_enabled.get():
+                return method(self, *args, **kwargs)
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                profiler.disable()
+                self.save_profile(profiler, operation)
+        return wrapper
+    return decorator
+
+def import_time_breakdown(module=None):
+    """(name, seconds) per top-level import when a fresh interpreter imports this module
+
+    Parsed from ``python -X importtime``, slowest first. Modules pulled in by
+    an earlier import are counted under that one.
+    """
+    module = module or os.path.splitext(os.path.basename(__file__))[0]
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, timeout=60)
+    breakdown = []
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | <two spaces per level>name"
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)", line)
+        if match and len(match.group(3)) == 3:
+            breakdown.append((match.group(4), int(match.group(2)) / 1e6))
+    return sorted(breakdown, key=lambda item: -item[1])
 
 class SemanticScriptAnalyzer:
     def __init__(self, root):
@@ -24,9 +140,9 @@ class SemanticScriptAnalyzer:
                              'proto_cuneiform', 'proto_elamite', 'standard_yi', 'yi']
         
         # Initialize KG and ontology
-        self.kg = Graph()
         self.ns = Namespace("http://example.org/scripts#")
-        self.define_ontology()
+        self.published = PublishedGraph(self.create_graph())
+        define_ontology(self.ns, self.kg.graph(ONTOLOGY_GRAPH))
         
         # Performance metrics
         self.metrics = {
@@ -36,50 +152,72 @@ class SemanticScriptAnalyzer:
             "error_count": 0,
             "query_count": 0
         }
+        self.stage_metrics = StageMetrics()
+        self.memory_report = {}
+        self.latency_history = QueryLatencyHistory(os.path.join(APP_DATA_DIR, "query_history.json"))
+        self.latency_history.load()
+        self.workload_advisor = WorkloadAdvisor(self.latency_history)
+        self.recommendations = []
+        
+        # Local SPARQL endpoint, started on demand
+        self.endpoint = SPARQLEndpoint(self.published)
+        
+        # Worker processes for multi-script queries, created with the first KG that uses them
+        self.query_pool = None
         
         # Create UI
         self.create_widgets()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
         # Set default dataset path
         self.dataset_path = os.path.join(os.getcwd(), 'ind')
         if not os.path.exists(self.dataset_path):
             messagebox.showwarning("Warning", "'ind' dataset folder not found")
+        
+        # Time to first window, noted when the main window is mapped
+        self.startup_seconds = None
+        self.root.bind("<Map>", self.record_first_window, add="+")
+
+    def record_first_window(self, event):
+        """Record startup time the first time the main window is shown"""
+        if event.widget is not self.root or self.startup_seconds is not None:
+            return
+        self.startup_seconds = time.perf_counter() - STARTUP_BEGAN
+        self.stage_metrics.set_gauge("startup_import_seconds", IMPORT_SECONDS)
+        self.stage_metrics.set_gauge("startup_first_window_seconds", self.startup_seconds)
+        self.status.config(text=f"Ready in {self.startup_seconds:.2f}s")
+
+    def startup_report(self):
+        """Startup time breakdown: imports, time to first window and deferred loads"""
+        lines = [f"Module import: {IMPORT_SECONDS * 1000:.0f} ms"]
+        if self.startup_seconds is not None:
+            lines.append(f"First window: {self.startup_seconds * 1000:.0f} ms after import began")
+        lines.append("")
+        lines.append("Import time by top-level module (fresh interpreter):")
+        try:
+            for name, seconds in import_time_breakdown()[:15]:
+                lines.append(f"  {seconds * 1000:8.1f} ms  {name}")
+        except (OSError, subprocess.SubprocessError) as e:
+            lines.append(f"  unavailable: {e}")
+        if LAZY_IMPORT_SECONDS:
+            lines.append("")
+            lines.append("Loaded on first use:")
+            for name, seconds in sorted(LAZY_IMPORT_SECONDS.items(), key=lambda item: -item[1]):
+                lines.append(f"  {seconds * 1000:8.1f} ms  {name}")
+        return "\n".join(lines)
+
+    @property
+    def kg(self):
+        """The published KG
 
-    def define_ontology(self):
-        """Enhanced ontology with PROV-O support"""
-        self.kg.bind("script", self.ns)
-        self.kg.bind("prov", PROV)
-        self.kg.bind("dcterms", DCTERMS)
-        
-        # Core classes
-        classes = [
-            (self.ns.Script, "Ancient writing system"),
-            (self.ns.Symbol, "Individual character/glyph"),
-            (self.ns.ScriptFamily, "Group of related scripts")
-        ]
-        
-        for cls, comment in classes:
-            self.kg.add((cls, RDF.type, OWL.Class))
-            self.kg.add((cls, RDFS.comment, Literal(comment)))
-        
-        # Properties
-        properties = [
-            (self.ns.hasSymbol, "Script contains symbol", OWL.ObjectProperty),
-            (self.ns.similarTo, "Similarity relationship", OWL.ObjectProperty),
-            (self.ns.similarityScore, "Numerical similarity", OWL.DatatypeProperty),
-            (self.ns.scriptFamily, "Family classification", OWL.ObjectProperty),
-            (self.ns.symbolFrequency, "Usage frequency", OWL.DatatypeProperty),
-            (self.ns.contourCount, "Number of contours in glyph", OWL.DatatypeProperty),
-            (self.ns.fromScript, "Indicates source script", OWL.DatatypeProperty)
-        ]
-        
-        for prop, comment, prop_type in properties:
-            self.kg.add((prop, RDF.type, prop_type))
-            self.kg.add((prop, RDFS.comment, Literal(comment)))
-        
-        # Define script families
-        self.kg.add((self.ns.IndusValleyFamily, RDF.type, self.ns.ScriptFamily))
-        self.kg.add((self.ns.ProtoElamiteFamily, RDF.type, self.ns.ScriptFamily))
+        Builds are published from the Tk thread, so reads made there see one
+        KG throughout and need no pin; the endpoint's threads pin theirs.
+        """
+        return self.published.current
+
+    def create_graph(self):
+        """Create an empty KG dataset with its live indexes attached"""
+        return create_kg_dataset(self.ns, self.script_folders)
 
     def create_widgets(self):
         """Build the UI interface with metrics dashboard"""
@@ -115,7 +253,41 @@ class SemanticScriptAnalyzer:
             self.comparison_scripts.insert(tk.END, script)
         self.comparison_scripts.pack(fill=tk.X, pady=5)
         
+        # Symbol search
+        ttk.Label(control_frame, text="Find Symbol:").pack(pady=5)
+        self.symbol_search = ttk.Entry(control_frame)
+        self.symbol_search.pack(fill=tk.X, pady=2)
+        self.symbol_search.bind("<KeyRelease>", lambda event: self.update_symbol_suggestions())
+        self.symbol_search.bind("<Return>", lambda event: self.show_symbol())
+        self.symbol_suggestions = tk.Listbox(control_frame, height=6)
+        self.symbol_suggestions.pack(fill=tk.X, pady=2)
+        self.symbol_suggestions.bind("<Double-Button-1>", lambda event: self.show_symbol())
+        self.symbol_matches = []
+        
         # KG Generation button with progress
+        build_frame = ttk.Frame(control_frame)
+        build_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(build_frame, text="Build workers:").pack(side=tk.LEFT)
+        self.build_workers = tk.IntVar(value=os.cpu_count() or 1)
+        ttk.Spinbox(build_frame, from_=1, to=64, width=5,
+                   textvariable=self.build_workers).pack(side=tk.LEFT, padx=5)
+        
+        # Script graphs beyond the budget are kept on disk; 0 keeps all loaded
+        budget_frame = ttk.Frame(control_frame)
+        budget_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(budget_frame, text="Memory budget (MB):").pack(side=tk.LEFT)
+        self.memory_budget = tk.IntVar(value=0)
+        ttk.Spinbox(budget_frame, from_=0, to=65536, increment=64, width=7,
+                   textvariable=self.memory_budget).pack(side=tk.LEFT, padx=5)
+        
+        # More than one spreads UNION branches and VALUES rows over processes
+        query_frame = ttk.Frame(control_frame)
+        query_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(query_frame, text="Query workers:").pack(side=tk.LEFT)
+        self.query_workers = tk.IntVar(value=1)
+        ttk.Spinbox(query_frame, from_=1, to=64, width=5,
+                   textvariable=self.query_workers).pack(side=tk.LEFT, padx=5)
+        
         self.kg_progress = ttk.Progressbar(control_frame, mode='determinate')
         ttk.Button(control_frame, text="Generate Knowledge Graph", 
                   command=self.generate_kg).pack(pady=5, fill=tk.X)
@@ -125,10 +297,17 @@ class SemanticScriptAnalyzer:
         ttk.Label(control_frame, text="Export:").pack(pady=5)
         ttk.Button(control_frame, text="Export KG (Turtle)", 
                   command=self.export_kg).pack(fill=tk.X, pady=2)
+        ttk.Button(control_frame, text="Export Script Graph",
+                  command=self.export_script_graph).pack(fill=tk.X, pady=2)
+        ttk.Button(control_frame, text="Export Symbol Table",
+                  command=self.export_symbol_table).pack(fill=tk.X, pady=2)
         ttk.Button(control_frame, text="Publish as Linked Data", 
                   command=self.publish_as_linked_data).pack(fill=tk.X, pady=2)
         ttk.Button(control_frame, text="Generate VoID Description", 
                   command=self.generate_void_description).pack(fill=tk.X, pady=2)
+        self.endpoint_button = ttk.Button(control_frame, text="Start SPARQL Endpoint",
+                                          command=self.toggle_sparql_endpoint)
+        self.endpoint_button.pack(fill=tk.X, pady=2)
         
         # Right panel - Results display
         result_frame = ttk.Frame(main_frame)
@@ -146,6 +325,12 @@ class SemanticScriptAnalyzer:
         # SPARQL Query tab
         self.create_sparql_tab()
         
+        # Query latency tab
+        self.create_latency_tab()
+        
+        # Distributions dashboard tab
+        self.create_dashboard_tab()
+        
         # Status bar
         self.status = ttk.Label(self.root, text="Ready", relief=tk.SUNKEN)
         self.status.pack(side=tk.BOTTOM, fill=tk.X)
@@ -172,9 +357,29 @@ class SemanticScriptAnalyzer:
         self.triple_count_label = ttk.Label(metrics_frame, text="Triples: 0")
         self.triple_count_label.pack(anchor=tk.W)
         
+        # Memory
+        ttk.Label(metrics_frame, text="Memory:").pack(anchor=tk.W, pady=(10,0))
+        self.memory_label = ttk.Label(metrics_frame, text="RSS: n/a")
+        self.memory_label.pack(anchor=tk.W)
+        self.bytes_per_triple_label = ttk.Label(metrics_frame, text="Bytes/triple: n/a")
+        self.bytes_per_triple_label.pack(anchor=tk.W)
+        self.track_memory = tk.BooleanVar(value=False)
+        ttk.Checkbutton(metrics_frame, text="Track memory (tracemalloc)",
+                       variable=self.track_memory).pack(anchor=tk.W)
+        
         # Error Tracking
         self.error_label = ttk.Label(metrics_frame, text="Errors: 0", foreground="red")
         self.error_label.pack(anchor=tk.W, pady=(10,0))
+        
+        ttk.Button(metrics_frame, text="Export Metrics...",
+                  command=self.export_metrics).pack(fill=tk.X, pady=(10,0))
+        
+        # Profiler capture
+        self.profiling_enabled = tk.BooleanVar(value=False)
+        ttk.Checkbutton(metrics_frame, text="Profile operations",
+                       variable=self.profiling_enabled).pack(anchor=tk.W, pady=(10,0))
+        ttk.Button(metrics_frame, text="Open Profiles Folder",
+                  command=self.open_profiles_folder).pack(fill=tk.X)
 
     def create_stats_tab(self):
         """Enhanced KG statistics tab"""
@@ -200,6 +405,10 @@ class SemanticScriptAnalyzer:
         button_frame.pack(fill=tk.X, padx=5, pady=5)
         ttk.Button(button_frame, text="Execute", command=self.execute_sparql).pack(side=tk.LEFT)
         ttk.Button(button_frame, text="Clear", command=self.clear_sparql).pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="Explain",
+                  command=self.explain_sparql).pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="Profile",
+                  command=lambda: self.explain_sparql(profile=True)).pack(side=tk.LEFT)
         ttk.Button(button_frame, text="Example Queries", command=self.show_sparql_examples).pack(side=tk.RIGHT)
         
         # Results display
@@ -218,6 +427,234 @@ class SemanticScriptAnalyzer:
         ttk.Button(export_frame, text="Export as RDF", 
                   command=self.export_sparql_rdf).pack(side=tk.LEFT)
 
+    def create_latency_tab(self):
+        """Create per-query latency history table and trend plot"""
+        self.latency_tab = ttk.Frame(self.results_notebook)
+        self.results_notebook.add(self.latency_tab, text="Query Latency")
+        
+        # One row per normalized query shape
+        columns = ("count", "p50", "p95", "p99", "throughput")
+        self.latency_tree = ttk.Treeview(self.latency_tab, columns=columns, height=8)
+        self.latency_tree.heading("#0", text="Query shape")
+        self.latency_tree.column("#0", width=400)
+        for column, title in zip(columns, ["Runs", "p50 (ms)", "p95 (ms)", "p99 (ms)", "Queries/s"]):
+            self.latency_tree.heading(column, text=title)
+            self.latency_tree.column(column, width=80, anchor=tk.E)
+        self.latency_tree.pack(fill=tk.X, padx=5, pady=5)
+        self.latency_tree.bind("<<TreeviewSelect>>", lambda event: self.plot_latency_history())
+        self.latency_shapes = {}
+        
+        # Trend plot for the selected shape, created when first needed
+        self.latency_plot_frame = ttk.Frame(self.latency_tab)
+        self.latency_plot_frame.pack(fill=tk.BOTH, expand=True)
+        self.latency_figure = None
+        
+        button_frame = ttk.Frame(self.latency_tab)
+        button_frame.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Button(button_frame, text="Analyze Workload",
+                  command=self.analyze_workload).pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="Build Recommendations",
+                  command=self.build_recommendations).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Clear History",
+                  command=self.clear_latency_history).pack(side=tk.RIGHT)
+        
+        # Index and view advice for the slowest frequent shapes
+        self.advisor_output = tk.Text(self.latency_tab, height=8, wrap=tk.WORD)
+        self.advisor_output.pack(fill=tk.X, padx=5, pady=5)
+        self.refresh_latency_view()
+
+    def create_dashboard_tab(self):
+        """Create per-script distribution plots and the script similarity heatmap"""
+        self.dashboard_tab = ttk.Frame(self.results_notebook)
+        self.results_notebook.add(self.dashboard_tab, text="Dashboard")
+        self.dashboard_status = ttk.Label(self.dashboard_tab, text="No symbols in the knowledge graph")
+        self.dashboard_status.pack(anchor=tk.W, padx=5, pady=5)
+        
+        # Figure created when the tab is first shown, redrawn only when the KG changed
+        self.dashboard_figure = None
+        self.dashboard_version = None
+        self.results_notebook.bind("<<NotebookTabChanged>>", lambda event: self.refresh_dashboard(), add="+")
+
+    def refresh_dashboard(self):
+        """Redraw the dashboard if it is showing and the KG changed since it was drawn"""
+        if self.results_notebook.select() != str(self.dashboard_tab):
+            return
+        if self.kg.version == self.dashboard_version:
+            return
+        table = self.kg.indexes["symbols"]
+        # The symbol table covers every script graph, resident or not
+        with self.kg.lock.read(), self.stage_metrics.time("dashboard_compute"):
+            version = self.kg.version
+            data = dashboard_data(table) if len(table) else None
+        self.draw_dashboard(data)
+        self.dashboard_version = version
+
+    def draw_dashboard(self, data):
+        """Plot dashboard_data: four distributions and the similarity heatmap"""
+        if data is None:
+            self.dashboard_status.config(text="No symbols in the knowledge graph")
+            if self.dashboard_figure is not None:
+                self.dashboard_figure.clear()
+                self.dashboard_canvas.draw_idle()
+            return
+        if self.dashboard_figure is None:
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+            from matplotlib.figure import Figure
+            self.dashboard_figure = Figure(figsize=(9, 6), dpi=100)
+            self.dashboard_canvas = FigureCanvasTkAgg(self.dashboard_figure, master=self.dashboard_tab)
+            self.dashboard_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        figure = self.dashboard_figure
+        figure.clear()
+        grid = figure.add_gridspec(2, 3)
+        
+        # Shares rather than counts, so scripts of different sizes compare
+        for i, (title, _, xlabel) in enumerate(DASHBOARD_DISTRIBUTIONS):
+            axes = figure.add_subplot(grid[i // 2, i % 2])
+            edges, counts = data["distributions"][title]
+            for script, script_counts in counts.items():
+                if script_counts.sum():
+                    axes.stairs(script_counts / script_counts.sum(), edges, label=script)
+            axes.set_title(title, fontsize="small")
+            axes.set_xlabel(xlabel, fontsize="x-small")
+            if i % 2 == 0:
+                axes.set_ylabel("share of symbols", fontsize="x-small")
+            axes.tick_params(labelsize="x-small")
+        handles, labels = axes.get_legend_handles_labels()
+        figure.legend(handles, labels, loc="lower center", ncol=4, fontsize="x-small")
+        
+        scripts, targets, matrix = data["similarity"]
+        axes = figure.add_subplot(grid[:, 2])
+        axes.set_title("Mean similarity", fontsize="small")
+        if matrix.size:
+            image = axes.imshow(np.ma.masked_invalid(matrix), cmap="viridis", vmin=0, vmax=1, aspect="auto")
+            axes.set_xticks(range(len(targets)), targets, rotation=90, fontsize="x-small")
+            axes.set_yticks(range(len(scripts)), scripts, fontsize="x-small")
+            axes.set_xlabel("similar to", fontsize="x-small")
+            for (row, column), value in np.ndenumerate(matrix):
+                if not np.isnan(value):
+                    axes.text(column, row, f"{value:.2f}", ha="center", va="center",
+                              fontsize="xx-small", color="white")
+            figure.colorbar(image, ax=axes, fraction=0.08)
+        else:
+            axes.set_axis_off()
+            axes.text(0.5, 0.5, "No similarity links", ha="center", va="center", transform=axes.transAxes)
+        figure.tight_layout(rect=(0, 0.05, 1, 1))
+        self.dashboard_canvas.draw_idle()
+        self.dashboard_status.config(text=f"{data['symbols']} symbols, "
+                                          f"{len(data['similarity'][0])} scripts")
+
+    def refresh_latency_view(self, select_shape=None):
+        """Rebuild the latency table, keeping or moving the selection"""
+        selection = self.latency_tree.selection()
+        if select_shape is None and selection:
+            select_shape = self.latency_shapes.get(selection[0])
+        self.latency_tree.delete(*self.latency_tree.get_children())
+        self.latency_shapes = {}
+        for i, shape in enumerate(reversed(list(self.latency_history.samples))):
+            summary = self.latency_history.summary(shape)
+            iid = f"shape{i}"
+            self.latency_shapes[iid] = shape
+            self.latency_tree.insert("", tk.END, iid=iid, text=shape[:120], values=(
+                summary["count"], f"{summary['p50'] * 1000:.1f}", f"{summary['p95'] * 1000:.1f}",
+                f"{summary['p99'] * 1000:.1f}", f"{summary['throughput']:.2f}"))
+            if shape == select_shape:
+                self.latency_tree.selection_set(iid)
+        self.plot_latency_history()
+
+    def plot_latency_history(self):
+        """Plot latency over time for the selected query shape"""
+        selection = self.latency_tree.selection()
+        shape = self.latency_shapes.get(selection[0]) if selection else None
+        if self.latency_figure is None:
+            if shape is None:
+                return
+            # matplotlib takes longer to import than the rest of startup together
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+            from matplotlib.figure import Figure
+            self.latency_figure = Figure(figsize=(6, 3), dpi=100)
+            self.latency_canvas = FigureCanvasTkAgg(self.latency_figure, master=self.latency_plot_frame)
+            self.latency_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.latency_figure.clear()
+        if shape is not None:
+            history = list(self.latency_history.samples.get(shape, ()))
+            summary = self.latency_history.summary(shape)
+            axes = self.latency_figure.add_subplot(111)
+            times = [datetime.fromtimestamp(sample[0]) for sample in history]
+            axes.plot(times, [sample[1] * 1000 for sample in history], marker="o", label="latency")
+            for key, style in (("p50", "--"), ("p95", "-."), ("p99", ":")):
+                axes.axhline(summary[key] * 1000, linestyle=style, color="grey", label=key)
+            axes.set_ylabel("ms")
+            axes.legend(loc="upper left", fontsize="small")
+            # KG size on a second axis shows when the dataset changed
+            triples_axes = axes.twinx()
+            triples_axes.step(times, [sample[3] for sample in history], where="post",
+                              color="tab:orange", alpha=0.5)
+            triples_axes.set_ylabel("triples")
+            self.latency_figure.autofmt_xdate()
+        self.latency_canvas.draw_idle()
+
+    def analyze_workload(self):
+        """Recommend indexes and views for the slowest frequent query shapes"""
+        with self.kg.lock.read():
+            self.recommendations = self.workload_advisor.recommend(self.kg)
+        self.advisor_output.delete(1.0, tk.END)
+        if not self.recommendations:
+            self.advisor_output.insert(
+                tk.END, f"No recommendations: no shape run {self.workload_advisor.min_runs}+ times "
+                        f"would gain from an index or view.\n")
+        for i, rec in enumerate(self.recommendations, 1):
+            self.advisor_output.insert(
+                tk.END, f"{i}. {rec['shape'][:100]}\n   {rec['runs']} runs, p50 {rec['p50'] * 1000:.1f} ms: "
+                        f"{self.workload_advisor.describe(rec)}, expected {rec['expected']:.1f}x "
+                        f"({rec['reason']})\n")
+        self.status.config(text=f"{len(self.recommendations)} workload recommendations")
+
+    def build_recommendations(self):
+        """Build the recommendations, keeping those whose measured speedup holds up"""
+        if not self.recommendations:
+            self.analyze_workload()
+        advisor = self.workload_advisor
+        self.advisor_output.delete(1.0, tk.END)
+        kept = 0
+        for i, rec in enumerate(self.recommendations, 1):
+            try:
+                prepared = prepare_query(rec["query"], self.kg.namespaces())
+                scripts = query_scripts(self.kg, prepared.algebra)
+                with resident_scripts(self.kg, scripts):
+                    before = advisor.measure(self.kg, rec["query"])
+                with self.kg.lock.write(), self.stage_metrics.time("advisor_build"):
+                    advisor.build(self.kg, rec)
+                with resident_scripts(self.kg, scripts):
+                    after = advisor.measure(self.kg, rec["query"])
+            except Exception as e:
+                self.metrics['error_count'] += 1
+                self.advisor_output.insert(tk.END, f"{i}. failed: {e}\n")
+                continue
+            speedup = advisor.workload_speedup(rec, before, after)
+            if speedup > 1.0:
+                advisor.applied.append(rec)
+                kept += 1
+                verdict = "kept"
+            else:
+                with self.kg.lock.write():
+                    advisor.drop(self.kg, rec)
+                verdict = "dropped"
+            self.advisor_output.insert(
+                tk.END, f"{i}. {advisor.describe(rec)} {verdict}: {before * 1000:.1f} ms -> "
+                        f"{after * 1000:.1f} ms, measured {speedup:.1f}x (expected "
+                        f"{rec['expected']:.1f}x)\n")
+        self.recommendations = []
+        self.update_metrics()
+        self.status.config(text=f"Built {kept} workload recommendations")
+
+    def clear_latency_history(self):
+        """Forget all recorded query latencies"""
+        try:
+            self.latency_history.clear()
+        except OSError as e:
+            self.status.config(text=f"Could not save query history: {e}")
+        self.refresh_latency_view()
+
     def browse_dataset(self):
         """Let user select dataset directory"""
         path = filedialog.askdirectory()
@@ -225,6 +662,7 @@ class SemanticScriptAnalyzer:
             self.dataset_entry.delete(0, tk.END)
             self.dataset_entry.insert(0, path)
 
+    @profiled("generate_kg")
     def generate_kg(self):
         """Generate knowledge graph with progress tracking"""
         start_time = time.time()
@@ -232,10 +670,16 @@ class SemanticScriptAnalyzer:
         self.status.config(text="Generating Knowledge Graph...")
         self.root.update()
         
+        # Memory accounting uses tracemalloc when enabled, RSS otherwise
+        self.stage_metrics.track_memory = self.track_memory.get()
+        started_tracing = self.stage_metrics.track_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        
         try:
-            # Reinitialize KG
-            self.kg = Graph()
-            self.define_ontology()
+            # Per-stage timings describe the latest build only
+            self.stage_metrics.reset("kg_")
+            self.memory_report = {}
             
             # Load script data
             primary = self.primary_script.get()
@@ -245,17 +689,34 @@ class SemanticScriptAnalyzer:
             if not comparisons:
                 messagebox.showwarning("Warning", "Please select comparison scripts")
                 return
-                
-            total_scripts = len(comparisons) + 1
-            for i, script in enumerate([primary] + comparisons):
-                self.load_script_data(script)
-                self.kg_progress['value'] = (i+1)/total_scripts * 100
-                self.root.update()
+            
+            # Build into a shadow KG; queries keep using the current snapshot.
+            # Query workers read the script graphs from their persisted copies.
+            builder = KGBuilder(self.ns, self.script_folders, self.dataset_path, primary,
+                                self.stage_metrics, self.show_build_progress)
+            query_workers = self.query_workers.get()
+            graph = builder.build([primary] + comparisons, self.build_workers.get(),
+                                  self.memory_budget.get() * 2**20, self.workload_advisor,
+                                  persist=query_workers > 1)
+            self.memory_report = builder.memory_report
+            if query_workers > 1:
+                if self.query_pool is None or self.query_pool.workers != query_workers:
+                    if self.query_pool is not None:
+                        self.query_pool.shutdown()
+                    self.query_pool = ParallelQueryPool(query_workers)
+                graph.query_pool = self.query_pool
+                # Spawning workers and mirroring partitions takes seconds; start before the first query
+                self.query_pool.warm(graph)
+            
+            # Publish the finished KG in one step, without waiting for readers
+            self.published.publish(graph)
             
             # Update metrics
             self.metrics['last_kg_gen_time'] = time.time() - start_time
             self.metrics['triple_count'] = len(self.kg)
             self.display_kg_statistics()
+            self.dashboard_version = None
+            self.refresh_dashboard()
             self.status.config(text="KG generation complete")
             
         except Exception as e:
@@ -263,79 +724,136 @@ class SemanticScriptAnalyzer:
             messagebox.showerror("Error", f"KG generation failed: {str(e)}")
             self.status.config(text="KG generation failed")
         finally:
+            if tracemalloc.is_tracing():
+                self.stage_metrics.set_gauge("kg_peak_traced_bytes", tracemalloc.get_traced_memory()[1])
+            if started_tracing:
+                tracemalloc.stop()
             self.update_metrics()
             self.kg_progress['value'] = 0
 
-    def load_script_data(self, script):
-        """Load script data and build KG"""
-        script_path = os.path.join(self.dataset_path, script)
-        if not os.path.exists(script_path):
+    def show_build_progress(self, fraction):
+        """Show KG build progress"""
+        self.kg_progress['value'] = fraction * 100
+        self.root.update()
+
+    def update_symbol_suggestions(self):
+        """Refresh the autocomplete list from the label index"""
+        with self.kg.lock.read():
+            stats = self.kg.indexes["stats"]
+            start = time.perf_counter()
+            matches = self.kg.indexes["labels"].search(self.symbol_search.get())
+            elapsed = time.perf_counter() - start
+            self.symbol_matches = [(label, s, stats.script_of(s)) for label, s in matches]
+        self.symbol_suggestions.delete(0, tk.END)
+        for label, s, script in self.symbol_matches:
+            self.symbol_suggestions.insert(tk.END, f"{label} ({script})" if script else label)
+        self.status.config(text=f"{len(self.symbol_matches)} matches in {elapsed * 1000:.2f}ms")
+
+    def show_symbol(self):
+        """Query everything known about the selected suggestion"""
+        selection = self.symbol_suggestions.curselection()
+        if not self.symbol_matches:
             return
-            
-        script_uri = self.ns[script]
-        self.kg.add((script_uri, RDF.type, self.ns.Script))
-        self.kg.add((script_uri, RDFS.label, Literal(script)))
-        self.kg.add((script_uri, self.ns.fromScript, Literal(script)))
-        
-        # Add to script family
-        if script == "indus":
-            self.kg.add((script_uri, self.ns.scriptFamily, self.ns.IndusValleyFamily))
-        elif script == "proto_elamite":
-            self.kg.add((script_uri, self.ns.scriptFamily, self.ns.ProtoElamiteFamily))
-        
-        # Process each symbol image
-        for img_file in os.listdir(script_path):
-            if img_file.lower().endswith(('.png', '.jpg', '.jpeg')):
-                symbol_id = os.path.splitext(img_file)[0]
-                symbol_uri = self.ns[f"{script}_{symbol_id}"]
-                
-                # Add to KG
-                self.kg.add((symbol_uri, RDF.type, self.ns.Symbol))
-                self.kg.add((symbol_uri, RDFS.label, Literal(symbol_id)))
-                self.kg.add((symbol_uri, self.ns.fromScript, Literal(script)))
-                self.kg.add((script_uri, self.ns.hasSymbol, symbol_uri))
-                
-                # Add simulated data
-                freq = np.random.randint(1, 100)
-                self.kg.add((symbol_uri, self.ns.symbolFrequency, Literal(freq, datatype=XSD.integer)))
-                
-                # Add simulated visual features
-                img = cv2.imread(os.path.join(script_path, img_file), cv2.IMREAD_GRAYSCALE)
-                if img is not None:
-                    contours = np.random.randint(1, 10)
-                    self.kg.add((symbol_uri, self.ns.contourCount, Literal(contours, datatype=XSD.integer)))
-                    
-                    # Add some similarity relationships
-                    if script == self.primary_script.get() and np.random.random() > 0.7:
-                        for comp_script in [s for s in self.script_folders if s != script]:
-                            comp_symbol = f"{comp_script}_symbol_{np.random.randint(1,50)}"
-                            score = round(np.random.uniform(0.5, 0.95), 2)
-                            self.kg.add((
-                                symbol_uri,
-                                self.ns.similarTo,
-                                self.ns[comp_symbol]
-                            ))
-                            self.kg.add((
-                                symbol_uri,
-                                self.ns.similarityScore,
-                                Literal(score, datatype=XSD.float)
-                            ))
+        label, symbol, script = self.symbol_matches[selection[0] if selection else 0]
+        self.query_text.delete(1.0, tk.END)
+        self.query_text.insert(tk.END, symbol_query(symbol))
+        self.results_notebook.select(self.sparql_tab)
+        self.execute_sparql()
 
     def display_kg_statistics(self):
         """Display KG statistics in the stats tab"""
         self.stats_output.delete(1.0, tk.END)
         
+        stats = self.kg.indexes["stats"]
+        
         # Basic stats
         self.stats_output.insert(tk.END, "=== Knowledge Graph Statistics ===\n\n")
-        self.stats_output.insert(tk.END, f"Total Triples: {len(self.kg)}\n")
-        self.stats_output.insert(tk.END, f"Scripts: {len(list(self.kg.subjects(RDF.type, self.ns.Script)))}\n")
-        self.stats_output.insert(tk.END, f"Symbols: {len(list(self.kg.subjects(RDF.type, self.ns.Symbol)))}\n")
+        self.stats_output.insert(tk.END, f"Total Triples: {stats.triples}\n")
+        self.stats_output.insert(tk.END, f"Scripts: {stats.classes[self.ns.Script]}\n")
+        self.stats_output.insert(tk.END, f"Symbols: {stats.classes[self.ns.Symbol]}\n")
+        
+        # Per-script breakdown
+        self.stats_output.insert(tk.END, "\n=== Scripts ===\n\n")
+        for script, count in stats.script_symbols.most_common():
+            self.stats_output.insert(
+                tk.END, f"{script}: {count} symbols, {stats.script_triples[script]} triples\n")
+        
+        # Named graphs
+        self.stats_output.insert(tk.END, "\n=== Named Graphs ===\n\n")
+        for graph_id in self.kg.partitions.graphs:
+            self.stats_output.insert(
+                tk.END, f"<{graph_id}>: {self.kg.partitions.triple_count(graph_id)} triples\n")
+        
+        # Script graphs kept on disk
+        cache = self.kg.partition_cache
+        if cache is not None:
+            self.stats_output.insert(
+                tk.END, f"\n=== Partitions (budget {cache.budget_bytes / 2**20:.0f} MB, "
+                        f"{cache.resident_bytes() / 2**20:.1f} MB resident) ===\n\n")
+            for script, size in cache.sizes.items():
+                state = "resident" if script in cache.resident else "on disk"
+                self.stats_output.insert(
+                    tk.END, f"{script}: {state}, {cache.triples[script]} triples, ~{size / 2**20:.1f} MB\n")
+        
+        # Per-predicate breakdown
+        self.stats_output.insert(tk.END, "\n=== Predicates ===\n\n")
+        for prop, count in stats.properties.most_common():
+            self.stats_output.insert(tk.END, f"{prop.n3(self.kg.namespace_manager)}: {count}\n")
+        
+        # Build stage breakdown
+        self.stats_output.insert(tk.END, "\n=== Build Stages ===\n\n")
+        for stage, record in sorted(self.stage_metrics.stages.items()):
+            if stage.startswith("kg_"):
+                self.stats_output.insert(
+                    tk.END, f"{stage}: {record['sum']:.3f}s over {record['count']} calls "
+                            f"(max {record['max'] * 1000:.2f}ms)\n")
+        
+        # Materialized views
+        # Symbols are shown by label since some image names are not valid URIs
+        views = self.kg.indexes["views"]
+        labels = self.kg.indexes["labels"].labels
+        name = lambda node: labels.get(node) or node.split("#")[-1]
+        self.stats_output.insert(tk.END, "\n=== Top Symbols by Frequency ===\n\n")
+        for script in sorted(s for s in views.frequencies if s is not None):
+            top = ", ".join(f"{name(symbol)} ({freq})"
+                            for symbol, freq in views.top_frequency(script)[:5])
+            self.stats_output.insert(tk.END, f"{script}: {top}\n")
+        self.stats_output.insert(tk.END, "\n=== Top Similarity by Script Pair ===\n\n")
+        for (script, target_script), rows in sorted(views.top_similarity().items()):
+            symbol, target, score = rows[0]
+            self.stats_output.insert(
+                tk.END, f"{script} -> {target_script}: {len(rows)} pairs, best "
+                        f"{name(symbol)} ~ {name(target)} ({score})\n")
+        self.stats_output.insert(tk.END, "\n=== Contour Histograms ===\n\n")
+        for script, histogram in sorted((s, h) for s, h in views.contour_histograms.items() if s is not None):
+            bars = " ".join(f"{contours}:{count}" for contours, count in sorted(histogram.items()))
+            self.stats_output.insert(tk.END, f"{script}: {bars}\n")
+        
+        # Vectorized over the symbol table's columns
+        symbols = self.kg.indexes["symbols"]
+        if len(symbols):
+            self.stats_output.insert(tk.END, "\n=== Symbol Table Means ===\n\n")
+            aggregates = {column: symbols.aggregate(column)
+                          for column in ("frequency", "contours", "width", "height")}
+            for script in symbols.columns()["script_names"]:
+                means = ", ".join(f"{column} {aggregates[column][script]['mean']:.1f}"
+                                  for column in aggregates if script in aggregates[column])
+                self.stats_output.insert(tk.END, f"{script}: {means}\n")
+        
+        # Memory per script
+        self.stats_output.insert(tk.END, "\n=== Memory ===\n\n")
+        for script, usage in self.memory_report.items():
+            per_triple = usage["bytes"] / usage["triples"] if usage["triples"] else 0
+            self.stats_output.insert(
+                tk.END, f"{script}: {usage['bytes'] / 2**20:.1f} MB for {usage['triples']} triples "
+                        f"({per_triple:.0f} bytes/triple, {usage['source']})\n")
         
         # Sample data
         self.stats_output.insert(tk.END, "\n=== Sample Triples ===\n\n")
-        for s, p, o in list(self.kg)[:5]:  # Show first 5 triples
+        for s, p, o in islice(self.kg.triples((None, None, None)), 5):  # Show first 5 triples
             self.stats_output.insert(tk.END, f"{s.n3()} {p.n3()} {o.n3()}\n")
 
+    @profiled("execute_sparql")
     def execute_sparql(self):
         """Execute SPARQL query with comprehensive output handling"""
         query = self.query_text.get("1.0", tk.END).strip()
@@ -349,27 +867,42 @@ class SemanticScriptAnalyzer:
             # Clear previous results
             self.query_results.delete(1.0, tk.END)
             
-            # Execute query
-            results = self.kg.query(query)
+            with self.stage_metrics.time("sparql_parse"):
+                prepared = prepare_query(query, self.kg.namespaces())
             
-            # Update metrics
-            self.metrics['last_sparql_time'] = time.time() - start_time
-            self.metrics['query_count'] += 1
-            self.update_metrics()
-            
-            # Display based on query type
-            if results.type == "SELECT":
-                self.display_select_results(results)
-            elif results.type == "CONSTRUCT":
-                self.display_construct_results(results)
-            elif results.type == "ASK":
-                self.display_ask_result(results)
-            elif results.type == "DESCRIBE":
-                self.display_describe_results(results)
-            else:
-                self.query_results.insert(tk.END, f"Unsupported query type: {results.type}\n")
+            # Execute query against the current snapshot
+            with resident_scripts(self.kg, query_scripts(self.kg, prepared.algebra)):
+                with self.stage_metrics.time("sparql_evaluate"):
+                    results = evaluate_query(self.kg, prepared, query)
+                
+                # Update metrics
+                self.metrics['last_sparql_time'] = time.time() - start_time
+                self.metrics['query_count'] += 1
+                self.update_metrics()
+                
+                # Display based on query type
+                with self.stage_metrics.time("sparql_render"):
+                    if results.type == "SELECT":
+                        self.display_select_results(results)
+                    elif results.type == "CONSTRUCT":
+                        self.display_construct_results(results)
+                    elif results.type == "ASK":
+                        self.display_ask_result(results)
+                    elif results.type == "DESCRIBE":
+                        self.display_describe_results(results)
+                    else:
+                        self.query_results.insert(tk.END, f"Unsupported query type: {results.type}\n")
+                
+                rows = 1 if results.type == "ASK" else len(results)
+                shape = self.latency_history.record(query, self.metrics['last_sparql_time'], rows,
+                                                    self.kg.indexes["stats"].triples)
+            self.refresh_latency_view(select_shape=shape)
                 
             self.status.config(text="SPARQL query executed successfully")
+            try:
+                self.latency_history.save_if_due()
+            except OSError as e:
+                self.status.config(text=f"Could not save query history: {e}")
                 
         except Exception as e:
             self.metrics['error_count'] += 1
@@ -378,6 +911,39 @@ class SemanticScriptAnalyzer:
             self.query_results.insert(tk.END, f"Error: {str(e)}\n")
             self.status.config(text="SPARQL query failed")
 
+    def explain_sparql(self, profile=False):
+        """Show the query's algebra plan, optionally with per-operator profile"""
+        query = self.query_text.get("1.0", tk.END).strip()
+        if not query:
+            messagebox.showwarning("Warning", "Please enter a SPARQL query")
+            return
+        
+        try:
+            self.query_results.delete(1.0, tk.END)
+            prepared = prepare_query(query, self.kg.namespaces())
+            # Profiling evaluates the query, so its script graphs must be loaded
+            scripts = query_scripts(self.kg, prepared.algebra) if profile else ()
+            with resident_scripts(self.kg, scripts):
+                if profile:
+                    start_time = time.time()
+                    prepared, profiler, rows = profile_query(self.kg, query)
+                    elapsed = time.time() - start_time
+                else:
+                    profiler = None
+                plan = format_query_plan(prepared.algebra, self.kg.namespace_manager, profiler)
+            
+            title = "Query Profile" if profile else "Query Plan"
+            self.query_results.insert(tk.END, f"=== {title} ===\n\n{plan}")
+            if profile:
+                self.query_results.insert(
+                    tk.END, f"\n{rows} results in {elapsed:.4f} seconds (instrumented)\n")
+            self.status.config(text=f"{title} generated")
+        except Exception as e:
+            self.metrics['error_count'] += 1
+            self.update_metrics()
+            messagebox.showerror("SPARQL Error", f"Explain failed: {str(e)}")
+            self.status.config(text="Explain failed")
+
     def display_select_results(self, results):
         """Format SELECT query results as a table"""
         # Get headers
@@ -419,6 +985,7 @@ class SemanticScriptAnalyzer:
         self.query_results.insert(tk.END, f"\n{len(results)} triples in description\n")
         self.query_results.insert(tk.END, f"Query executed in {self.metrics['last_sparql_time']:.4f} seconds\n")
 
+    @profiled("export_sparql_csv")
     def export_sparql_csv(self):
         """Export SPARQL SELECT results as CSV"""
         query = self.query_text.get("1.0", tk.END).strip()
@@ -427,7 +994,10 @@ class SemanticScriptAnalyzer:
             return
             
         try:
-            results = self.kg.query(query)
+            prepared = prepare_query(query, self.kg.namespaces())
+            with resident_scripts(self.kg, query_scripts(self.kg, prepared.algebra)):
+                results = self.kg.query(prepared)
+                rows = list(results) if results.type == "SELECT" else []
             if results.type != "SELECT":
                 messagebox.showwarning("Warning", "Only SELECT queries can be exported to CSV")
                 return
@@ -442,7 +1012,7 @@ class SemanticScriptAnalyzer:
                 with open(file_path, 'w', newline='') as f:
                     writer = csv.writer(f)
                     writer.writerow([str(var) for var in results.vars])
-                    for row in results:
+                    for row in rows:
                         writer.writerow([str(val) for val in row])
                 messagebox.showinfo("Success", f"Results saved to {file_path}")
                 
@@ -451,6 +1021,7 @@ class SemanticScriptAnalyzer:
             self.update_metrics()
             messagebox.showerror("Error", f"Export failed: {str(e)}")
 
+    @profiled("export_sparql_rdf")
     def export_sparql_rdf(self):
         """Export SPARQL CONSTRUCT/DESCRIBE results as RDF"""
         query = self.query_text.get("1.0", tk.END).strip()
@@ -459,7 +1030,9 @@ class SemanticScriptAnalyzer:
             return
             
         try:
-            results = self.kg.query(query)
+            prepared = prepare_query(query, self.kg.namespaces())
+            with resident_scripts(self.kg, query_scripts(self.kg, prepared.algebra)):
+                results = self.kg.query(prepared)
             if results.type not in ["CONSTRUCT", "DESCRIBE"]:
                 messagebox.showwarning("Warning", "Only CONSTRUCT/DESCRIBE queries can be exported as RDF")
                 return
@@ -492,41 +1065,11 @@ class SemanticScriptAnalyzer:
 
     def show_sparql_examples(self):
         """Show Indus-focused SPARQL query examples"""
-        examples = """# 1. Basic Symbol Inventory
-PREFIX script: <http://example.org/scripts#>
-SELECT ?symbol ?freq WHERE {
-  ?symbol a script:Symbol ;
-          script:fromScript "indus" ;
-          script:symbolFrequency ?freq .
-}
-ORDER BY DESC(?freq)
-LIMIT 10
-
-# 2. Cross-Script Similarity
-PREFIX script: <http://example.org/scripts#>
-SELECT ?indusSymbol ?otherSymbol ?script ?score WHERE {
-  ?indusSymbol script:fromScript "indus" ;
-               script:similarTo ?otherSymbol ;
-               script:similarityScore ?score .
-  ?otherSymbol script:fromScript ?script .
-  FILTER (?script != "indus")
-}
-ORDER BY DESC(?score)
-LIMIT 5
-
-# 3. Complex Glyph Identification
-PREFIX script: <http://example.org/scripts#>
-SELECT ?symbol ?contours WHERE {
-  ?symbol script:fromScript "indus" ;
-          script:contourCount ?contours .
-  FILTER (?contours > 7)
-}
-ORDER BY DESC(?contours)"""
-        
         self.query_text.delete(1.0, tk.END)
-        self.query_text.insert(tk.END, examples)
+        self.query_text.insert(tk.END, SPARQL_EXAMPLES)
         self.status.config(text="Loaded example queries")
 
+    @profiled("export_kg")
     def export_kg(self):
         """Export knowledge graph to file"""
         if len(self.kg) == 0:
@@ -535,7 +1078,8 @@ ORDER BY DESC(?contours)"""
             
         file_path = filedialog.asksaveasfilename(
             defaultextension=".ttl",
-            filetypes=[("Turtle files", "*.ttl"), ("RDF/XML", "*.rdf"), ("JSON-LD", "*.jsonld")],
+            filetypes=[("Turtle files", "*.ttl"), ("RDF/XML", "*.rdf"), ("JSON-LD", "*.jsonld"),
+                       ("TriG (named graphs)", "*.trig"), ("N-Quads (named graphs)", "*.nq")],
             title="Save knowledge graph"
         )
         
@@ -543,8 +1087,11 @@ ORDER BY DESC(?contours)"""
             try:
                 format = "turtle" if file_path.endswith(".ttl") else \
                          "xml" if file_path.endswith(".rdf") else \
+                         "trig" if file_path.endswith(".trig") else \
+                         "nquads" if file_path.endswith(".nq") else \
                          "json-ld"
-                self.kg.serialize(destination=file_path, format=format)
+                with resident_scripts(self.kg), self.stage_metrics.time("kg_serialize"):
+                    self.kg.serialize(destination=file_path, format=format)
                 messagebox.showinfo("Success", f"Knowledge graph saved to {file_path}")
                 self.status.config(text=f"KG exported to {os.path.basename(file_path)}")
             except Exception as e:
@@ -552,6 +1099,64 @@ ORDER BY DESC(?contours)"""
                 self.update_metrics()
                 messagebox.showerror("Error", f"Export failed: {str(e)}")
 
+    def export_script_graph(self):
+        """Export the primary script's named graph on its own"""
+        script = self.primary_script.get()
+        if script not in self.kg.script_graphs:
+            messagebox.showwarning("Warning", f"No graph loaded for script '{script}'")
+            return
+        
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".ttl",
+            filetypes=[("Turtle files", "*.ttl"), ("N-Triples", "*.nt")],
+            initialfile=f"{script}.ttl",
+            title=f"Save {script} graph"
+        )
+        
+        if file_path:
+            try:
+                format = "nt" if file_path.endswith(".nt") else "turtle"
+                with resident_scripts(self.kg, [script]), \
+                        self.stage_metrics.time("kg_serialize"):
+                    self.kg.graph(self.kg.script_graphs[script]).serialize(
+                        destination=file_path, format=format, encoding="utf-8")
+                messagebox.showinfo("Success", f"{script} graph saved to {file_path}")
+                self.status.config(text=f"{script} graph exported to {os.path.basename(file_path)}")
+            except Exception as e:
+                self.metrics['error_count'] += 1
+                self.update_metrics()
+                messagebox.showerror("Error", f"Export failed: {str(e)}")
+
+    @profiled("export_symbol_table")
+    def export_symbol_table(self):
+        """Export the columnar symbol table for analytics tools"""
+        if not len(self.kg.indexes["symbols"]):
+            messagebox.showwarning("Warning", "Knowledge graph has no symbols")
+            return
+        
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".parquet",
+            filetypes=[("Parquet", "*.parquet"), ("Arrow IPC", "*.arrow"), ("NumPy arrays", "*.npz")],
+            initialfile="symbols.parquet",
+            title="Save symbol table"
+        )
+        
+        if file_path:
+            try:
+                # The table covers every script graph, resident or not
+                with self.kg.lock.read(), self.stage_metrics.time("symbol_table_export"):
+                    self.kg.indexes["symbols"].export(file_path)
+                messagebox.showinfo("Success", f"Symbol table saved to {file_path}")
+                self.status.config(text=f"Symbol table exported to {os.path.basename(file_path)}")
+            except ImportError as e:
+                # pyarrow is optional; the message says how to install it
+                messagebox.showerror("Error", str(e))
+            except Exception as e:
+                self.metrics['error_count'] += 1
+                self.update_metrics()
+                messagebox.showerror("Error", f"Export failed: {str(e)}")
+
+    @profiled("publish_as_linked_data")
     def publish_as_linked_data(self):
         """Publish KG as Linked Data with PROV-O metadata"""
         if len(self.kg) == 0:
@@ -562,11 +1167,12 @@ ORDER BY DESC(?contours)"""
         
         # Add PROV-O metadata
         dataset_uri = URIRef(base_uri + "dataset")
-        self.kg.add((dataset_uri, RDF.type, PROV.Entity))
-        self.kg.add((dataset_uri, DCTERMS.creator, Literal("Indus Script Researcher")))
-        self.kg.add((dataset_uri, DCTERMS.created, Literal(datetime.now().isoformat(), datatype=XSD.dateTime)))
-        self.kg.add((dataset_uri, DCTERMS.description, 
-                    Literal("Knowledge graph of Indus script symbols and related scripts")))
+        with self.kg.lock.write():
+            self.kg.add((dataset_uri, RDF.type, PROV.Entity))
+            self.kg.add((dataset_uri, DCTERMS.creator, Literal("Indus Script Researcher")))
+            self.kg.add((dataset_uri, DCTERMS.created, Literal(datetime.now().isoformat(), datatype=XSD.dateTime)))
+            self.kg.add((dataset_uri, DCTERMS.description, 
+                        Literal("Knowledge graph of Indus script symbols and related scripts")))
         
         output_dir = filedialog.askdirectory(title="Select output directory for Linked Data")
         if not output_dir:
@@ -582,13 +1188,15 @@ ORDER BY DESC(?contours)"""
                 "json-ld": "knowledge_graph.jsonld"
             }
             
-            for fmt, filename in formats.items():
-                self.kg.serialize(
-                    destination=os.path.join(output_dir, "data", filename),
-                    format=fmt
-                )
+            with resident_scripts(self.kg), self.stage_metrics.time("kg_serialize"):
+                for fmt, filename in formats.items():
+                    self.kg.serialize(
+                        destination=os.path.join(output_dir, "data", filename),
+                        format=fmt
+                    )
             
             # Generate HTML portal
+            stats = self.kg.indexes["stats"]
             with open(os.path.join(output_dir, "index.html"), "w") as f:
                 f.write(f"""<!DOCTYPE html>
 <html>
@@ -598,7 +1206,7 @@ ORDER BY DESC(?contours)"""
 </head>
 <body>
     <h1>Indus Script Linked Data</h1>
-    <p>This is a FAIR dataset containing {len(self.kg)} triples about Indus script symbols.</p>
+    <p>This is a FAIR dataset containing {stats.triples} triples about Indus script symbols.</p>
     <h2>Downloads</h2>
     <ul>
         <li><a href="data/knowledge_graph.ttl">Turtle format</a></li>
@@ -607,8 +1215,8 @@ ORDER BY DESC(?contours)"""
     </ul>
     <h2>Statistics</h2>
     <ul>
-        <li>Scripts: {len(list(self.kg.subjects(RDF.type, self.ns.Script)))}</li>
-        <li>Symbols: {len(list(self.kg.subjects(RDF.type, self.ns.Symbol)))}</li>
+        <li>Scripts: {stats.classes[self.ns.Script]}</li>
+        <li>Symbols: {stats.classes[self.ns.Symbol]}</li>
     </ul>
 </body>
 </html>""")
@@ -620,6 +1228,7 @@ ORDER BY DESC(?contours)"""
             self.update_metrics()
             messagebox.showerror("Error", f"Publication failed: {str(e)}")
 
+    @profiled("generate_void_description")
     def generate_void_description(self):
         """Generate VoID description of the dataset"""
         if len(self.kg) == 0:
@@ -629,26 +1238,75 @@ ORDER BY DESC(?contours)"""
         void = Namespace("http://rdfs.org/ns/void#")
         dataset_uri = URIRef("http://example.org/indus-script/dataset")
         
-        # Clear previous VoID data
-        for s, p, o in self.kg.triples((dataset_uri, None, None)):
-            self.kg.remove((s, p, o))
-        
-        # Add VoID metadata
-        self.kg.add((dataset_uri, RDF.type, void.Dataset))
-        self.kg.add((dataset_uri, void.sparqlEndpoint, URIRef("http://example.org/sparql")))
-        self.kg.add((dataset_uri, void.triples, Literal(len(self.kg))))
-        self.kg.add((dataset_uri, void.entities, Literal(
-            len(list(self.kg.subjects(RDF.type, self.ns.Script))) +
-            len(list(self.kg.subjects(RDF.type, self.ns.Symbol)))
-        )))
-        
-        # Add class partitions
-        for cls in [self.ns.Script, self.ns.Symbol, self.ns.ScriptFamily]:
-            partition_uri = URIRef(str(cls) + "_partition")
-            self.kg.add((dataset_uri, void.classPartition, partition_uri))
-            self.kg.add((partition_uri, void.cls, cls))
-            self.kg.add((partition_uri, void.entities, 
-                        Literal(len(list(self.kg.subjects(RDF.type, cls))))))
+        # Mutations of the published KG are exclusive with readers. The
+        # statistics cover every script graph, resident or not
+        with self.kg.lock.write():
+            # Clear previous VoID data, including partitions and linksets
+            for link in (void.classPartition, void.propertyPartition, void.subset):
+                for node in list(self.kg.objects(dataset_uri, link)):
+                    self.kg.remove((node, None, None))
+            self.kg.remove((dataset_uri, None, None))
+            
+            # Snapshot the live counts before the VoID triples change them
+            stats = self.kg.indexes["stats"]
+            dataset_counts = [
+                (void.triples, stats.triples),
+                (void.entities, stats.classes[self.ns.Script] + stats.classes[self.ns.Symbol]),
+                (void.classes, len(stats.classes)),
+                (void.properties, len(stats.properties)),
+                (void.distinctSubjects, len(stats.subjects)),
+                (void.distinctObjects, len(stats.objects))
+            ]
+            class_partitions = list(stats.classes.items())
+            property_partitions = [
+                (prop, count, len(stats.property_subjects[prop]), len(stats.property_objects[prop]))
+                for prop, count in stats.properties.items()
+            ]
+            linksets = list(stats.linksets.items())
+            script_subsets = [
+                (script, stats.script_triples[script], stats.script_symbols[script])
+                for script in stats.script_triples
+            ]
+            
+            # Add VoID metadata
+            self.kg.add((dataset_uri, RDF.type, void.Dataset))
+            endpoint_url = self.endpoint.url if self.endpoint.running else "http://example.org/sparql"
+            self.kg.add((dataset_uri, void.sparqlEndpoint, URIRef(endpoint_url)))
+            for prop, count in dataset_counts:
+                self.kg.add((dataset_uri, prop, Literal(count)))
+            
+            # Add class partitions
+            for cls, count in class_partitions:
+                partition_uri = URIRef(f"{dataset_uri}/classPartition/{self.void_local_name(cls)}")
+                self.kg.add((dataset_uri, void.classPartition, partition_uri))
+                self.kg.add((partition_uri, void.cls, cls))
+                self.kg.add((partition_uri, void.entities, Literal(count)))
+            
+            # Add property partitions
+            for prop, count, distinct_subjects, distinct_objects in property_partitions:
+                partition_uri = URIRef(f"{dataset_uri}/propertyPartition/{self.void_local_name(prop)}")
+                self.kg.add((dataset_uri, void.propertyPartition, partition_uri))
+                self.kg.add((partition_uri, void.property, prop))
+                self.kg.add((partition_uri, void.triples, Literal(count)))
+                self.kg.add((partition_uri, void.distinctSubjects, Literal(distinct_subjects)))
+                self.kg.add((partition_uri, void.distinctObjects, Literal(distinct_objects)))
+            
+            # Add per-script subsets and similarTo linksets between them
+            for script, triple_count, symbol_count in script_subsets:
+                script_uri = URIRef(f"{dataset_uri}/script/{script}")
+                self.kg.add((dataset_uri, void.subset, script_uri))
+                self.kg.add((script_uri, RDF.type, void.Dataset))
+                self.kg.add((script_uri, DCTERMS.title, Literal(script)))
+                self.kg.add((script_uri, void.triples, Literal(triple_count)))
+                self.kg.add((script_uri, void.entities, Literal(symbol_count)))
+            for (source, target), count in linksets:
+                linkset_uri = URIRef(f"{dataset_uri}/linkset/{source}-{target}")
+                self.kg.add((dataset_uri, void.subset, linkset_uri))
+                self.kg.add((linkset_uri, RDF.type, void.Linkset))
+                self.kg.add((linkset_uri, void.linkPredicate, self.ns.similarTo))
+                self.kg.add((linkset_uri, void.subjectsTarget, URIRef(f"{dataset_uri}/script/{source}")))
+                self.kg.add((linkset_uri, void.objectsTarget, URIRef(f"{dataset_uri}/script/{target}")))
+                self.kg.add((linkset_uri, void.triples, Literal(count)))
         
         file_path = filedialog.asksaveasfilename(
             defaultextension=".ttl",
@@ -658,7 +1316,8 @@ ORDER BY DESC(?contours)"""
         
         if file_path:
             try:
-                self.kg.serialize(destination=file_path, format='turtle')
+                with resident_scripts(self.kg), self.stage_metrics.time("kg_serialize"):
+                    self.kg.serialize(destination=file_path, format='turtle')
                 messagebox.showinfo("Success", f"VoID description saved to {file_path}")
                 self.status.config(text=f"VoID description saved to {os.path.basename(file_path)}")
             except Exception as e:
@@ -666,15 +1325,127 @@ ORDER BY DESC(?contours)"""
                 self.update_metrics()
                 messagebox.showerror("Error", f"Failed to save VoID: {str(e)}")
 
+    def export_metrics(self):
+        """Export per-stage metrics as JSON lines or Prometheus text"""
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".jsonl",
+            filetypes=[("JSON lines", "*.jsonl"), ("Prometheus text", "*.prom")],
+            title="Export metrics"
+        )
+        
+        if file_path:
+            try:
+                with open(file_path, "w") as f:
+                    if file_path.endswith(".prom"):
+                        f.write(self.stage_metrics.to_prometheus())
+                    else:
+                        f.write(self.stage_metrics.to_json_lines())
+                self.status.config(text=f"Metrics exported to {os.path.basename(file_path)}")
+            except Exception as e:
+                self.metrics['error_count'] += 1
+                self.update_metrics()
+                messagebox.showerror("Error", f"Metrics export failed: {str(e)}")
+
+    def save_profile(self, profiler, operation):
+        """Save a capture as pstats and speedscope files tagged with the KG in use"""
+        scripts = [self.primary_script.get()] + [
+            self.comparison_scripts.get(i) for i in self.comparison_scripts.curselection()]
+        metadata = {
+            "operation": operation,
+            "captured": datetime.now().isoformat(),
+            "dataset": self.dataset_path,
+            "scripts": scripts,
+            "triples": self.kg.indexes["stats"].triples
+        }
+        tag = "_".join([
+            datetime.now().strftime("%Y%m%d-%H%M%S"), operation,
+            os.path.basename(os.path.normpath(self.dataset_path)),
+            "+".join(scripts), f"{metadata['triples']}t"
+        ])
+        base = os.path.join(APP_DATA_DIR, "profiles", re.sub(r"[^\w.+-]", "-", tag))
+        try:
+            os.makedirs(os.path.dirname(base), exist_ok=True)
+            profiler.dump_stats(base + ".pstats")
+            stats = pstats.Stats(profiler)
+            with open(base + ".speedscope.json", "w") as f:
+                json.dump(profile_to_speedscope(stats, tag), f)
+            with open(base + ".meta.json", "w") as f:
+                json.dump(metadata, f, indent=2)
+            self.status.config(text=f"Profile saved to {base}.pstats")
+        except Exception as e:
+            self.metrics['error_count'] += 1
+            self.update_metrics()
+            messagebox.showerror("Error", f"Saving profile failed: {str(e)}")
+
+    def open_profiles_folder(self):
+        """Open the folder holding captured profiles"""
+        profiles_dir = os.path.join(APP_DATA_DIR, "profiles")
+        os.makedirs(profiles_dir, exist_ok=True)
+        webbrowser.open(f"file://{profiles_dir}")
+
+    def toggle_sparql_endpoint(self):
+        """Start or stop the local SPARQL 1.1 Protocol endpoint"""
+        if self.endpoint.running:
+            self.endpoint.stop()
+            self.endpoint_button.config(text="Start SPARQL Endpoint")
+            self.status.config(text="SPARQL endpoint stopped")
+            return
+        try:
+            self.endpoint.start()
+            self.endpoint_button.config(text="Stop SPARQL Endpoint")
+            self.status.config(text=f"SPARQL endpoint listening at {self.endpoint.url}")
+        except OSError as e:
+            self.metrics['error_count'] += 1
+            self.update_metrics()
+            messagebox.showerror("Error", f"Could not start SPARQL endpoint: {str(e)}")
+
+    def on_close(self):
+        """Shut down background services before closing the window"""
+        self.endpoint.stop()
+        try:
+            self.latency_history.save()
+        except OSError:
+            pass
+        if self.query_pool is not None:
+            self.query_pool.shutdown()
+        if self.kg.partition_cache is not None:
+            self.kg.partition_cache.discard()
+        self.root.destroy()
+
+    def void_local_name(self, term):
+        """URI-safe local name for a VoID partition of a class or property"""
+        return self.kg.namespace_manager.qname(term).replace(":", "_")
+
     def update_metrics(self):
         """Update all metric displays"""
         self.kg_time_label.config(text=f"Last run: {self.metrics['last_kg_gen_time']:.2f}s")
         self.sparql_time_label.config(text=f"Last query: {self.metrics['last_sparql_time']:.2f}s")
         self.sparql_count_label.config(text=f"Total queries: {self.metrics['query_count']}")
-        self.triple_count_label.config(text=f"Triples: {len(self.kg)}")
+        self.triple_count_label.config(text=f"Triples: {self.kg.indexes['stats'].triples}")
         self.error_label.config(text=f"Errors: {self.metrics['error_count']}")
+        
+        rss, peak_rss = resident_memory(), peak_resident_memory()
+        if rss is not None:
+            self.stage_metrics.set_gauge("process_resident_bytes", rss)
+        if peak_rss is not None:
+            self.stage_metrics.set_gauge("process_peak_resident_bytes", peak_rss)
+        self.memory_label.config(text=f"RSS: {(rss or 0) / 2**20:.0f} MB "
+                                      f"(peak {(peak_rss or 0) / 2**20:.0f} MB)")
+        total_bytes = sum(u["bytes"] for u in self.memory_report.values())
+        total_triples = sum(u["triples"] for u in self.memory_report.values())
+        if total_triples:
+            self.bytes_per_triple_label.config(text=f"Bytes/triple: {total_bytes / total_triples:.0f}")
+
+IMPORT_SECONDS = time.perf_counter() - STARTUP_BEGAN
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = SemanticScriptAnalyzer(root)
-    root.mainloop()
+    if "--startup-report" in sys.argv:
+        # Print where startup time went once the window is up, then quit
+        root.wait_visibility()
+        root.update()
+        print(app.startup_report())
+        app.on_close()
+    else:
+        root.mainloop()
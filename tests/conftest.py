@@ -0,0 +1,111 @@
+"""Shared fixtures: small seeded KGs shaped like the analyzer's builds"""
+
+import os
+import sys
+from contextlib import contextmanager
+
+import numpy as np
+import pytest
+from rdflib import Literal, Namespace
+from rdflib.namespace import RDF, RDFS, XSD
+
+# The analyzer and its modules are top-level modules, not a package
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from kg_builder import PARTITION_BYTES_PER_TRIPLE  # noqa: E402
+from kg_indexes import (IndexedDataset, KGStatistics, LabelIndex, MaterializedViews,  # noqa: E402
+                        NumericIndex, PartitionCache, SymbolTable)
+from kg_query import load_sparql  # noqa: E402
+
+NS = Namespace("http://example.org/scripts#")
+SCRIPT_FOLDERS = ['indus', 'ba-shu', 'naxi_dongba', 'old_naxi',
+                  'proto_cuneiform', 'proto_elamite', 'standard_yi', 'yi']
+PRIMARY_SCRIPT = "indus"
+SCRIPTS = ["indus", "ba-shu", "yi"]
+SYMBOLS = 150
+
+
+def script_triples(script, symbols=SYMBOLS):
+    """A script and its symbols as load_script_data adds them, from np.random"""
+    script_uri = NS[script]
+    triples = [(script_uri, RDF.type, NS.Script),
+               (script_uri, RDFS.label, Literal(script)),
+               (script_uri, NS.fromScript, Literal(script))]
+    for n in range(symbols):
+        symbol_id = f"{script}_{n:07d}"
+        symbol_uri = NS[f"{script}_{symbol_id}"]
+        triples += [(symbol_uri, RDF.type, NS.Symbol),
+                    (symbol_uri, RDFS.label, Literal(symbol_id)),
+                    (symbol_uri, NS.fromScript, Literal(script)),
+                    (script_uri, NS.hasSymbol, symbol_uri),
+                    (symbol_uri, NS.symbolFrequency, Literal(np.random.randint(1, 100), datatype=XSD.integer)),
+                    (symbol_uri, NS.contourCount, Literal(np.random.randint(1, 10), datatype=XSD.integer))]
+        if script == PRIMARY_SCRIPT and np.random.random() > 0.7:
+            for comp_script in [s for s in SCRIPT_FOLDERS if s != script]:
+                triples.append((symbol_uri, NS.similarTo, NS[f"{comp_script}_symbol_{np.random.randint(1, 50)}"]))
+                triples.append((symbol_uri, NS.similarityScore,
+                                Literal(round(np.random.uniform(0.5, 0.95), 2), datatype=XSD.float)))
+    return triples
+
+
+def fill_graph(graph, scripts=SCRIPTS, symbols=SYMBOLS):
+    """Add the test scripts to their script graphs, seeded so every fill is the same"""
+    np.random.seed(0)
+    for script in scripts:
+        script_graph = graph.script_graph(script)
+        for triple in script_triples(script, symbols):
+            script_graph.add(triple)
+    return graph
+
+
+def new_kg():
+    """An empty KG dataset with the indexes the analyzer attaches"""
+    graph = IndexedDataset(partition_key=NS.fromScript)
+    graph.bind("script", NS)
+    stats = graph.add_index("stats", KGStatistics(NS, SCRIPT_FOLDERS))
+    graph.add_index("views", MaterializedViews(stats))
+    graph.add_index("labels", LabelIndex())
+    graph.add_index("numeric", NumericIndex([NS.symbolFrequency, NS.contourCount, NS.similarityScore]))
+    graph.add_index("symbols", SymbolTable(NS, stats))
+    return graph
+
+
+@pytest.fixture(scope="session")
+def kg():
+    """Shared KG of the test scripts; tests that change a KG build their own"""
+    return fill_graph(new_kg())
+
+
+@pytest.fixture
+def analyzer_hooks():
+    """Evaluate SPARQL with the analyzer's hooks installed, as the analyzer does on import"""
+    load_sparql()
+
+
+@contextmanager
+def plain_rdflib(graph):
+    """Evaluate on graph with rdflib's own evaluator; the hooks decline its parts"""
+    graph.evaluators_enabled = False
+    try:
+        yield
+    finally:
+        graph.evaluators_enabled = True
+
+
+def spill(graph, directory, budget):
+    """Persist the script graphs as a budgeted build does, keeping what fits"""
+    os.makedirs(directory, exist_ok=True)
+    cache = PartitionCache(graph, directory, budget)
+    for script in reversed(list(graph.script_graphs)):
+        triples = graph.partitions.triple_count(graph.script_graphs[script])
+        cache.save(script, triples * PARTITION_BYTES_PER_TRIPLE)
+    cache.trim()
+    graph.partition_cache = cache
+    return graph
+
+
+@pytest.fixture(scope="session")
+def budgeted_kg(tmp_path_factory):
+    """The shared KG's scripts under a 1 kB budget, which keeps no script graph resident"""
+    return spill(fill_graph(new_kg()), str(tmp_path_factory.mktemp("partitions")), 2**10)
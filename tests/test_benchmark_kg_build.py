@@ -0,0 +1,45 @@
+"""Build benchmark summaries and their comparison with a baseline"""
+
+from benchmark_kg_build import compare, summarize
+
+CONFIG = {"repeat": 3, "workers": 1, "seed": 0, "synthetic_records": False}
+
+
+def run(wall, merge, triples=1000):
+    return {"wall_seconds": wall, "triples": triples, "peak_rss_bytes": 2**27,
+            "stage_seconds": {"kg_merge": merge, "kg_views": 0.001}, "counters": {}}
+
+
+def results(*runs, **config):
+    return {"config": dict(CONFIG, **config), "slices": {"single": summarize(list(runs))}}
+
+
+def test_summaries_take_the_median_run():
+    summary = summarize([run(1.0, 0.5), run(3.0, 0.4), run(2.0, 0.9)])
+    assert summary["wall_seconds"] == 2.0
+    assert summary["stage_seconds"]["kg_merge"] == 0.5
+    assert summary["triples_per_second"] == 500
+
+
+def test_a_slower_stage_is_a_regression_even_when_the_total_is_not():
+    baseline = results(run(2.0, 0.5), run(2.0, 0.5))
+    current = results(run(2.0, 0.8), run(2.1, 0.8))
+    failures = compare(current, baseline, 0.2, 0.1)
+    assert len(failures) == 1 and "stage kg_merge" in failures[0]
+    assert compare(results(run(2.0, 0.55)), baseline, 0.2, 0.1) == []
+
+
+def test_stages_below_the_noise_floor_are_not_compared():
+    baseline = results(run(2.0, 0.005))
+    assert compare(results(run(2.0, 0.009)), baseline, 0.2, 0.1) == []
+    assert compare(results(run(2.0, 0.009)), baseline, 0.2, 0.1, stage_min_seconds=0.001)
+
+
+def test_triple_counts_are_compared_only_under_the_same_config():
+    baseline = results(run(2.0, 0.5, triples=1000))
+    changed = results(run(2.0, 0.5, triples=900))
+    assert compare(changed, baseline, 0.2, 0.1) == ["single: triples 1000 -> 900"]
+    # Seeded builds are the same KG whatever the worker count
+    assert compare(results(run(2.0, 0.5, triples=900), workers=4), baseline, 0.2, 0.1) == \
+        ["single: triples 1000 -> 900"]
+    assert compare(results(run(2.0, 0.5, triples=900), seed=1), baseline, 0.2, 0.1) == []
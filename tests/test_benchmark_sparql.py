@@ -0,0 +1,41 @@
+"""The SPARQL benchmark's query set and its timed sessions"""
+
+from rdflib.plugins.sparql import prepareQuery
+
+from benchmark_sparql import benchmark_queries, latency_summary, run_session
+from generate_synthetic_dataset import generate
+from kg_query import SPARQL_EXAMPLES
+from conftest import PRIMARY_SCRIPT, SCRIPTS
+
+
+def test_every_example_query_is_benchmarked():
+    queries = benchmark_queries()
+    examples = [name for name in queries if name.startswith("example-")]
+    assert len(examples) == SPARQL_EXAMPLES.count("\n# ") + 1
+    assert "example-precomputed-top-symbols-materialized-view" in examples
+    for query in queries.values():
+        prepareQuery(query)
+
+
+def test_sessions_answer_the_same_with_and_without_the_optimizers(tmp_path):
+    dataset = str(tmp_path / "dataset")
+    generate(dataset, SCRIPTS, 30, 0, records=True, primary_script=PRIMARY_SCRIPT)
+    # DESCRIBE ... LIMIT may describe any five symbols, and without the
+    # optimizers no evaluator serves the view triples
+    queries = {name: query for name, query in benchmark_queries().items()
+               if not name.startswith("describe-") and "materialized-view" not in name}
+    task = {"dataset": dataset, "scripts": SCRIPTS, "seed": 0, "queries": queries,
+            "warm_runs": 2, "result_views": False}
+    optimized = run_session(dict(task, optimizers=True))
+    plain = run_session(dict(task, optimizers=False))
+    assert optimized["triples"] == plain["triples"]
+    assert {name: query["results"] for name, query in optimized["queries"].items()} == \
+        {name: query["results"] for name, query in plain["queries"].items()}
+    assert all(len(query["warm"]) == 2 for query in optimized["queries"].values())
+
+
+def test_latency_summaries_are_in_milliseconds():
+    summary = latency_summary([0.001, 0.002, 0.003])
+    assert summary["p50"] == 2.0
+    assert summary["max"] == 3.0 and summary["samples"] == 3
+    assert latency_summary([])["samples"] == 0
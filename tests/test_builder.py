@@ -0,0 +1,55 @@
+"""Headless KG builds, serial and sharded over worker processes"""
+
+import cv2
+import numpy as np
+from rdflib import BNode, Literal
+from rdflib.namespace import XSD
+
+from generate_synthetic_dataset import generate
+from kg_builder import KGBuilder, build_shard
+from kg_indexes import read_triples, write_triples
+from conftest import NS, PRIMARY_SCRIPT, SCRIPT_FOLDERS, SCRIPTS
+
+
+def test_shards_round_trip_terms_the_serializer_rejects(tmp_path):
+    path = str(tmp_path / "shard.jsonl")
+    triples = [(NS["yi_yi sign 1"], NS.similarityScore, Literal(0.73, datatype=XSD.float)),
+               (NS["yi_yi sign 1"], NS.note, Literal("tête", lang="fr")),
+               (BNode("b1"), NS.symbolFrequency, Literal(12, datatype=XSD.integer))]
+    write_triples(path, triples)
+    assert list(read_triples(path)) == triples
+
+
+def test_build_shard_is_seeded(tmp_path):
+    folder = tmp_path / PRIMARY_SCRIPT
+    folder.mkdir()
+    for n in range(5):
+        cv2.imwrite(str(folder / f"{n}.png"), np.zeros((8, 8), dtype=np.uint8))
+    task = {"script": PRIMARY_SCRIPT, "script_path": str(folder), "namespace": str(NS),
+            "files": sorted(p.name for p in folder.iterdir()), "header": True, "seed": 7,
+            "primary_script": PRIMARY_SCRIPT, "script_folders": SCRIPT_FOLDERS}
+    shards = []
+    for name in ("a", "b"):
+        result = build_shard(dict(task, path=str(tmp_path / f"{name}.jsonl")))
+        assert result["counters"]["kg_triples_generated"] == result["triples"]
+        shards.append(list(read_triples(result["path"])))
+    assert shards[0] == shards[1]
+    assert (NS[PRIMARY_SCRIPT], NS.hasSymbol, NS[f"{PRIMARY_SCRIPT}_0"]) in shards[0]
+
+
+def build_triples(dataset, workers):
+    np.random.seed(0)
+    builder = KGBuilder(NS, SCRIPT_FOLDERS, dataset, PRIMARY_SCRIPT)
+    graph = builder.build(SCRIPTS, workers)
+    assert set(builder.memory_report) == set(SCRIPTS)
+    return len(graph), set(graph.quads((None, None, None, None)))
+
+
+def test_sharded_builds_match_serial_builds(tmp_path):
+    dataset = str(tmp_path / "dataset")
+    # Image folders for two scripts, symbol records standing in for the third
+    generate(dataset, SCRIPTS[:2], 12, 0, widths=(16, 24), heights=(16, 24))
+    generate(dataset, SCRIPTS[2:], 12, 0, records=True, primary_script=PRIMARY_SCRIPT)
+    serial = build_triples(dataset, 1)
+    assert serial[0] > 3 * 12
+    assert build_triples(dataset, 2) == serial
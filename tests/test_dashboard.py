@@ -0,0 +1,38 @@
+"""Dashboard figures computed from the symbol table"""
+
+import numpy as np
+import pytest
+
+from kg_builder import glyph_features
+from semantic_script_analyzer_v2 import DASHBOARD_DISTRIBUTIONS, dashboard_data
+from conftest import NS, PRIMARY_SCRIPT, SCRIPT_FOLDERS
+
+
+def test_similarity_matrix_matches_the_links(kg):
+    scripts, targets, matrix = kg.indexes["symbols"].similarity_matrix()
+    # Only the primary script links out, to every other script
+    assert targets == sorted(s for s in SCRIPT_FOLDERS if s != PRIMARY_SCRIPT)
+    means = [np.mean([o.toPython() for o in kg.objects(s, NS.similarityScore)])
+             for s in set(kg.subjects(NS.similarTo, None))]
+    row = scripts.index(PRIMARY_SCRIPT)
+    assert matrix[row] == pytest.approx(np.full(len(targets), np.mean(means)))
+    assert np.isnan(np.delete(matrix, row, axis=0)).all()
+
+
+def test_dashboard_data_covers_every_symbol(kg):
+    data = dashboard_data(kg.indexes["symbols"])
+    assert data["symbols"] == len(kg.indexes["symbols"])
+    assert set(data["distributions"]) == {title for title, _, _ in DASHBOARD_DISTRIBUTIONS}
+    edges, counts = data["distributions"]["Contour count"]
+    # One bin per contour count
+    assert list(edges) == [c + 0.5 for c in range(len(edges))]
+    contours = len(list(kg.triples((None, NS.contourCount, None))))
+    assert sum(int(c.sum()) for c in counts.values()) == contours
+
+
+def test_ink_density_is_the_dark_share_of_the_glyph():
+    img = np.full((10, 20), 255, np.uint8)
+    img[:, :5] = 0
+    features = glyph_features(img)
+    assert (features["width"], features["height"]) == (20, 10)
+    assert features["ink_density"] == pytest.approx(0.25)
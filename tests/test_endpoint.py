@@ -0,0 +1,86 @@
+"""SPARQL protocol endpoint over the current KG"""
+
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import pytest
+
+from kg_endpoint import SPARQLEndpoint
+from kg_indexes import PublishedGraph
+from conftest import SYMBOLS
+
+# Long enough for a quick query on a loaded machine, short for a cross join
+TIMEOUT = 1.0
+CROSS_JOIN = "SELECT (COUNT(*) AS ?n) WHERE { ?a ?b ?c . ?d ?e ?f }"
+
+
+@pytest.fixture
+def endpoint(kg):
+    endpoint = SPARQLEndpoint(PublishedGraph(kg), port=0, timeout=TIMEOUT)
+    endpoint.start()
+    yield endpoint
+    endpoint.stop()
+
+
+def request(endpoint, query, accept="application/sparql-results+json"):
+    """(status, body) of a GET query"""
+    url = endpoint.url + "?" + urllib.parse.urlencode({"query": query})
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers={"Accept": accept})) as response:
+            return response.status, response.read().decode()
+    except urllib.error.HTTPError as error:
+        return error.code, error.read().decode()
+
+
+def test_select_uses_the_kg_prefixes(endpoint):
+    status, body = request(endpoint, 'SELECT ?s WHERE { ?s script:fromScript "yi" } LIMIT 3')
+    assert status == 200
+    assert len(json.loads(body)["results"]["bindings"]) == 3
+
+
+def test_ask_and_csv_results(endpoint):
+    status, body = request(endpoint, "ASK { ?s a script:Symbol }")
+    assert (status, json.loads(body)["boolean"]) == (200, True)
+    status, body = request(endpoint, 'SELECT ?s WHERE { ?s a script:Symbol ; script:fromScript "indus" }',
+                           "text/csv")
+    assert status == 200
+    assert len(body.splitlines()) == 1 + SYMBOLS
+
+
+def test_malformed_query_is_a_bad_request(endpoint):
+    status, body = request(endpoint, "SELEKT ?s WHERE { ?s ?p ?o }")
+    assert status == 400
+
+
+def test_timed_out_query_stops_and_frees_its_worker(kg):
+    endpoint = SPARQLEndpoint(PublishedGraph(kg), port=0, timeout=TIMEOUT, max_workers=1)
+    endpoint.start()
+    try:
+        start = time.perf_counter()
+        status, body = request(endpoint, CROSS_JOIN)
+        assert status == 503
+        assert time.perf_counter() - start < TIMEOUT + 2
+        # With a single query worker this only answers once the cross join stopped
+        status, body = request(endpoint, "ASK { ?s a script:Symbol }")
+        assert status == 200
+        assert time.perf_counter() - start < 2 * TIMEOUT + 2
+    finally:
+        endpoint.stop()
+
+
+def test_timed_out_query_releases_the_kg(endpoint, kg):
+    status, body = request(endpoint, CROSS_JOIN)
+    assert status == 503
+    # The evaluation is stopped, not left holding the KG's read lock
+    written = threading.Event()
+
+    def write():
+        with kg.lock.write():
+            written.set()
+
+    threading.Thread(target=write, daemon=True).start()
+    assert written.wait(timeout=2)
@@ -0,0 +1,126 @@
+"""The KG statistics agree with the graph they describe"""
+
+import threading
+import time
+from collections import Counter
+
+from rdflib.namespace import RDF
+
+from kg_indexes import KGStatistics, PublishedGraph, ReadWriteLock
+from conftest import NS, SCRIPT_FOLDERS, fill_graph, new_kg
+
+
+def recount(graph):
+    """Statistics computed from scratch over the graph's current triples"""
+    stats = KGStatistics(NS, SCRIPT_FOLDERS)
+    for triple in graph.triples((None, None, None)):
+        stats.triple_added(triple)
+    return stats
+
+
+def assert_same_statistics(stats, expected):
+    for name in ("triples", "classes", "properties", "subjects", "objects",
+                 "script_triples", "script_symbols", "linksets"):
+        assert getattr(stats, name) == getattr(expected, name), name
+    assert {p: c for p, c in stats.property_subjects.items() if c} == \
+        {p: c for p, c in expected.property_subjects.items() if c}
+
+
+def test_statistics_match_a_fresh_count(kg):
+    stats = kg.indexes["stats"]
+    triples = list(kg.triples((None, None, None)))
+    assert stats.triples == len(triples)
+    assert stats.classes == Counter(o for s, p, o in triples if p == RDF.type)
+    assert stats.properties == Counter(p for s, p, o in triples)
+    assert len(stats.subjects) == len({s for s, p, o in triples})
+    assert len(stats.objects) == len({o for s, p, o in triples})
+    for p in stats.properties:
+        assert len(stats.property_subjects[p]) == len(set(kg.subjects(p, None)))
+
+
+def test_duplicate_triples_are_counted_once(kg):
+    graph = fill_graph(new_kg())
+    graph.add(next(kg.triples((None, None, None))))
+    assert graph.indexes["stats"].triples == len(graph) == len(kg)
+
+
+def test_statistics_follow_removal_and_readding():
+    graph = fill_graph(new_kg())
+    symbol = next(graph.subjects(NS.similarTo, None))
+    removed = list(graph.triples((symbol, None, None)))
+    graph.remove((symbol, None, None))
+    graph.remove((None, None, NS["yi"]))
+    assert_same_statistics(graph.indexes["stats"], recount(graph))
+    for triple in removed:
+        graph.add(triple)
+    assert_same_statistics(graph.indexes["stats"], recount(graph))
+
+
+def test_a_triple_in_two_graphs_is_indexed_once():
+    graph = fill_graph(new_kg(), ["yi"])
+    stats = graph.indexes["stats"]
+    triple = (NS["yi"], NS.scriptFamily, NS.LoloishFamily)
+    graph.script_graph("yi").add(triple)
+    graph.add(triple)
+    assert stats.properties[NS.scriptFamily] == 1
+    graph.script_graph("yi").remove(triple)
+    assert stats.properties[NS.scriptFamily] == 1
+    graph.remove((*triple, graph.default_graph))
+    assert stats.properties[NS.scriptFamily] == 0
+    assert_same_statistics(stats, recount(graph))
+
+
+def test_linksets_group_similarity_links_by_script(kg):
+    stats = kg.indexes["stats"]
+    expected = Counter()
+    for s, o in kg.subject_objects(NS.similarTo):
+        # Targets are named after their script; 'standard_yi' is not 'yi'
+        target = next(script for script in sorted(SCRIPT_FOLDERS, key=len, reverse=True)
+                      if str(o).startswith(str(NS) + script + "_"))
+        expected[(str(kg.value(s, NS.fromScript)), target)] += 1
+    assert stats.linksets == expected
+    assert sum(stats.linksets.values()) == stats.properties[NS.similarTo]
+
+
+def test_script_of_prefers_the_longest_script_name():
+    stats = KGStatistics(NS, SCRIPT_FOLDERS)
+    assert stats.script_of(NS["standard_yi_symbol_3"]) == "standard_yi"
+    assert stats.script_of(NS["yi_symbol_3"]) == "yi"
+    assert stats.script_of(NS["unknown_symbol_3"]) is None
+
+
+def test_nested_read_does_not_wait_for_a_waiting_writer():
+    lock = ReadWriteLock()
+    written = threading.Event()
+
+    def write():
+        with lock.write():
+            written.set()
+
+    with lock.read():
+        writer = threading.Thread(target=write, daemon=True)
+        writer.start()
+        while not lock._waiting_writers:
+            time.sleep(0.01)
+        with lock.read():
+            assert not written.is_set()
+    assert written.wait(timeout=2)
+
+
+def test_read_released_from_another_thread():
+    lock = ReadWriteLock()
+    lock.acquire_read()
+    reader = threading.get_ident()
+    releaser = threading.Thread(target=lock.release_read, args=(reader,))
+    releaser.start()
+    releaser.join()
+    with lock.write():
+        pass
+
+
+def test_publish_does_not_wait_for_readers():
+    old, new = fill_graph(new_kg(), ["yi"]), new_kg()
+    published = PublishedGraph(old)
+    with old.lock.read():
+        published.publish(new)
+        assert published.current is new
@@ -0,0 +1,39 @@
+"""Label search and the query shown for a found symbol"""
+
+from rdflib import Literal
+from rdflib.namespace import RDFS
+
+from kg_query import symbol_query
+from conftest import NS, fill_graph, new_kg
+
+
+def test_prefix_search_is_case_insensitive(kg):
+    matches = kg.indexes["labels"].search("YI_000001")
+    assert [label for label, s in matches][:1] == ["yi_0000010"]
+    assert all(label.startswith("yi_000001") for label, s in matches)
+
+
+def test_token_search_matches_every_word():
+    graph = new_kg()
+    graph.add((NS.a, RDFS.label, Literal("Ba-Shu_scripts_(geometric_symbols)_4")))
+    graph.add((NS.b, RDFS.label, Literal("Ba-Shu_scripts_(animal_symbols)_4")))
+    assert [s for label, s in graph.indexes["labels"].search("geometric 4")] == [NS.a]
+    assert len(graph.indexes["labels"].search("shu 4")) == 2
+
+
+def test_removed_labels_are_not_found():
+    graph = fill_graph(new_kg(), ["yi"])
+    symbol = graph.indexes["labels"].search("yi_0000007")[0][1]
+    graph.remove((symbol, RDFS.label, None))
+    assert graph.indexes["labels"].search("yi_0000007") == []
+
+
+def test_symbol_with_a_space_in_its_label_can_be_shown():
+    graph = fill_graph(new_kg(), ["yi"])
+    symbol = NS["yi_yi sign 12"]
+    graph.add((symbol, RDFS.label, Literal("yi sign 12")))
+    graph.add((symbol, NS.fromScript, Literal("yi")))
+    label, found = graph.indexes["labels"].search("yi sign")[0]
+    assert (label, found) == ("yi sign 12", symbol)
+    rows = {(row.p, row.o) for row in graph.query(symbol_query(found))}
+    assert rows == {(RDFS.label, Literal("yi sign 12")), (NS.fromScript, Literal("yi"))}
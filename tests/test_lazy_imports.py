@@ -0,0 +1,30 @@
+"""Heavy modules stay unloaded until first use"""
+
+import subprocess
+import sys
+
+from conftest import ROOT
+
+HEAVY = ("numpy", "cv2", "rdflib.plugins.sparql")
+
+
+def loaded_after(code):
+    """The heavy modules a fresh interpreter has loaded after running code"""
+    script = f"import sys\n{code}\nprint(' '.join(m for m in {HEAVY!r} if m in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", script], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    return set(output.split())
+
+
+def test_importing_the_kg_modules_loads_nothing_heavy():
+    assert loaded_after("import kg_metrics, kg_indexes, kg_query, kg_builder, kg_endpoint") == set()
+
+
+def test_first_use_loads_and_times_what_it_needs():
+    assert loaded_after("""
+from kg_metrics import LAZY_IMPORT_SECONDS, np
+from kg_query import prepare_query
+prepare_query("ASK { ?s ?p ?o }")
+np.zeros(1)
+assert set(LAZY_IMPORT_SECONDS) == {"numpy", "rdflib.plugins.sparql"}, LAZY_IMPORT_SECONDS
+""") == {"numpy", "rdflib.plugins.sparql"}
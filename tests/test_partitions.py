@@ -0,0 +1,48 @@
+"""Script graphs paged to disk under a memory budget"""
+
+import os
+
+from kg_indexes import PublishedGraph, resident_scripts
+from kg_query import query_scripts
+from rdflib.plugins.sparql import prepareQuery
+from conftest import NS, SCRIPTS, fill_graph, new_kg, spill
+
+
+def scripts_of(graph, query):
+    return query_scripts(graph, prepareQuery(query, initNs=dict(graph.namespaces())).algebra)
+
+
+def test_budget_leaves_the_kg_and_its_statistics_whole(kg, budgeted_kg):
+    cache = budgeted_kg.partition_cache
+    assert not cache.resident
+    assert len(budgeted_kg) == len(kg) == kg.indexes["stats"].triples
+    assert budgeted_kg.indexes["stats"].properties == kg.indexes["stats"].properties
+
+
+def test_reads_load_only_the_scripts_they_need(budgeted_kg):
+    cache = budgeted_kg.partition_cache
+    with resident_scripts(budgeted_kg, ["yi"]):
+        assert list(cache.resident) == ["yi"]
+        assert len(list(budgeted_kg.script_graph("yi").triples((None, None, None)))) == cache.triples["yi"]
+    # Back under the budget once the read is over
+    assert not cache.resident
+    with resident_scripts(budgeted_kg):
+        assert set(cache.resident) == set(SCRIPTS)
+    assert not cache.resident
+
+
+def test_query_scripts_confines_pinned_patterns(budgeted_kg):
+    assert scripts_of(budgeted_kg, 'SELECT ?s WHERE { ?s script:fromScript "yi" ; script:contourCount ?c }') == {"yi"}
+    assert scripts_of(budgeted_kg, "SELECT ?s WHERE { ?s script:contourCount ?c }") is None
+    symbol = NS["indus_indus_0000003"]
+    assert scripts_of(budgeted_kg, f"ASK {{ <{symbol}> ?p ?o }}") == {"indus"}
+
+
+def test_publish_waits_for_the_last_pin_to_retire_a_kg(tmp_path):
+    old = spill(fill_graph(new_kg(), ["yi"]), str(tmp_path / "old"), 2**10)
+    published = PublishedGraph(old)
+    reader = published.pin()
+    published.publish(new_kg())
+    assert reader is old and os.path.isdir(old.partition_cache.directory)
+    published.unpin(reader)
+    assert not os.path.exists(old.partition_cache.directory)
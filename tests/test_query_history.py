@@ -0,0 +1,43 @@
+"""Query shapes and the latency history kept per shape"""
+
+import os
+
+from kg_query import QueryLatencyHistory, normalize_query, percentile
+
+
+def test_queries_differing_in_literals_share_a_shape():
+    first = normalize_query('SELECT ?s WHERE {\n  ?s script:fromScript "yi" . # yi only\n} LIMIT 10')
+    second = normalize_query("SELECT ?s WHERE { ?s script:fromScript 'indus' . } LIMIT 25")
+    assert first == second == "SELECT ?s WHERE { ?s script:fromScript ? . } LIMIT ?"
+    assert "<http://example.org/1>" in normalize_query("ASK { <http://example.org/1> ?p ?o }")
+
+
+def test_percentiles_are_interpolated():
+    values = [0.1, 0.2, 0.3, 0.4]
+    assert percentile(values, 50) == 0.25
+    assert percentile(values, 100) == 0.4
+    assert percentile([], 95) == 0.0
+
+
+def test_summary_of_a_shape(tmp_path):
+    history = QueryLatencyHistory(str(tmp_path / "history.json"))
+    for seconds in (0.01, 0.02, 0.03):
+        shape = history.record("ASK { ?s ?p 1 }", seconds, 1, 100)
+    summary = history.summary(shape)
+    assert summary["count"] == 3
+    assert abs(summary["p50"] - 0.02) < 1e-9
+
+
+def test_history_is_saved_periodically_and_reloaded(tmp_path):
+    path = str(tmp_path / "history.json")
+    history = QueryLatencyHistory(path, save_interval=3600)
+    history.record("ASK { ?s ?p 1 }", 0.01, 1, 100)
+    assert not history.save_if_due()
+    assert not os.path.exists(path)
+    history.save_interval = 0
+    assert history.save_if_due()
+    # Nothing new to write
+    assert not history.save_if_due()
+    reloaded = QueryLatencyHistory(path)
+    reloaded.load()
+    assert reloaded.summary("ASK { ?s ?p ? }")["count"] == 1
@@ -0,0 +1,199 @@
+"""The analyzer's CUSTOM_EVALS hooks answer queries as plain rdflib does"""
+
+import re
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import pytest
+from rdflib import Literal, Variable
+from rdflib.namespace import RDF
+
+from kg_indexes import QueryTimeout, query_deadline, resident_scripts
+import kg_query
+from kg_query import PARALLEL_MIN_TRIPLES, ParallelQueryPool, order_bgp, prepare_query, query_scripts
+from conftest import NS, fill_graph, new_kg, plain_rdflib, spill
+
+PREFIXES = """PREFIX script: <http://example.org/scripts#>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+"""
+
+QUERIES = {
+    "numeric-two-sided-range": """SELECT ?symbol ?freq ?contours WHERE {
+  ?symbol script:symbolFrequency ?freq ;
+          script:contourCount ?contours .
+  FILTER (?freq > 20 && ?freq <= 60 && ?contours < 5)
+}""",
+    "numeric-equality": """SELECT ?symbol WHERE {
+  ?symbol script:contourCount ?contours .
+  FILTER (?contours = 3)
+}""",
+    "numeric-decimal-bound": """SELECT ?symbol ?score WHERE {
+  ?symbol script:similarityScore ?score .
+  FILTER (0.5 <= ?score)
+}
+ORDER BY ?score""",
+    "numeric-ordered-limit": """SELECT ?symbol ?freq WHERE {
+  ?symbol script:symbolFrequency ?freq ;
+          script:fromScript "yi" .
+}
+ORDER BY DESC(?freq)
+LIMIT 5""",
+    "join-order-three-patterns": """SELECT ?symbol ?other ?freq WHERE {
+  ?symbol script:similarTo ?other .
+  ?symbol script:symbolFrequency ?freq .
+  ?symbol script:fromScript "indus" .
+}""",
+    "join-order-optional": """SELECT ?script ?symbol ?freq WHERE {
+  ?script a script:Script ; script:hasSymbol ?symbol .
+  OPTIONAL { ?symbol script:symbolFrequency ?freq ; script:similarTo ?other }
+}""",
+    "top-k-labels": """SELECT ?symbol ?label WHERE {
+  ?symbol rdfs:label ?label .
+}
+ORDER BY DESC(?label)
+LIMIT 7 OFFSET 3""",
+    "union-of-scripts": """SELECT ?symbol ?contours WHERE {
+  { ?symbol script:fromScript "indus" ; script:contourCount ?contours }
+  UNION
+  { ?symbol script:fromScript "yi" ; script:contourCount ?contours }
+}""",
+    "values-join": """SELECT ?script (COUNT(?symbol) AS ?symbols) WHERE {
+  VALUES ?script { "indus" "yi" }
+  ?symbol script:fromScript ?script ;
+          script:symbolFrequency ?freq .
+}
+GROUP BY ?script""",
+    "top-k-two-keys": """SELECT ?symbol ?contours ?freq WHERE {
+  ?symbol script:contourCount ?contours ;
+          script:symbolFrequency ?freq .
+}
+ORDER BY ?contours DESC(?freq)
+LIMIT 10""",
+}
+
+_ORDER_BY_LIMIT = re.compile(r"ORDER BY\s+(?:(?:ASC|DESC)\s*\(\s*)?\?(\w+).*LIMIT", re.S)
+
+
+def results(graph, query):
+    """Comparable results: the ASK answer or the rows in order"""
+    result = graph.query(prepare_query(PREFIXES + query))
+    if result.type == "ASK":
+        return result.askAnswer
+    return [dict(zip(map(str, result.vars), row)) for row in result]
+
+
+def assert_same_results(query, hooked, plain):
+    if not isinstance(hooked, list):
+        assert hooked == plain
+        return
+    ordered = _ORDER_BY_LIMIT.search(query)
+    if ordered:
+        # Rows tied on the sort key may be cut differently by the LIMIT
+        key = ordered.group(1)
+        assert [row[key] for row in hooked] == [row[key] for row in plain]
+    else:
+        def rows(solutions):
+            return Counter(tuple(sorted(row.items())) for row in solutions)
+        assert rows(hooked) == rows(plain)
+
+
+@pytest.mark.parametrize("name", sorted(QUERIES))
+def test_hooks_match_plain_rdflib(kg, name, analyzer_hooks):
+    with plain_rdflib(kg):
+        plain = results(kg, QUERIES[name])
+    hooked = results(kg, QUERIES[name])
+    assert hooked
+    assert_same_results(QUERIES[name], hooked, plain)
+
+
+@pytest.mark.parametrize("name", sorted(QUERIES))
+def test_hooks_match_plain_rdflib_under_memory_budget(kg, budgeted_kg, name, analyzer_hooks):
+    with plain_rdflib(kg):
+        plain = results(kg, QUERIES[name])
+    prepared = prepare_query(PREFIXES + QUERIES[name])
+    with resident_scripts(budgeted_kg, query_scripts(budgeted_kg, prepared.algebra)):
+        hooked = results(budgeted_kg, QUERIES[name])
+    assert_same_results(QUERIES[name], hooked, plain)
+
+
+def test_range_filter_scans_the_numeric_index(kg, analyzer_hooks, monkeypatch):
+    index = kg.indexes["numeric"]
+    scans = []
+    scan = index.scan
+    monkeypatch.setattr(index, "scan", lambda p, **bounds: scans.append((p, bounds)) or scan(p, **bounds))
+    results(kg, QUERIES["numeric-equality"])
+    assert [bounds["low"] for p, bounds in scans] == [3]
+
+
+def test_top_k_keeps_the_full_order_of_the_kept_rows(kg, analyzer_hooks):
+    query = QUERIES["top-k-two-keys"]
+    hooked = results(kg, query)
+    assert [(row["contours"].toPython(), -row["freq"].toPython()) for row in hooked] == \
+        sorted((row["contours"].toPython(), -row["freq"].toPython()) for row in hooked)
+
+
+def test_join_order_starts_from_the_most_selective_pattern(kg):
+    symbol, other = Variable("symbol"), Variable("other")
+    patterns = [(symbol, RDF.type, NS.Symbol),
+                (symbol, NS.similarTo, other),
+                (symbol, NS.fromScript, Literal("yi"))]
+    ordered = order_bgp(kg.indexes["stats"], patterns)
+    # One script's symbols are fewer than all symbols or all links
+    assert ordered[0] == patterns[2]
+    assert sorted(ordered) == sorted(patterns)
+
+
+def test_join_orders_are_cached_until_the_statistics_change(analyzer_hooks):
+    graph = fill_graph(new_kg(), ["indus"])
+    stats = graph.indexes["stats"]
+    query = QUERIES["join-order-three-patterns"]
+    first = results(graph, query)
+    plans = dict(stats._plans)
+    assert plans
+    results(graph, query)
+    assert stats._plans == plans
+    graph.add((NS["indus_extra"], NS.fromScript, Literal("indus")))
+    assert results(graph, query) == first
+    assert stats._plans is not plans and stats._plans_version == stats.version
+
+
+def test_parallel_union_matches_plain_rdflib(tmp_path, analyzer_hooks, monkeypatch):
+    # Enough symbols that the queried scripts hold PARALLEL_MIN_TRIPLES
+    graph = spill(fill_graph(new_kg(), symbols=PARALLEL_MIN_TRIPLES // 8), str(tmp_path), 0)
+    assert sum(graph.partition_cache.triples[script] for script in ("indus", "yi")) >= PARALLEL_MIN_TRIPLES
+    graph.query_pool = ParallelQueryPool(2)
+    submitted = []
+    submit = graph.query_pool.submit
+    monkeypatch.setattr(graph.query_pool, "submit",
+                        lambda fn, *args: submitted.append(fn) or submit(fn, *args))
+    try:
+        for name in ("union-of-scripts", "values-join"):
+            with plain_rdflib(graph):
+                plain = results(graph, QUERIES[name])
+            hooked = results(graph, QUERIES[name])
+            assert hooked
+            assert_same_results(QUERIES[name], hooked, plain)
+    finally:
+        graph.query_pool.shutdown()
+    assert submitted.count(kg_query.evaluate_partition_task) == 4
+
+
+def test_small_queries_are_not_sent_to_the_query_workers(tmp_path, analyzer_hooks):
+    graph = spill(fill_graph(new_kg()), str(tmp_path), 0)
+    graph.query_pool = ParallelQueryPool(2)
+    submitted = []
+    graph.query_pool.submit = lambda fn, *args: submitted.append(fn)
+    with plain_rdflib(graph):
+        plain = results(graph, QUERIES["union-of-scripts"])
+    hooked = results(graph, QUERIES["union-of-scripts"])
+    assert_same_results(QUERIES["union-of-scripts"], hooked, plain)
+    assert submitted == []
+
+
+def test_waiting_on_the_query_workers_counts_against_the_deadline():
+    pending = [Future(), Future()]
+    with query_deadline(time.monotonic()):
+        with pytest.raises(QueryTimeout):
+            list(kg_query._merged_solutions(None, pending))
+    assert all(future.cancelled() for future in pending)
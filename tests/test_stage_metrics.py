@@ -0,0 +1,84 @@
+"""Stage timing histograms and their JSON lines and Prometheus exports"""
+
+import json
+
+from kg_metrics import StageMetrics, resident_memory
+
+
+def test_observations_fill_histogram_buckets():
+    metrics = StageMetrics()
+    for seconds in (0.00005, 0.002, 0.002, 2.0, 60.0):
+        metrics.observe("image_decode", seconds)
+    record = metrics.stages["image_decode"]
+    assert record["count"] == 5
+    assert record["min"] == 0.00005 and record["max"] == 60.0
+    assert sum(record["buckets"]) == 5
+    assert record["buckets"][0] == 1
+    assert record["buckets"][StageMetrics.BUCKETS.index(0.005)] == 2
+    assert record["buckets"][-1] == 1
+
+
+def test_timed_stage_is_recorded():
+    metrics = StageMetrics()
+    with metrics.time("kg_insert"):
+        pass
+    assert metrics.stages["kg_insert"]["count"] == 1
+
+
+def test_merge_adds_a_workers_records():
+    main, worker = StageMetrics(), StageMetrics()
+    main.observe("feature_extraction", 0.01)
+    worker.observe("feature_extraction", 0.5)
+    worker.increment("kg_images_scanned", 3)
+    main.merge(worker.stages, worker.counters)
+    record = main.stages["feature_extraction"]
+    assert (record["count"], record["min"], record["max"]) == (2, 0.01, 0.5)
+    assert main.counters["kg_images_scanned"] == 3
+
+
+def test_json_lines_export():
+    metrics = StageMetrics()
+    metrics.observe("query_parse", 0.003)
+    metrics.increment("query_count")
+    metrics.set_gauge("partition_resident_bytes", 42, script="indus")
+    lines = [json.loads(line) for line in metrics.to_json_lines().splitlines()]
+    stage, counter, gauge = lines
+    assert stage["stage"] == "query_parse" and stage["count"] == 1
+    assert stage["buckets"]["0.005"] == 1 and sum(stage["buckets"].values()) == 1
+    assert (counter["counter"], counter["value"]) == ("query_count", 1)
+    assert (gauge["gauge"], gauge["labels"], gauge["value"]) == ("partition_resident_bytes", {"script": "indus"}, 42)
+
+
+def test_prometheus_buckets_are_cumulative():
+    metrics = StageMetrics()
+    for seconds in (0.0002, 0.02, 0.2):
+        metrics.observe("query_evaluate", seconds)
+    text = metrics.to_prometheus()
+    buckets = [line for line in text.splitlines()
+               if line.startswith('indus_kg_stage_seconds_bucket{stage="query_evaluate"')]
+    counts = [int(line.rsplit(" ", 1)[1]) for line in buckets]
+    assert len(counts) == len(StageMetrics.BUCKETS) + 1
+    assert counts == sorted(counts) and counts[-1] == 3
+    assert 'indus_kg_stage_seconds_count{stage="query_evaluate"} 3' in text
+
+
+def test_reset_forgets_a_prefix():
+    metrics = StageMetrics()
+    metrics.observe("query_parse", 0.001)
+    metrics.observe("kg_insert", 0.001)
+    metrics.increment("query_count")
+    metrics.set_gauge("query_bytes", 1)
+    metrics.reset("query_")
+    assert list(metrics.stages) == ["kg_insert"]
+    assert not metrics.counters and not metrics.gauges
+
+
+def test_tracked_memory_is_recorded_per_stage():
+    metrics = StageMetrics()
+    metrics.track_memory = True
+    with metrics.time("kg_insert"):
+        pass
+    record = metrics.stages["kg_insert"]
+    assert record["count"] == 1
+    if resident_memory() is not None:
+        assert record["max_rss_bytes"] > 0
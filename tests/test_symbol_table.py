@@ -0,0 +1,63 @@
+"""The columnar symbol table and its exports"""
+
+import sys
+
+import numpy as np
+import pytest
+from rdflib import Literal
+from rdflib.namespace import XSD
+
+from kg_indexes import read_symbol_table
+from conftest import NS, SCRIPTS, fill_graph, new_kg
+
+
+def test_columns_match_the_kg(kg):
+    table = kg.indexes["symbols"]
+    columns = table.columns()
+    assert columns["script_names"] == sorted(SCRIPTS)
+    frequencies = {}
+    for s, _, o in kg.triples((None, NS.symbolFrequency, None)):
+        frequencies.setdefault(str(next(kg.objects(s, NS.fromScript))), []).append(o.toPython())
+    for script, summary in table.aggregate("frequency").items():
+        assert summary["count"] == len(frequencies[script])
+        assert summary["mean"] == pytest.approx(np.mean(frequencies[script]))
+        assert summary["max"] == max(frequencies[script])
+    edges, counts = table.histogram("contours", bins=9)
+    assert len(edges) == 10
+    assert sum(int(c.sum()) for c in counts.values()) == len(list(kg.triples((None, NS.contourCount, None))))
+
+
+def test_columns_follow_changes():
+    graph = fill_graph(new_kg(), ["yi"])
+    table = graph.indexes["symbols"]
+    symbol, _, frequency = next(graph.triples((None, NS.symbolFrequency, None)))
+    before = table.aggregate("frequency")["yi"]["count"]
+    graph.remove((symbol, NS.symbolFrequency, frequency))
+    assert table.aggregate("frequency")["yi"]["count"] == before - 1
+    graph.add((symbol, NS.symbolFrequency, Literal(1000, datatype=XSD.integer)))
+    assert table.aggregate("frequency")["yi"]["max"] == 1000
+
+
+def test_npz_export_round_trips(kg, tmp_path):
+    path = str(tmp_path / "symbols.npz")
+    kg.indexes["symbols"].export(path)
+    columns = kg.indexes["symbols"].columns()
+    stored = read_symbol_table(path)
+    assert list(stored["script_names"]) == columns["script_names"]
+    assert list(stored["symbol"]) == list(columns["symbol"])
+    np.testing.assert_array_equal(stored["frequency"], columns["frequency"])
+
+
+def test_parquet_export_round_trips(kg, tmp_path):
+    pytest.importorskip("pyarrow")
+    path = str(tmp_path / "symbols.parquet")
+    kg.indexes["symbols"].export(path)
+    table = read_symbol_table(path)
+    assert table.num_rows == len(kg.indexes["symbols"])
+    assert sorted(table.column("symbol").to_pylist()) == sorted(kg.indexes["symbols"].columns()["symbol"])
+
+
+def test_arrow_exports_without_pyarrow_say_how_to_install_it(kg, tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    with pytest.raises(ImportError, match="pip install pyarrow"):
+        kg.indexes["symbols"].export(str(tmp_path / "symbols.arrow"))
@@ -0,0 +1,69 @@
+"""Seeded synthetic datasets: glyph folders and JSON-lines symbol records"""
+
+import argparse
+import json
+import os
+
+import pytest
+from rdflib import Namespace
+
+from generate_synthetic_dataset import NAMESPACE, generate, parse_formats, parse_range
+from kg_builder import read_symbol_records, symbol_records_path
+from conftest import PRIMARY_SCRIPT, SCRIPTS
+
+
+def read_files(path):
+    contents = {}
+    for root, _, files in os.walk(path):
+        for name in files:
+            if name != "synthetic_manifest.json":
+                with open(os.path.join(root, name), "rb") as f:
+                    contents[os.path.relpath(os.path.join(root, name), path)] = f.read()
+    return contents
+
+
+def test_records_are_reproducible_and_load_as_triples(tmp_path):
+    first, second = str(tmp_path / "first"), str(tmp_path / "second")
+    manifest = generate(first, SCRIPTS, 40, 3, records=True, primary_script=PRIMARY_SCRIPT)
+    generate(second, SCRIPTS, 40, 3, records=True, primary_script=PRIMARY_SCRIPT)
+    assert read_files(first) == read_files(second)
+    ns = Namespace(NAMESPACE)
+    for script in SCRIPTS:
+        path = symbol_records_path(first, script)
+        # Plain JSON, one record per line
+        with open(path, encoding="utf-8") as f:
+            assert len([json.loads(line) for line in f]) == 40
+        triples = read_symbol_records(ns, script, path)
+        assert len(triples) == manifest["scripts"][script]["triples"]
+    similar = [t for t in read_symbol_records(ns, PRIMARY_SCRIPT, symbol_records_path(first, PRIMARY_SCRIPT))
+               if t[1] == ns.similarTo]
+    assert similar
+
+
+def test_a_script_does_not_depend_on_the_others_generated(tmp_path):
+    generate(str(tmp_path / "all"), SCRIPTS, 10, 0, records=True, primary_script=PRIMARY_SCRIPT)
+    generate(str(tmp_path / "one"), SCRIPTS[:1], 10, 0, records=True, primary_script=PRIMARY_SCRIPT)
+    one = read_files(str(tmp_path / "one"))
+    assert one and all(read_files(str(tmp_path / "all"))[name] == data for name, data in one.items())
+
+
+def test_image_folders_follow_the_requested_shape(tmp_path):
+    output = str(tmp_path / "images")
+    manifest = generate(output, ["yi"], 12, 1, widths=(30, 40), heights=(20, 20),
+                        formats={"png": 0.5, "jpg": 0.5})
+    files = sorted(os.listdir(os.path.join(output, "yi")))
+    assert len(files) == 12
+    assert sum(manifest["scripts"]["yi"]["images"].values()) == 12
+    assert {os.path.splitext(name)[1] for name in files} <= {".png", ".jpg"}
+    with open(os.path.join(output, "synthetic_manifest.json")) as f:
+        assert json.load(f)["seed"] == 1
+
+
+def test_argument_parsing():
+    assert parse_range("24:300") == (24, 300)
+    assert parse_range("64") == (64, 64)
+    assert parse_formats("png=3,jpg=1") == {"png": 0.75, "jpg": 0.25}
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_range("300:24")
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_formats("gif")
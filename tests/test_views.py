@@ -0,0 +1,61 @@
+"""Materialized views agree with the KG and answer view: queries"""
+
+from collections import Counter
+
+from conftest import NS, fill_graph, new_kg
+
+VIEW_QUERY = """
+PREFIX view: <http://example.org/scripts/views#>
+SELECT ?rank ?symbol ?freq WHERE {
+  ?row view:view view:topFrequency ;
+       view:script "yi" ;
+       view:rank ?rank ;
+       view:symbol ?symbol ;
+       view:value ?freq .
+} ORDER BY ?rank
+"""
+
+
+def frequencies(graph, script):
+    return sorted(((s, o.toPython()) for s, o in graph.subject_objects(NS.symbolFrequency)
+                   if graph.value(s, NS.fromScript).toPython() == script),
+                  key=lambda item: item[1], reverse=True)
+
+
+def test_top_frequency_ranks_the_most_frequent_symbols(kg):
+    views = kg.indexes["views"]
+    ranking = views.top_frequency("yi")
+    assert len(ranking) == views.top_n
+    assert [f for s, f in ranking] == [f for s, f in frequencies(kg, "yi")[:views.top_n]]
+
+
+def test_contour_histograms_count_symbols(kg):
+    for script in ("indus", "yi"):
+        expected = Counter(o.toPython() for s, o in kg.subject_objects(NS.contourCount)
+                           if str(kg.value(s, NS.fromScript)) == script)
+        assert kg.indexes["views"].contour_histograms[script] == expected
+
+
+def test_rankings_follow_removals():
+    graph = fill_graph(new_kg())
+    views = graph.indexes["views"]
+    views.refresh()
+    top_symbol = views.top_frequency("yi")[0][0]
+    graph.remove((top_symbol, NS.symbolFrequency, None))
+    assert top_symbol not in [s for s, f in views.top_frequency("yi")]
+    assert [f for s, f in views.top_frequency("yi")] == [f for s, f in frequencies(graph, "yi")[:views.top_n]]
+
+
+def test_top_similarity_pairs_scripts(kg):
+    rankings = kg.indexes["views"].top_similarity()
+    assert rankings
+    for (script, target_script), rows in rankings.items():
+        assert script == "indus"
+        assert all(str(target).startswith(str(NS) + target_script + "_") for s, target, score in rows)
+        assert [score for s, t, score in rows] == sorted((score for s, t, score in rows), reverse=True)
+
+
+def test_view_query_is_answered_from_the_views(kg, analyzer_hooks):
+    rows = list(kg.query(VIEW_QUERY))
+    assert [row.freq.toPython() for row in rows] == [f for s, f in kg.indexes["views"].top_frequency("yi")]
+    assert [row.rank.toPython() for row in rows] == list(range(1, len(rows) + 1))
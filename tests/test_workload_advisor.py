@@ -0,0 +1,65 @@
+"""Index and result view recommendations drawn from the query latency log"""
+
+from rdflib import Literal
+
+from kg_query import QueryLatencyHistory, WorkloadAdvisor, prepare_query
+from kg_indexes import evaluate_query
+from conftest import NS, fill_graph, new_kg
+
+CONTOUR_RANGE = """SELECT ?symbol ?contours WHERE {
+  ?symbol script:contourCount ?contours .
+  FILTER (?contours >= 4 && ?contours < 7)
+}"""
+
+SCRIPT_COUNT = """SELECT (COUNT(?symbol) AS ?symbols) WHERE {
+  ?symbol script:fromScript "yi" .
+}"""
+
+
+def advisor_for(tmp_path, *runs):
+    history = QueryLatencyHistory(str(tmp_path / "history.json"))
+    for query, seconds, rows, triples in runs:
+        history.record(query, seconds, rows, triples)
+    return WorkloadAdvisor(history)
+
+
+def rows(graph, query):
+    return sorted(tuple(row) for row in evaluate_query(graph, prepare_query(query, graph.namespaces()), query))
+
+
+def test_range_filters_on_unindexed_predicates_get_a_numeric_index(tmp_path):
+    graph = fill_graph(new_kg())
+    graph.indexes["numeric"].remove_predicate(NS.contourCount)
+    advisor = advisor_for(tmp_path, *[(CONTOUR_RANGE, 0.05, 100, len(graph))] * 3)
+    [recommendation] = advisor.recommend(graph)
+    assert recommendation["kind"] == "numeric_index"
+    assert recommendation["predicate"] == NS.contourCount
+    assert recommendation["expected"] > 1
+    before = rows(graph, CONTOUR_RANGE)
+    advisor.build(graph, recommendation)
+    assert graph.indexes["numeric"].covers(NS.contourCount)
+    assert rows(graph, CONTOUR_RANGE) == before
+    assert "numeric_index" not in [r["kind"] for r in advisor.recommend(graph)]
+
+
+def test_repeated_queries_on_an_unchanged_kg_get_a_result_view(tmp_path):
+    graph = fill_graph(new_kg(), ["yi"])
+    advisor = advisor_for(tmp_path, *[(SCRIPT_COUNT, 0.05, 1, len(graph))] * 4)
+    [recommendation] = advisor.recommend(graph)
+    assert recommendation["kind"] == "result_view"
+    assert recommendation["repeat_rate"] == 0.75
+    advisor.build(graph, recommendation)
+    first = rows(graph, SCRIPT_COUNT)
+    assert graph.result_views.lookup(SCRIPT_COUNT, graph.version) is not None
+    # Any change to the KG invalidates the stored result
+    graph.add((NS["yi_extra"], NS.fromScript, Literal("yi")))
+    assert graph.result_views.lookup(SCRIPT_COUNT, graph.version) is None
+    assert rows(graph, SCRIPT_COUNT)[0][0].toPython() == first[0][0].toPython() + 1
+
+
+def test_rarely_run_or_varying_queries_get_nothing(tmp_path):
+    graph = fill_graph(new_kg(), ["yi"])
+    assert advisor_for(tmp_path, *[(SCRIPT_COUNT, 0.05, 1, len(graph))] * 2).recommend(graph) == []
+    varying = [(SCRIPT_COUNT.replace("yi", script), 0.05, 1, len(graph))
+               for script in ("yi", "indus", "ba-shu", "naxi_dongba")]
+    assert advisor_for(tmp_path, *varying).recommend(graph) == []